@@ -0,0 +1,240 @@
+"""
+Per-cluster statistics streamed during evolution
+
+ClusterStats follows the IDs assigned by initialize_volume_clusters while a
+run evolves: births and deaths per ID (bincounts over the cells that changed
+since the previous step), the population of every ID and, optionally,
+bounding boxes (grown from the changed cells, recomputed only for IDs that
+lost a cell on their boundary) and connected components per ID. Rows go to
+a columnar table: one array per column, one row per ID present or changed
+at each step.
+
+JCA
+"""
+import numpy as np
+from scipy.ndimage import find_objects
+from scipy.sparse import coo_matrix
+from scipy.sparse.csgraph import connected_components
+
+
+# Boxes rescanned one by one (inside their old box) before switching to one
+# labelled pass over the whole volume
+RESCAN_LIMIT = 32
+
+
+def _grouped_bounds(ids, coords):
+    """
+    Per-ID min and max of cell coordinates.
+
+    Parameters:
+        ids (ndarray): N IDs.
+        coords (ndarray): N×3 coordinates.
+
+    Returns:
+        uids (ndarray): Distinct IDs.
+        lo, hi (ndarray): len(uids)×3 inclusive bounds.
+    """
+    order = np.argsort(ids, kind='stable')
+    ids, coords = ids[order], coords[order]
+    starts = np.flatnonzero(np.r_[True, ids[1:] != ids[:-1]])
+    return ids[starts], np.minimum.reduceat(coords, starts), np.maximum.reduceat(coords, starts)
+
+
+def component_counts(volume, minlength=0):
+    """
+    Number of face-connected components of every ID (cells with the same
+    positive ID touching by a face belong to the same component).
+
+    Returns:
+        ndarray: Component count per ID (index = ID).
+    """
+    live = volume > 0
+    n = int(np.count_nonzero(live))
+    if n == 0:
+        return np.zeros(minlength, dtype=np.int64)
+    index = np.full(volume.shape, -1, dtype=np.int64)
+    index[live] = np.arange(n)
+
+    rows, cols = [], []
+    for axis in range(3):
+        a = [slice(None)] * 3
+        b = [slice(None)] * 3
+        a[axis], b[axis] = slice(None, -1), slice(1, None)
+        a, b = tuple(a), tuple(b)
+        same = (volume[a] == volume[b]) & live[a]
+        rows.append(index[a][same])
+        cols.append(index[b][same])
+    rows, cols = np.concatenate(rows), np.concatenate(cols)
+    graph = coo_matrix((np.ones(len(rows), dtype=np.int8), (rows, cols)), shape=(n, n))
+    count, labels = connected_components(graph, directed=False)
+
+    component_id = np.zeros(count, dtype=np.int64)
+    component_id[labels] = volume[live]
+    return np.bincount(component_id, minlength=minlength)
+
+
+class ClusterStats:
+    """
+    Parameters:
+        bounds (bool): Track the bounding box of every ID.
+        components_every (int): Count connected components per ID every this
+            many steps (None = never; costs a labelling of the live cells).
+        path (str): .npz file receiving the table on close.
+
+    Columns of table():
+        timestep, id, population, births, deaths (relative to the previous
+        step, 0 at the first), with bounds x0, x1, y0, y1, z0, z1 (inclusive,
+        -1 for extinct IDs) and with components_every, components (-1 at steps
+        where they are not counted).
+    """
+    def __init__(self, bounds=False, components_every=None, path=None):
+        self.bounds = bounds
+        self.components_every = components_every
+        self.path = path
+        self.columns = {name: [] for name in self.names()}
+        self.previous = None
+        self.steps = 0
+        self.lo = np.zeros((0, 3), dtype=np.int64)
+        self.hi = np.full((0, 3), -1, dtype=np.int64)
+
+    def names(self):
+        names = ['timestep', 'id', 'population', 'births', 'deaths']
+        if self.bounds:
+            names += ['x0', 'x1', 'y0', 'y1', 'z0', 'z1']
+        if self.components_every:
+            names.append('components')
+        return names
+
+    def update(self, timestep, volume):
+        """Add the rows of the state of `timestep`."""
+        if self.previous is None:
+            live = volume > 0
+            self.population = np.bincount(volume[live].astype(np.intp))
+            births = deaths = np.zeros(len(self.population), dtype=np.int64)
+            born = died = None
+        else:
+            # Only the changed cells are visited: populations follow from births and deaths
+            changed = np.flatnonzero(volume != self.previous)
+            new, old = volume.ravel()[changed], self.previous.ravel()[changed]
+            born, died = changed[new > 0], changed[old > 0]
+            births = np.bincount(new[new > 0].astype(np.intp))
+            deaths = np.bincount(old[old > 0].astype(np.intp))
+            size = max(len(self.population), len(births), len(deaths))
+            self.population = np.pad(self.population, (0, size - len(self.population)))
+            births = np.pad(births, (0, size - len(births)))
+            deaths = np.pad(deaths, (0, size - len(deaths)))
+            self.population += births - deaths
+
+        population = self.population
+        ids = np.flatnonzero(population | births | deaths)
+        ids = ids[ids > 0]
+
+        n = len(ids)
+        self.columns['timestep'].append(np.full(n, timestep, dtype=np.int32))
+        self.columns['id'].append(ids.astype(np.int32))
+        self.columns['population'].append(population[ids])
+        self.columns['births'].append(births[ids])
+        self.columns['deaths'].append(deaths[ids])
+
+        if self.bounds:
+            self._update_bounds(volume, born, died)
+            lo, hi = self.lo[ids], self.hi[ids]
+            for axis, name in enumerate('xyz'):
+                self.columns[name + '0'].append(lo[:, axis].astype(np.int32))
+                self.columns[name + '1'].append(hi[:, axis].astype(np.int32))
+
+        if self.components_every:
+            if self.steps % self.components_every == 0:
+                counts = component_counts(volume, minlength=len(population))[ids]
+            else:
+                counts = np.full(n, -1, dtype=np.int64)
+            self.columns['components'].append(counts)
+
+        if self.previous is None:
+            self.previous = volume.copy()
+        else:
+            np.copyto(self.previous, volume)
+        self.steps += 1
+
+    def _update_bounds(self, volume, born, died):
+        size = len(self.population)
+        if len(self.lo) < size:
+            grow = size - len(self.lo)
+            self.lo = np.concatenate([self.lo, np.full((grow, 3), -1, dtype=np.int64)])
+            self.hi = np.concatenate([self.hi, np.full((grow, 3), -1, dtype=np.int64)])
+
+        if born is None:
+            live = volume > 0
+            if live.any():
+                uids, lo, hi = _grouped_bounds(volume[live].astype(np.intp), np.argwhere(live))
+                self.lo[uids], self.hi[uids] = lo, hi
+            return
+
+        # Deaths on the boundary of a box may shrink it: rescan those IDs inside their old box
+        if len(died):
+            coords = np.column_stack(np.unravel_index(died, volume.shape))
+            ids = self.previous.ravel()[died].astype(np.intp)
+            edge = ((coords == self.lo[ids]) | (coords == self.hi[ids])).any(axis=1)
+            stale = np.unique(ids[edge])
+            extinct = stale[self.population[stale] == 0]
+            self.lo[extinct], self.hi[extinct] = -1, -1
+            stale = stale[self.population[stale] > 0]
+            if len(stale) > RESCAN_LIMIT:
+                # Many boxes to shrink: one labelled pass over the volume
+                boxes = find_objects(np.where(volume > 0, volume, 0), max_label=int(stale.max()))
+                for cid in stale:
+                    box = boxes[cid - 1]
+                    if box is None:
+                        self.lo[cid], self.hi[cid] = -1, -1
+                    else:
+                        self.lo[cid] = [b.start for b in box]
+                        self.hi[cid] = [b.stop - 1 for b in box]
+                stale = stale[:0]
+            for cid in stale:
+                lo, hi = self.lo[cid], self.hi[cid]
+                cells = np.argwhere(volume[lo[0]:hi[0] + 1, lo[1]:hi[1] + 1, lo[2]:hi[2] + 1] == cid)
+                if len(cells):
+                    self.lo[cid], self.hi[cid] = cells.min(axis=0) + lo, cells.max(axis=0) + lo
+                else:  # only born outside the old box this step
+                    self.lo[cid], self.hi[cid] = -1, -1
+
+        # Births only grow boxes
+        if len(born):
+            coords = np.column_stack(np.unravel_index(born, volume.shape))
+            uids, lo, hi = _grouped_bounds(volume.ravel()[born].astype(np.intp), coords)
+            empty = self.hi[uids, 0] < 0
+            self.lo[uids] = np.where(empty[:, None], lo, np.minimum(self.lo[uids], lo))
+            self.hi[uids] = np.where(empty[:, None], hi, np.maximum(self.hi[uids], hi))
+
+    def table(self):
+        """Columns as one array each (see the class docstring)."""
+        return {name: np.concatenate(parts) if parts else np.zeros(0, dtype=np.int64)
+                for name, parts in self.columns.items()}
+
+    def series(self, column, cluster_id):
+        """(timesteps, values) of one column for one ID."""
+        table = self.table()
+        rows = table['id'] == cluster_id
+        return table['timestep'][rows], table[column][rows]
+
+    def save(self, path):
+        np.savez_compressed(path, **self.table())
+
+    def close(self):
+        if self.path is not None:
+            self.save(self.path)
+
+
+def make_stats(stats):
+    """
+    Returns the ClusterStats for a `stats` option of evolve_volume: a
+    ClusterStats is used as is, True gives populations, births and deaths and
+    a string is the .npz file the table is saved to.
+    """
+    if stats is None or isinstance(stats, ClusterStats):
+        return stats
+    if stats is False:
+        return None
+    if stats is True:
+        return ClusterStats()
+    return ClusterStats(path=stats)
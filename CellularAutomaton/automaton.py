@@ -4,25 +4,64 @@ Functions for performing sliding windows over a 3D space
 JCA
 """
 import os
+import time
+import warnings
 import numpy as np
-from scipy.ndimage import generic_filter
 import tqdm
 
 import CellularAutomaton.auxfun as aux
 import CellularAutomaton.visualization as viz
+import CellularAutomaton.kernels as kernels
+from CellularAutomaton.codebook import PatternIndex
+from CellularAutomaton.engines import Engine, DenseEngine
+from CellularAutomaton.history import make_history
+from CellularAutomaton.output import FrameWriter
+from CellularAutomaton.runfile import RunWriter
+from CellularAutomaton.steady import SteadyStateDetector
+from CellularAutomaton.instrument import make_instrumentation
+from CellularAutomaton.analytics import make_stats
+from CellularAutomaton.bitboard import BitboardEngine
+from CellularAutomaton.sparse import SparseEngine
+from CellularAutomaton.hashlife import HashLifeEngine
+from CellularAutomaton.parallel import ParallelEngine
+from CellularAutomaton.outofcore import OutOfCoreEngine, unique_ids
 
 
-def codebook_rule_fn(codebook, not_found='random'):
+# Run file written to savepath by evolve_volume
+RUN_FILE = 'run.carun'
+
+# Engines selectable by name in evolve_volume
+ENGINES = {
+    'dense': DenseEngine,
+    'bitboard': BitboardEngine,
+    'sparse': SparseEngine,
+    'hashlife': HashLifeEngine,
+    'parallel': ParallelEngine,
+    'outofcore': OutOfCoreEngine,
+}
+
+
+def codebook_rule_fn(codebook, not_found='random', compiled=False, seed=None):
     """
     Returns a function that applies the codebook rule to a neighborhood vector.
 
     Parameters:
         codebook (dict): Dictionary mapping 27-bit patterns to new states.
         not_found (str): 'random' or 'l2' strategy.
+        compiled (bool): For binary volumes, also attach a vectorized step that
+            encodes every window as a 27-bit integer and looks it up in a sorted
+            table (see kernels.codebook_step).
+        seed (int): Seed of the generator drawing unmatched windows in compiled mode.
 
     Returns:
         function: f(vector) -> new_state
     """
+    if not_found not in ('random', 'l2'):
+        raise ValueError("not_found must be 'random' or 'l2'.")
+
+    # Binary keys: nearest in L2 is nearest in Hamming distance
+    index = PatternIndex(codebook) if not_found == 'l2' else None
+
     def rule(vector):
         key = tuple(vector.astype(int))
         if key in codebook:
@@ -30,18 +69,20 @@ def codebook_rule_fn(codebook, not_found='random'):
 
         if not_found == 'random':
             return np.random.randint(0, 2)
-        elif not_found == 'l2':
-            keys = np.array(list(codebook.keys()))
-            dists = np.sum((keys - vector) ** 2, axis=1)
-            return codebook[tuple(keys[np.argmin(dists)])]
-        else:
-            raise ValueError("not_found must be 'random' or 'l2'.")
+        return index.nearest(vector)[0]
+
+    if compiled:
+        codes, states = kernels.compile_codebook(codebook)
+        rng = np.random.default_rng(seed)
+        rule.vectorized = lambda volume, out=None: kernels.codebook_step(volume, codes, states, rng, index, out)
     return rule
 
 
 def apply_rule(volume, rule_fn,  window_size=3):
     """
     Applies one step of the cellular automaton using a general rule function.
+    Rules exposing a `vectorized` attribute (see kernels.py) are evaluated over
+    the whole volume at once instead of calling rule_fn per voxel.
 
     Parameters:
         volume (ndarray): 3D binary or multi-state grid.
@@ -50,7 +91,19 @@ def apply_rule(volume, rule_fn,  window_size=3):
     Returns:
         new_volume (ndarray): updated volume.
     """
-    return generic_filter(volume, rule_fn, size=window_size, mode='constant', cval=0)
+    return kernels.rule_step(rule_fn, window_size)(volume)
+
+
+def make_engine(engine, rule_fn, window_size=3):
+    """
+    Returns the Engine instance for `engine`: an Engine is used as is, a
+    string is looked up in ENGINES.
+    """
+    if isinstance(engine, Engine):
+        return engine
+    if engine not in ENGINES:
+        raise ValueError(f"Unknown engine '{engine}'. Use one of {sorted(ENGINES)} or an Engine.")
+    return ENGINES[engine](rule_fn, window_size)
 
 
 # def evolve_volume(initial_volume, rule_fn, steps=10, savepath=None):
@@ -84,46 +137,218 @@ def apply_rule(volume, rule_fn,  window_size=3):
 #     return volumes
 
 
-def evolve_volume(initial_volume, rule_fn, steps=10, savepath=None, cmap_dict=None, voxel_size=1.0):
+def iterate_volume(initial_volume, rule_fn, steps=10, engine='dense', detector=None, frames=None):
     """
-    Runs cellular automaton over multiple time steps.
+    Runs cellular automaton lazily, one step per iteration.
+
+    Parameters:
+        initial_volume (ndarray): starting state.
+        rule_fn (function): Rule function to apply at each step.
+        steps (int): number of time steps, or None to run forever.
+        engine (str or Engine): Stepping engine (see evolve_volume).
+        detector (SteadyStateDetector): Ends the run early on extinction, a
+            fixed point or a cycle (a repeated state is not yielded). With
+            keep_period, only the states of the detected period are yielded,
+            once the run ends (see SteadyStateDetector.period_frames).
+        frames (function): f(timestep) -> bool selecting the states yielded
+            (the initial and last states always are). The engine jumps over
+            the others with advance(n), without building their dense volume.
+            Needs `steps` and no detector.
+
+    Yields:
+        (int, ndarray): timestep (0 = initial state) and the current volume.
+            The volume may be an engine buffer overwritten by the next step:
+            copy it to keep it.
+    """
+    if frames is not None and (steps is None or detector is not None):
+        raise ValueError("frames needs a fixed number of steps and no detector.")
+    engine = make_engine(engine, rule_fn)
+    engine.reset(initial_volume)
+    if detector is not None:
+        detector.reset()
+    hold = detector is not None and detector.keep_period
+    try:
+        if not hold:
+            yield 0, initial_volume
+        stopped = detector is not None and detector.update(0, initial_volume) and detector.stop
+
+        timestep = 0
+        while not stopped and (steps is None or timestep < steps):
+            n = 1
+            if frames is not None:
+                while timestep + n < steps and not frames(timestep + n):
+                    n += 1
+            engine.advance(n)
+            timestep += n
+            current = engine.volume()
+            if detector is not None and detector.update(timestep, current) and detector.stop:
+                stopped = True
+                if detector.repeated:
+                    break
+            if not hold:
+                yield timestep, current
+
+        if hold:
+            yield from detector.period_frames()
+    finally:
+        engine.close()
+
+
+def _timed(run, timings):
+    """Iterate `run`, storing the time spent producing each item in timings['compute']."""
+    try:
+        while True:
+            start = time.perf_counter()
+            try:
+                item = next(run)
+            except StopIteration:
+                return
+            timings['compute'] = time.perf_counter() - start
+            yield item
+    finally:
+        run.close()
+
+
+def _close(resources, failed):
+    """
+    Close every resource (None entries are skipped). After a failed run,
+    errors raised while closing are only warned about, so they do not replace
+    the exception that ended the run; otherwise the first one is raised once
+    everything is closed.
+    """
+    error = None
+    for resource in resources:
+        if resource is None:
+            continue
+        try:
+            resource.close()
+        except Exception as e:
+            if failed:
+                warnings.warn(f"Error while closing {type(resource).__name__} after a failed run: {e!r}")
+            elif error is None:
+                error = e
+    if error is not None:
+        raise error
+
+
+def evolve_volume(initial_volume, rule_fn, steps=10, savepath=None, cmap_dict=None, voxel_size=1.0,
+                  engine='dense', keep='all', writer=None, detector=None, metrics=None, stats=None):
+    """
+    Runs cellular automaton over multiple time steps. With savepath, every
+    state is stored in the run file savepath/RUN_FILE (see runfile.RunReader,
+    and runfile.export_ply for PLY point clouds) and rendered as PNG.
 
     Parameters:
         initial_volume (ndarray): starting state with integer IDs per cluster (0 = empty).
         rule_fn (function): Rule function to apply at each step. Must return (volume, cmap_dict).
         steps (int): number of time steps.
-        cmap_dict (dict): Optional initial ID→RGB mapping (0–1 floats).
+        cmap_dict (dict or Palette): Optional initial ID→RGB mapping (0–1 floats).
         voxel_size (float): Size of each voxel in plotting/saving.
+        engine (str or Engine): Stepping engine, a name from ENGINES ('dense',
+            'bitboard', 'sparse', 'hashlife', 'parallel', 'outofcore') or an Engine
+            instance, e.g. SparseEngine(rule_fn) to read its per-step active-cell
+            counts afterwards. With 'outofcore', keep='all' is rejected: use
+            keep=None, 'last' or a RunWriter so states are not copied into
+            memory. When only some states are kept (keep='last', n, ('every', k)
+            or None) and nothing else reads every state (savepath, writer,
+            detector, metrics, stats), the engine jumps
+            over the others without building their dense volume: 'bitboard'
+            does not unpack them and 'hashlife' advances them in 2^k leaps.
+        keep: States returned (see history.make_history): 'all', 'last', None,
+            the last n (int), every k-th (('every', k)), every state delta-compressed
+            with keyframes every k steps (('delta', k)) or a History instance,
+            e.g. DeltaHistory(32, path) to store the run on disk.
+        writer (FrameWriter): Output stage writing the frames in the background.
+            Defaults to FrameWriter(savepath) when savepath is set; pass one to
+            tune its workers or read its per-frame latencies afterwards. Its
+            writers get voxel_size and cmap_dict unless it was given its own.
+        detector (int or SteadyStateDetector): Stop early on extinction, a fixed
+            point or a cycle of period up to `detector` steps. Pass a
+            SteadyStateDetector to read its reason code afterwards, or with
+            keep_period=True to output (write and keep) only the detected period.
+        metrics: Per-step instrumentation (see instrument.make_instrumentation):
+            an Instrumentation, a JSON-lines metrics file path, or callback(s)
+            receiving one event dict per step.
+        stats: Per-cluster statistics computed during the run (see
+            analytics.make_stats): True, a .npz file path for the table, or a
+            ClusterStats (e.g. with bounds or components) to read its table
+            afterwards.
+
+    Returns:
+        tuple: (states, cmap_dict). Without a cmap_dict, one with a random colour
+            per initial ID is generated only when frames are written (savepath or
+            writer); otherwise cmap_dict is None.
     """
     print(' - Evolving...')
 
     if savepath:
         os.makedirs(savepath, exist_ok=True)
 
-    volumes = [initial_volume.copy()]
-    current = initial_volume.copy()
+    if keep == 'all' and (engine == 'outofcore' or isinstance(engine, OutOfCoreEngine)):
+        raise ValueError("keep='all' copies every state of the out-of-core engine into memory: "
+                         "use keep=None, 'last', ('delta', k) or a RunWriter.")
 
-    # If no colormap given, generate default mapping from IDs in initial volume
-    if cmap_dict is None:
-        unique_ids = np.unique(current[current > 0])
-        cmap_dict = {int(uid): np.random.rand(3) for uid in unique_ids}
+    if writer is None and savepath:
+        writer = FrameWriter(savepath)
+    # If no colormap given and frames are written, generate default mapping from IDs in initial volume
+    if cmap_dict is None and (writer is not None or savepath):
+        ids = unique_ids(initial_volume)
+        cmap_dict = {int(uid): np.random.rand(3) for uid in ids[ids > 0]}
         cmap_dict[0] = (0, 0, 0)  # empty = black
 
-    if savepath:
-        # render initial
-        aux.save_as_pointcloud(initial_volume, savepath, 0, voxel_size=voxel_size, cmap_dict=cmap_dict)
-        viz.render_as_pointcloud(initial_volume, savepath, 0, voxel_size=voxel_size, cmap_dict=cmap_dict)
+    if writer is not None:
+        # Sent once to the workers rather than with every frame
+        writer.set_defaults(voxel_size=voxel_size, cmap_dict=cmap_dict)
+    runfile = RunWriter(os.path.join(savepath, RUN_FILE), cmap_dict=cmap_dict, rule_fn=rule_fn) if savepath else None
+
+    if isinstance(detector, bool):
+        raise ValueError("detector takes a max period (int) or a SteadyStateDetector, not a bool.")
+    if isinstance(detector, int):
+        detector = SteadyStateDetector(detector)
+
+    metrics = make_instrumentation(metrics)
+    stats = make_stats(stats)
+    history = make_history(keep)
+    timings = {'compute': 0.0}
+    # States nobody reads are skipped by the engine
+    everything = (writer, runfile, detector, metrics, stats)
+    frames = None if any(x is not None for x in everything) else lambda t: history.wants(t, steps)
+    run = iterate_volume(initial_volume, rule_fn, steps=steps, engine=engine, detector=detector, frames=frames)
+    if metrics is not None:
+        run = _timed(run, timings)
+
+    # (phase, f(timestep, volume)) applied to every state, in order
+    stages = []
+    if writer is not None:
+        stages.append(('submit', lambda t, volume: writer.submit(volume, t)))
+    if runfile is not None:
+        stages.append(('runfile', runfile.append))
+    stages.append(('copy', history.append))
+    if stats is not None:
+        stages.append(('stats', stats.update))
 
-    for timestep in tqdm.tqdm(range(steps), total=steps):
-        # Rule function now returns both the new volume and updated cmap_dict
-        # current, cmap_dict = rule_fn(current)
-        timestep += 1
-        current = apply_rule(current, rule_fn)
+    progress = tqdm.tqdm(total=steps + 1)
+    failed = True
+    try:
+        for timestep, current in run:
+            progress.update(timestep + 1 - progress.n)
+            if metrics is None:
+                for _, stage in stages:
+                    stage(timestep, current)
+                continue
 
-        if savepath:
-            aux.save_as_pointcloud(current, savepath, timestep, voxel_size=voxel_size, cmap_dict=cmap_dict)
-            viz.render_as_pointcloud(current, savepath, timestep, voxel_size=voxel_size, cmap_dict=cmap_dict)
+            for phase, stage in stages:
+                start = time.perf_counter()
+                stage(timestep, current)
+                timings[phase] = time.perf_counter() - start
+            metrics.record(timestep, current, timings)
+        failed = False
+    finally:
+        progress.close()
+        # Every frame is on disk (or an error raised) before returning
+        _close([runfile, writer, metrics, stats], failed)
 
-        volumes.append(current.copy())
+    if detector is not None and detector.reason is not None:
+        print(f' - Stopped early: {detector}')
 
-    return volumes, cmap_dict
\ No newline at end of file
+    return history.states(), cmap_dict
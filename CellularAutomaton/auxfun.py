@@ -8,8 +8,11 @@ import numpy as np
 import os
 import tqdm
 
+from CellularAutomaton.palette import color_values
+from CellularAutomaton.surface import surface_mask
 
-def volume_to_pointcloud(volume, voxel_size=1.0):
+
+def volume_to_pointcloud(volume, voxel_size=1.0, surface=False):
     """
     Convert a multi-state 3D volume (including environment cells with negative IDs)
     into a point cloud of coordinates where values are non-zero.
@@ -17,13 +20,15 @@ def volume_to_pointcloud(volume, voxel_size=1.0):
     Parameters:
         volume (ndarray): 3D NumPy array.
         voxel_size (float): Scale factor for point spacing.
+        surface (bool): Only the cells with an empty face neighbour (the
+            visible shell, see surface.surface_mask).
 
     Returns:
         points (ndarray): N×3 array of (x, y, z) coordinates.
         values (ndarray): N array of corresponding values from the volume.
     """
     # Include any non-zero value (positive or negative)
-    coords = np.argwhere(volume != 0)                     # N × 3
+    coords = np.argwhere(surface_mask(volume) if surface else volume != 0)  # N × 3
     points = coords.astype(np.float32) * voxel_size       # scaled 3D points
     values = volume[tuple(coords.T)]                      # extract values at those coords
     return points, values
@@ -40,7 +45,8 @@ def volume_to_pointcloud(volume, voxel_size=1.0):
 
 #     o3d.io.write_point_cloud(filename, pcd)
 
-def save_as_pointcloud(volume, filepath, timestep, format='ply', voxel_size=1.0, name='points', cmap_dict=None):
+def save_as_pointcloud(volume, filepath, timestep, format='ply', voxel_size=1.0, name='points', cmap_dict=None,
+                       surface=False):
     """
     Save point cloud to file. Supports .ply with optional colors.
 
@@ -51,15 +57,16 @@ def save_as_pointcloud(volume, filepath, timestep, format='ply', voxel_size=1.0,
         format (str): Output format ('ply').
         voxel_size (float): Scale factor for coordinates.
         name (str): Base filename.
-        cmap_dict (dict): Mapping {state: (R, G, B)}, values in 0–255.
+        cmap_dict (dict or Palette): Mapping {state: (R, G, B)}, values in 0–255.
+        surface (bool): Save only the surface cells (see volume_to_pointcloud).
     """
-    points, values = volume_to_pointcloud(volume, voxel_size)
+    points, values = volume_to_pointcloud(volume, voxel_size, surface)
     pcd = o3d.geometry.PointCloud()
     pcd.points = o3d.utility.Vector3dVector(points)
 
     # Assign colors if a colormap_dict is provided
     if cmap_dict is not None:
-        colors = np.array([cmap_dict.get(v, (255, 255, 255)) for v in values], dtype=np.float32) #/ 255.0
+        colors = color_values(values, cmap_dict, default=(255, 255, 255)) #/ 255.0
         pcd.colors = o3d.utility.Vector3dVector(colors)
 
     # Ensure output directory exists
@@ -0,0 +1,202 @@
+"""
+Bit-packed volumes for two-state automata
+
+Cells are stored one bit per cell along the last axis, 64 cells per uint64
+word, and birth/survival steps run on the packed words with bit-sliced
+adders (no unpacking).
+
+JCA
+"""
+import numpy as np
+
+from CellularAutomaton.codebook import popcount
+from CellularAutomaton.engines import Engine
+
+
+def pack_bits(mask):
+    """
+    Pack a 3D boolean array along its last axis into uint64 words.
+
+    Returns:
+        ndarray: (X, Y, ceil(Z / 64)) uint64 array, bit i of word w is cell 64*w + i.
+    """
+    x, y, z = mask.shape
+    words = -(-z // 64)
+    padded = np.zeros((x, y, words * 64), dtype=bool)
+    padded[:, :, :z] = mask
+    packed = np.packbits(padded.reshape(x, y, words, 64), axis=-1, bitorder='little')
+    return np.ascontiguousarray(packed).view('<u8').reshape(x, y, words)
+
+
+def unpack_bits(words, depth):
+    """Inverse of pack_bits: uint64 words -> boolean array with `depth` cells on the last axis."""
+    x, y, w = words.shape
+    bits = np.unpackbits(words.astype('<u8').view(np.uint8).reshape(x, y, w, 8),
+                         axis=-1, bitorder='little')
+    return bits.reshape(x, y, w * 64)[:, :, :depth].astype(bool)
+
+
+def _shift(words, axis, offset):
+    """Cells of `words` moved by `offset` (±1) along a word axis (0 or 1), zero filled."""
+    out = np.zeros_like(words)
+    src = [slice(None)] * 3
+    dst = [slice(None)] * 3
+    if offset > 0:
+        src[axis], dst[axis] = slice(None, -offset), slice(offset, None)
+    else:
+        src[axis], dst[axis] = slice(-offset, None), slice(None, offset)
+    out[tuple(dst)] = words[tuple(src)]
+    return out
+
+
+def _shift_bits(words, offset):
+    """Cells moved by `offset` (±1) along the packed axis, carrying across words."""
+    out = np.zeros_like(words)
+    if offset > 0:   # cell z receives cell z - 1
+        out[:] = words << np.uint64(1)
+        out[:, :, 1:] |= words[:, :, :-1] >> np.uint64(63)
+    else:            # cell z receives cell z + 1
+        out[:] = words >> np.uint64(1)
+        out[:, :, :-1] |= words[:, :, 1:] << np.uint64(63)
+    return out
+
+
+def _add(a, b, bits):
+    """
+    Ripple-carry addition of two bit-sliced numbers (lists of planes, LSB
+    first), keeping at most `bits` planes of the result.
+    """
+    if len(a) < len(b):
+        a, b = b, a
+    out = []
+    carry = None
+    for i, x in enumerate(a):
+        y = b[i] if i < len(b) else None
+        if y is None and carry is None:
+            out.append(x)
+        elif y is None or carry is None:
+            y = carry if y is None else y
+            out.append(x ^ y)
+            carry = x & y
+        else:
+            s = x ^ y
+            out.append(s ^ carry)
+            carry = (x & y) | (s & carry)
+    if carry is not None:
+        out.append(carry)
+    return out[:bits]
+
+
+def _box_sum(words):
+    """Bit-sliced count (5 planes) of set cells in the 3×3×3 box around every cell, center included."""
+    total = _add(_add([words], [_shift_bits(words, 1)], 2), [_shift_bits(words, -1)], 2)   # 0..3
+    for axis, bits in ((1, 4), (0, 5)):                                                    # 0..9, 0..27
+        total = _add(_add(total, [_shift(p, axis, 1) for p in total], bits),
+                     [_shift(p, axis, -1) for p in total], bits)
+    return total
+
+
+def _box_any(words):
+    """Cells with at least one set cell in their 3×3×3 box."""
+    out = words | _shift_bits(words, 1) | _shift_bits(words, -1)
+    for axis in (1, 0):
+        out = out | _shift(out, axis, 1) | _shift(out, axis, -1)
+    return out
+
+
+def _count_in(planes, counts):
+    """Cells whose bit-sliced count is in `counts`."""
+    hit = np.zeros_like(planes[0])
+    for n in counts:
+        if not 0 <= n < 1 << len(planes):
+            continue
+        eq = ~np.zeros_like(planes[0])
+        for i, plane in enumerate(planes):
+            eq &= plane if (n >> i) & 1 else ~plane
+        hit |= eq
+    return hit
+
+
+class BitVolume:
+    """
+    Two-state volume packed into uint64 words along the last axis (64× smaller
+    than an int64 array), with optional static environment cells.
+
+    Parameters:
+        live (ndarray): Packed live cells (see pack_bits).
+        shape (tuple): Dense shape of the volume.
+        env (ndarray): Packed environment cells, or None.
+        env_id (int): Value of environment cells in the dense form.
+    """
+    def __init__(self, live, shape, env=None, env_id=-1):
+        self.live = live
+        self.shape = tuple(shape)
+        self.env = env
+        self.env_id = env_id
+        # Bits beyond the last cell of the packed axis must stay clear
+        self.mask = pack_bits(np.ones((1, 1, self.shape[2]), dtype=bool))
+
+    @classmethod
+    def from_array(cls, volume, env_id=-1):
+        """
+        Pack a dense volume: positive cells are live, env_id cells are environment.
+        Cluster IDs are not kept.
+        """
+        env = volume == env_id
+        live = pack_bits((volume > 0) & ~env)
+        return cls(live, volume.shape, pack_bits(env) if env.any() else None, env_id)
+
+    def to_array(self, dtype=np.int64):
+        """Dense volume with 1 for live cells, env_id for environment and 0 elsewhere."""
+        volume = unpack_bits(self.live, self.shape[2]).astype(dtype)
+        if self.env is not None:
+            volume[unpack_bits(self.env, self.shape[2])] = self.env_id
+        return volume
+
+    @property
+    def nbytes(self):
+        return self.live.nbytes + (self.env.nbytes if self.env is not None else 0)
+
+    def count(self):
+        """Number of live cells."""
+        return int(popcount(self.live).sum())
+
+    def step(self, birth_set={3}, survival_set={2, 3}):
+        """
+        Advance one generation of an outer-totalistic birth/survival rule in place.
+        Environment cells are static and count as alive; as in
+        life3d_rule_generalized, a birth needs at least one live non-environment
+        neighbour.
+        """
+        occupied = self.live if self.env is None else self.live | self.env
+        total = _box_sum(occupied)   # neighbours + the cell itself
+
+        born = ~occupied & _count_in(total, birth_set)
+        survive = self.live & _count_in(total, [s + 1 for s in survival_set])
+        if self.env is not None or 0 in birth_set:
+            born &= _box_any(self.live)
+        self.live = (born | survive) & self.mask
+        return self
+
+
+class BitboardEngine(Engine):
+    """
+    Runs rules from life3d_rule_generalized on a BitVolume. Two-state only:
+    cluster IDs are not inherited and live cells export as 1.
+    """
+    def __init__(self, rule_fn, window_size=3):
+        super().__init__(rule_fn, window_size)
+        params = getattr(rule_fn, 'params', None)
+        if params is None or window_size != 3:
+            raise ValueError("The bitboard engine needs a birth/survival rule from life3d_rule_generalized.")
+        self.params = params
+
+    def reset(self, volume):
+        self.dtype = volume.dtype
+        self.bits = BitVolume.from_array(volume, env_id=self.params['env_id'])
+
+    def step(self):
+        self.bits.step(self.params['birth_set'], self.params['survival_set'])
+
+    def volume(self):
+        return self.bits.to_array(self.dtype)
@@ -6,8 +6,11 @@ JCA
 import numpy as np
 from itertools import product
 from collections import Counter
+from functools import partial
 import random
 
+from CellularAutomaton.kernels import life3d_step
+
 def generate_random_codebook(num_rules=3, seed=None, size=3):
     """Side Size of a cube alike volume"""
     rng = np.random.default_rng(seed)
@@ -25,6 +28,87 @@ def generate_random_codebook(num_rules=3, seed=None, size=3):
     return codebook
 
 
+# Number of set bits in every byte value
+POPCOUNT = np.array([bin(i).count('1') for i in range(256)], dtype=np.uint8)
+
+
+def popcount(words):
+    """Number of set bits of every element of a uint64 array."""
+    if hasattr(np, 'bitwise_count'):  # numpy >= 2.0
+        return np.bitwise_count(words)
+    return POPCOUNT[words.view(np.uint8)].reshape(words.shape + (8,)).sum(axis=-1)
+
+
+def pack_patterns(patterns):
+    """Bit-pack N×size binary patterns into N×W uint64 words."""
+    packed = np.packbits(np.asarray(patterns, dtype=bool), axis=1)
+    pad = -packed.shape[1] % 8
+    packed = np.pad(packed, ((0, 0), (0, pad)))
+    return np.ascontiguousarray(packed).view(np.uint64)
+
+
+class PatternIndex:
+    """
+    Nearest-pattern index over the binary keys of a codebook.
+
+    Keys are bit-packed into uint64 words once; queries are resolved in
+    batches by Hamming distance (equal to the squared L2 distance for binary
+    patterns) with a popcount over the XOR of the words. Ties go to the earliest key in the codebook, as with
+    np.argmin over the keys. Resolved queries are memoized.
+
+    Parameters:
+        codebook (dict): Dictionary mapping binary patterns to new states.
+        cache_size (int): Maximum number of memoized queries (cleared when full).
+    """
+    # Query × key word comparisons per chunk
+    CHUNK = 1 << 22
+
+    def __init__(self, codebook, cache_size=1 << 20):
+        if not codebook:
+            raise ValueError("Cannot index an empty codebook.")
+        keys = np.array(list(codebook.keys()), dtype=bool)
+        self.size = keys.shape[1]
+        self.keys = pack_patterns(keys)
+        self.states = np.array(list(codebook.values()))
+        self.cache_size = cache_size
+        self.cache = {}
+
+    def _search(self, packed):
+        """Index of the nearest key for every row of packed queries."""
+        rows = max(1, self.CHUNK // self.keys.size)
+        nearest = np.empty(len(packed), dtype=np.intp)
+        for start in range(0, len(packed), rows):
+            chunk = packed[start:start + rows]
+            dists = popcount(chunk[:, None, :] ^ self.keys[None, :, :]).sum(axis=2, dtype=np.uint32)
+            nearest[start:start + rows] = dists.argmin(axis=1)
+        return nearest
+
+    def nearest(self, patterns):
+        """
+        New state of the nearest key for a batch of patterns.
+
+        Parameters:
+            patterns (ndarray): N×size array of 0/1 values.
+
+        Returns:
+            ndarray: N states.
+        """
+        packed = pack_patterns(np.reshape(patterns, (-1, self.size)))
+        unique, inverse = np.unique(packed, axis=0, return_inverse=True)
+        inverse = inverse.ravel()
+
+        keys = [row.tobytes() for row in unique]
+        todo = [i for i, key in enumerate(keys) if key not in self.cache]
+        if len(self.cache) + len(todo) > self.cache_size:
+            self.cache.clear()
+            todo = list(range(len(keys)))
+        if todo:
+            for i, idx in zip(todo, self._search(unique[todo])):
+                self.cache[keys[i]] = self.states[idx]
+
+        resolved = np.array([self.cache[key] for key in keys], dtype=self.states.dtype)
+        return resolved[inverse]
+
 
 def life3d_rule(vector):
     """
@@ -124,6 +208,8 @@ def life3d_rule_generalized(env_id=-1, birth_set={3}, survival_set={2, 3}):
 
     Returns:
         function: A rule function compatible with the evolve_volume() system.
+            Its `vectorized` attribute computes the same step over a whole volume
+            and `params` holds the rule parameters for other engines.
     """
     def rule_fn(vector):
         center_index = len(vector) // 2
@@ -158,4 +244,6 @@ def life3d_rule_generalized(env_id=-1, birth_set={3}, survival_set={2, 3}):
 
         return 0
 
-    return rule_fn
\ No newline at end of file
+    rule_fn.params = {'env_id': env_id, 'birth_set': birth_set, 'survival_set': survival_set}
+    rule_fn.vectorized = partial(life3d_step, **rule_fn.params)
+    return rule_fn
@@ -0,0 +1,69 @@
+"""
+Stepping engines for evolve_volume
+
+An engine owns the state of a run and advances it one generation at a time.
+evolve_volume only talks to engines through this interface, so alternative
+state representations (packed bits, sparse blocks, ...) plug in behind the
+same API.
+
+JCA
+"""
+import numpy as np
+
+import CellularAutomaton.kernels as kernels
+
+
+class Engine:
+    """
+    Base engine.
+
+    Parameters:
+        rule_fn (function): Rule applied at every step.
+        window_size (int): Side of the cubic neighbourhood window (rules
+            carrying a `window_size` attribute, see rules.py, use their own).
+    """
+    def __init__(self, rule_fn, window_size=3):
+        self.rule_fn = rule_fn
+        self.window_size = getattr(rule_fn, 'window_size', window_size)
+
+    def reset(self, volume):
+        """Load the initial state."""
+        raise NotImplementedError
+
+    def step(self):
+        """Advance the state one generation."""
+        raise NotImplementedError
+
+    def advance(self, steps):
+        """Advance the state several generations."""
+        for _ in range(steps):
+            self.step()
+
+    def volume(self):
+        """
+        Current state as a dense ndarray. It may be one of the engine's own
+        buffers, valid until the next step: copy it to keep it.
+        """
+        raise NotImplementedError
+
+    def close(self):
+        """Release resources held for the run (processes, shared memory, ...)."""
+
+
+class DenseEngine(Engine):
+    """
+    Steps a dense ndarray with apply_rule semantics (vectorized when the rule
+    allows). Double buffered: each step writes into the buffer of the previous
+    state, so no state array is allocated per step.
+    """
+    def reset(self, volume):
+        self.current = volume.copy()
+        self.back = np.empty_like(self.current)
+        self._step = kernels.rule_step(self.rule_fn, self.window_size)
+
+    def step(self):
+        self._step(self.current, out=self.back)
+        self.current, self.back = self.back, self.current
+
+    def volume(self):
+        return self.current
@@ -0,0 +1,134 @@
+"""
+Batched ensembles for rule and seed sweeps
+
+Many configurations (initial seed, birth/survival sets, environment) are
+stepped together as one 4D array (member, x, y, z): a single neighbour
+count serves every member and each member reads its own birth/survival
+lookup table. Members are two-state, as in the bitboard engine: cluster IDs
+are not inherited, environment cells are static and count as alive.
+
+JCA
+"""
+import itertools
+
+import numpy as np
+from scipy.ndimage import convolve
+
+import CellularAutomaton.initializers as init
+from CellularAutomaton.kernels import MOORE_KERNEL, count_lut
+
+
+# Moore kernel that never mixes members along the batch axis
+BATCH_KERNEL = MOORE_KERNEL[None]
+
+
+def ensemble_step(live, env, birth, survival):
+    """
+    One birth/survival step of every member.
+
+    Parameters:
+        live (ndarray): M×X×Y×Z bool live cells.
+        env (ndarray): M×X×Y×Z bool environment cells.
+        birth (ndarray): M×27 bool birth lookup table of each member.
+        survival (ndarray): M×27 bool survival lookup table of each member.
+
+    Returns:
+        ndarray: new live cells.
+    """
+    occupied = live | env
+    counts = convolve(occupied.view(np.uint8), BATCH_KERNEL, mode='constant', cval=0).astype(np.intp)
+    # Row m of a lookup table starts at 27*m of its flattened form
+    counts += 27 * np.arange(len(live)).reshape(-1, 1, 1, 1)
+
+    survive = live & survival.ravel()[counts]
+    born = ~occupied & birth.ravel()[counts]
+    if env.any() or birth[:, 0].any():
+        # A birth needs at least one live (non-environment) neighbour
+        born &= convolve(live.view(np.uint8), BATCH_KERNEL, mode='constant', cval=0) > 0
+    return survive | born
+
+
+def member_volume(config, shape, env_id=-1):
+    """
+    Initial volume of one configuration: config['volume'] if given, otherwise
+    initialize_volume_clusters(shape, seed=config['seed'], ...) with every
+    other key of the config that the initializer accepts. The environment ID
+    is shared by the whole ensemble, so configs may not set their own.
+    """
+    if 'env_id' in config:
+        raise ValueError("Configurations cannot set 'env_id'; pass it to run_ensemble instead.")
+    if 'volume' in config:
+        return config['volume']
+    kwargs = {k: v for k, v in config.items() if k not in ('birth_set', 'survival_set', 'volume')}
+    volume, _ = init.initialize_volume_clusters(shape, env_id=env_id, **kwargs)
+    return volume
+
+
+def run_ensemble(configs, shape=(50, 50, 50), steps=100, keep_final=False, batch_size=32, env_id=-1):
+    """
+    Runs every configuration for `steps` generations, `batch_size` members at a time.
+
+    Parameters:
+        configs (list[dict]): One dict per member with 'birth_set' and
+            'survival_set', plus either 'volume' or initializer arguments
+            ('seed', 'n_clusters', 'env_type', 'env_density', ...).
+        shape (tuple): Volume shape of generated members.
+        steps (int): number of time steps.
+        keep_final (bool): Also return the final state of every member.
+        batch_size (int): Members stepped together.
+        env_id (int): ID of environment cells.
+
+    Returns:
+        list[dict]: Per member: 'config', 'live' (live cells at every step),
+            'births' and 'deaths' (per step), 'extinct_at' (first step with no
+            live cell, or None) and, with keep_final, 'final' (1 = live,
+            env_id = environment).
+    """
+    if steps < 0:
+        raise ValueError("steps must be >= 0.")
+    results = []
+    for start in range(0, len(configs), batch_size):
+        batch = configs[start:start + batch_size]
+        volumes = np.stack([member_volume(c, shape, env_id) for c in batch])
+        env = volumes == env_id
+        live = (volumes > 0) & ~env
+        birth = np.stack([count_lut(c['birth_set']) for c in batch])
+        survival = np.stack([count_lut(c['survival_set']) for c in batch])
+
+        counts = [live.sum(axis=(1, 2, 3))]
+        births, deaths = [], []
+        for _ in range(steps):
+            new = ensemble_step(live, env, birth, survival)
+            births.append((new & ~live).sum(axis=(1, 2, 3)))
+            deaths.append((live & ~new).sum(axis=(1, 2, 3)))
+            counts.append(new.sum(axis=(1, 2, 3)))
+            live = new
+
+        # steps × members, also when there are no steps
+        counts = np.array(counts).T
+        births = np.array(births, dtype=counts.dtype).reshape(steps, len(batch)).T
+        deaths = np.array(deaths, dtype=counts.dtype).reshape(steps, len(batch)).T
+        for m, config in enumerate(batch):
+            extinct = np.flatnonzero(counts[m] == 0)
+            result = {
+                'config': config,
+                'live': counts[m],
+                'births': births[m],
+                'deaths': deaths[m],
+                'extinct_at': int(extinct[0]) if len(extinct) else None,
+            }
+            if keep_final:
+                final = live[m].astype(volumes.dtype)
+                final[env[m]] = env_id
+                result['final'] = final
+            results.append(result)
+    return results
+
+
+def sweep(birth_sets, survival_sets, seeds, **common):
+    """
+    Configurations for every (birth_set, survival_set, seed) combination,
+    sharing the initializer arguments in `common`.
+    """
+    return [dict(common, birth_set=set(b), survival_set=set(s), seed=seed)
+            for b, s, seed in itertools.product(birth_sets, survival_sets, seeds)]
@@ -0,0 +1,258 @@
+"""
+Retention policies for evolve_volume
+
+A history receives every state of a run and decides which ones to keep:
+all of them, none, the last N, every k-th, or all of them delta-compressed
+between keyframes. Bounded policies copy into buffers they own, so memory
+stays flat however many steps are run.
+
+JCA
+"""
+import os
+
+import numpy as np
+
+
+class History:
+    """
+    Base history.
+
+    Attributes:
+        timesteps (list[int]): Timestep of every kept state, oldest first.
+    """
+    def append(self, timestep, volume):
+        """Offer the state of `timestep`. `volume` may be reused by the engine afterwards."""
+        raise NotImplementedError
+
+    def wants(self, timestep, steps=None):
+        """
+        True if the state of `timestep` would be kept in a run of `steps`
+        steps (None = unbounded). Engines can skip building the other states.
+        """
+        return True
+
+    def states(self):
+        """Kept states, oldest first."""
+        raise NotImplementedError
+
+
+class FullHistory(History):
+    """Keeps a copy of every state."""
+    def __init__(self):
+        self.timesteps = []
+        self.volumes = []
+
+    def append(self, timestep, volume):
+        self.timesteps.append(timestep)
+        self.volumes.append(volume.copy())
+
+    def states(self):
+        return self.volumes
+
+
+class NoHistory(History):
+    """Keeps nothing."""
+    def __init__(self):
+        self.timesteps = []
+
+    def append(self, timestep, volume):
+        pass
+
+    def wants(self, timestep, steps=None):
+        return False
+
+    def states(self):
+        return []
+
+
+class LastHistory(History):
+    """Keeps the last `n` states in a ring of `n` preallocated buffers."""
+    def __init__(self, n):
+        if n < 1:
+            raise ValueError("LastHistory needs n >= 1.")
+        self.n = n
+        self.buffers = []
+        self.steps = []
+        self.head = 0
+
+    def append(self, timestep, volume):
+        if len(self.buffers) < self.n:
+            self.buffers.append(volume.copy())
+            self.steps.append(timestep)
+            return
+        np.copyto(self.buffers[self.head], volume)
+        self.steps[self.head] = timestep
+        self.head = (self.head + 1) % self.n
+
+    def wants(self, timestep, steps=None):
+        return steps is None or timestep > steps - self.n
+
+    @property
+    def timesteps(self):
+        return self.steps[self.head:] + self.steps[:self.head]
+
+    def states(self):
+        return self.buffers[self.head:] + self.buffers[:self.head]
+
+
+class StrideHistory(FullHistory):
+    """Keeps a copy of every k-th state (timesteps 0, k, 2k, ...)."""
+    def __init__(self, k):
+        if k < 1:
+            raise ValueError("StrideHistory needs k >= 1.")
+        super().__init__()
+        self.k = k
+
+    def append(self, timestep, volume):
+        if timestep % self.k == 0:
+            super().append(timestep, volume)
+
+    def wants(self, timestep, steps=None):
+        return timestep % self.k == 0
+
+
+class DeltaHistory(History):
+    """
+    Keeps every state as full keyframes every `keyframe_every` steps and, in
+    between, only the flat indices and new values of the voxels that changed.
+    Any state is rebuilt from its keyframe in at most keyframe_every - 1 deltas.
+    Behaves as a read-only sequence of states (len, indexing, iteration).
+
+    Parameters:
+        keyframe_every (int): Steps between full keyframes.
+        path (str): Directory to store keyframes and deltas as .npy/.npz files
+            instead of memory. Keyframes are read back memory-mapped.
+    """
+    def __init__(self, keyframe_every=32, path=None):
+        if keyframe_every < 1:
+            raise ValueError("DeltaHistory needs keyframe_every >= 1.")
+        self.keyframe_every = keyframe_every
+        self.path = path
+        if path:
+            os.makedirs(path, exist_ok=True)
+        self.timesteps = []
+        self.entries = []   # keyframe array, (indices, values) or a filename
+        self.last = None
+
+    def append(self, timestep, volume):
+        i = len(self.entries)
+        if i % self.keyframe_every == 0:
+            entry = volume.copy()
+            self.last = entry.copy() if self.path is None else entry
+        else:
+            idx = np.flatnonzero(volume != self.last)
+            entry = (idx.astype(np.min_scalar_type(volume.size)), volume.ravel()[idx])
+            np.copyto(self.last, volume)
+
+        if self.path:
+            if isinstance(entry, tuple):
+                name = os.path.join(self.path, f'delta-{i}.npz')
+                np.savez(name, indices=entry[0], values=entry[1])
+            else:
+                name = os.path.join(self.path, f'key-{i}.npy')
+                np.save(name, entry)
+            entry = name
+        self.entries.append(entry)
+        self.timesteps.append(timestep)
+
+    def _entry(self, i):
+        entry = self.entries[i]
+        if not isinstance(entry, str):
+            return entry
+        if entry.endswith('.npy'):
+            return np.load(entry, mmap_mode='r')
+        with np.load(entry) as data:
+            return data['indices'], data['values']
+
+    def _apply(self, volume, i):
+        indices, values = self._entry(i)
+        volume.ravel()[indices] = values
+
+    def get(self, i):
+        """State at position `i` (negative counts from the end), as a new array."""
+        n = len(self.entries)
+        if not -n <= i < n:
+            raise IndexError("DeltaHistory index out of range.")
+        i %= n
+        key = i - i % self.keyframe_every
+        volume = np.array(self._entry(key))
+        for j in range(key + 1, i + 1):
+            self._apply(volume, j)
+        return volume
+
+    def iter_range(self, start=0, stop=None):
+        """Yield the states at positions start..stop-1, applying deltas incrementally."""
+        start, stop, _ = slice(start, stop).indices(len(self.entries))
+        if start >= stop:
+            return
+        volume = self.get(start)
+        yield volume.copy()
+        for i in range(start + 1, stop):
+            if i % self.keyframe_every == 0:
+                volume = np.array(self._entry(i))
+            else:
+                self._apply(volume, i)
+            yield volume.copy()
+
+    @property
+    def nbytes(self):
+        """Bytes held by the stored keyframes and deltas (in memory or on disk)."""
+        total = 0
+        for entry in self.entries:
+            if isinstance(entry, str):
+                total += os.path.getsize(entry)
+            elif isinstance(entry, tuple):
+                total += entry[0].nbytes + entry[1].nbytes
+            else:
+                total += entry.nbytes
+        return total
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            positions = range(len(self))[i]
+            if not positions:
+                return []
+            # One incremental pass over the covered range, keeping the selected states
+            lo, hi = min(positions[0], positions[-1]), max(positions[0], positions[-1]) + 1
+            wanted = set(positions)
+            kept = {p: volume for p, volume in zip(range(lo, hi), self.iter_range(lo, hi)) if p in wanted}
+            return [kept[p] for p in positions]
+        return self.get(i)
+
+    def __iter__(self):
+        return self.iter_range()
+
+    def states(self):
+        return self
+
+
+def make_history(keep):
+    """
+    Returns the History for a `keep` option of evolve_volume:
+        'all': every state.
+        'last': the final state only.
+        None: nothing.
+        n (int): the last n states.
+        ('every', k): every k-th state.
+        ('delta', k): every state, as a DeltaHistory with keyframes every k steps.
+    A History instance is used as is.
+    """
+    if isinstance(keep, History):
+        return keep
+    if keep == 'all':
+        return FullHistory()
+    if keep is None:
+        return NoHistory()
+    if keep == 'last':
+        return LastHistory(1)
+    if isinstance(keep, int):
+        return LastHistory(keep) if keep > 0 else NoHistory()
+    if isinstance(keep, tuple) and len(keep) == 2 and keep[0] == 'every':
+        return StrideHistory(keep[1])
+    if isinstance(keep, tuple) and len(keep) == 2 and keep[0] == 'delta':
+        return DeltaHistory(keep[1])
+    raise ValueError(f"Unknown keep option {keep!r}. Use 'all', 'last', None, an int, ('every', k), "
+                     f"('delta', k) or a History.")
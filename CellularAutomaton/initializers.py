@@ -4,17 +4,35 @@ Functions for initialize volumes
 JCA
 """
 import numpy as np
-import random 
 
-def initialize_space(shape, prob=0.5, seed=None, col= (0.8, 0.8,0.8)):
+from CellularAutomaton.palette import Palette
+
+
+# Cells generated per chunk when initializing into a disk-backed volume
+INIT_CHUNK = 2**24
+
+def initialize_space(shape, prob=0.5, seed=None, col= (0.8, 0.8,0.8), compact=False, out=None, rng=None):
     """
     Randomly initialize a binary 3D grid with a threshold probability.
+    With `compact`, the grid is int8 and the colours come as a Palette.
+    With `out` (e.g. an outofcore.open_volume memmap), the grid is generated
+    into it a few planes at a time, with the same values as in memory.
+    `rng` (np.random.Generator) overrides `seed`.
     """
-    rng = np.random.default_rng(seed)
+    rng = rng if rng is not None else np.random.default_rng(seed)
     id_to_color = {1: col}
 
+    if out is not None:
+        planes = max(1, INIT_CHUNK // int(np.prod(shape[1:])))
+        for lo in range(0, shape[0], planes):
+            hi = min(lo + planes, shape[0])
+            out[lo:hi] = rng.random((hi - lo,) + tuple(shape[1:])) < prob
+        return out, (Palette([1], [col]) if compact else id_to_color)
 
-    return (rng.random(shape) < prob).astype(int), id_to_color
+    volume = rng.random(shape) < prob
+    if compact:
+        return volume.astype(np.int8), Palette([1], [col])
+    return volume.astype(int), id_to_color
 
 
 
@@ -69,17 +87,31 @@ def initialize_space(shape, prob=0.5, seed=None, col= (0.8, 0.8,0.8)):
 
 #     return volume, color_map
 
+
+def _stream(base, kind, index):
+    """Generator of one independent stream (cluster fill, noise plane, ...) of a volume."""
+    return np.random.default_rng((base, kind, index))
+
+
+# Stream kinds
+CLUSTER, NOISE, SPECKLES, NOISE_COLORS = 0, 1, 2, 3
+
+
 def initialize_volume_clusters(
     shape, 
     n_clusters=5, 
     cluster_radius=3, 
     density=0.5,
     noise_density=0.02, 
+    noise_ids=None,            # None = one ID per noise voxel; n = reuse n IDs cyclically (merges noise)
     env_type=None,             # None, "speckles", or "structured"
     env_density=0.05,          # fraction for speckles
     env_thickness=1,           # thickness for structured planes
     env_id=-1,                 # fixed ID for environment
-    seed=None
+    seed=None,
+    compact=False,             # dense codes in the smallest dtype + Palette
+    rng=None,                  # np.random.Generator (overrides seed)
+    out=None,                  # array (e.g. a disk-backed memmap) to generate into
 ):
     """
     Generates a 3D initial state for the Game of Life with clusters, noise,
@@ -87,70 +119,126 @@ def initialize_volume_clusters(
 
     For "structured" env_type:
         Creates several randomly placed small planes of random dimensions/orientation.
-    """
-    if seed is not None:
-        np.random.seed(seed)
-
-    volume = np.zeros(shape, dtype=int)
-    color_map = {}
-    X, Y, Z = np.indices(shape)
 
-    current_id = 1
+    With `compact`, the volume is stored in the smallest signed dtype that
+    holds every ID (see palette.compact_dtype) and the colours are returned
+    as a Palette instead of a dict. IDs are already dense (1..n), so they
+    are the same in both forms.
+
+    By default every noise voxel gets its own ID (its own cluster). For
+    compact runs on large volumes, where those IDs would push the dtype to
+    int32, noise_ids=n opts into n IDs (n_clusters+1 .. n_clusters+n)
+    assigned in C order and reused once the range is used up. This merges
+    unrelated noise voxels into shared clusters: they inherit, count and
+    colour as one ID.
+
+    The volume is generated a few planes at a time (INIT_CHUNK cells), and each
+    cluster only inside its bounding box. All randomness comes from `rng`
+    (or a Generator seeded with `seed`): it draws the layout, and every cluster
+    and every plane of noise gets its own derived stream, so the result does
+    not depend on the tiling. With `out`, the volume is written into it.
+    """
+    rng = rng if rng is not None else np.random.default_rng(seed)
+    base = int(rng.integers(2**63))
+    shape = tuple(shape)
 
-    # --- Generate clusters ---
+    # --- Layout: clusters and environment planes ---
+    clusters = []
     for _ in range(n_clusters):
-        cx, cy, cz = [np.random.randint(cluster_radius, s - cluster_radius) for s in shape]
-        mask = (X - cx)**2 + (Y - cy)**2 + (Z - cz)**2 <= cluster_radius**2
-        random_fill = np.random.rand(*shape) < density * random.random()
-        cluster_mask = mask & random_fill
-        volume[cluster_mask] = current_id
-        color_map[current_id] = tuple(np.random.rand(3))
-        current_id += 1
-
-    # --- Add noise ---
-    if noise_density is not None and noise_density > 0:
-        noise_mask = (np.random.rand(*shape) < noise_density) & (volume == 0)
-        noise_ids = np.where(noise_mask)
-        for i in range(len(noise_ids[0])):
-            volume[noise_ids[0][i], noise_ids[1][i], noise_ids[2][i]] = current_id
-            color_map[current_id] = tuple(np.random.rand(3))
-            current_id += 1
-
-    # --- Add environment ---
-    if env_type is not None:
+        center = [int(rng.integers(cluster_radius, s - cluster_radius)) for s in shape]
+        clusters.append((center, density * rng.random()))
+    colors = list(rng.random((n_clusters, 3)))
+    ids = list(range(1, n_clusters + 1))
+
+    env_boxes = []
+    if env_type == "structured":
+        for _ in range(int(rng.integers(3, 8))):  # number of random planes
+            axis = int(rng.integers(0, 3))  # orientation
+            # Random size (at least 3×3)
+            size_a = int(rng.integers(3, shape[(axis + 1) % 3] // 2))
+            size_b = int(rng.integers(3, shape[(axis + 2) % 3] // 2))
+            # Random start so it fits
+            start_a = int(rng.integers(0, shape[(axis + 1) % 3] - size_a))
+            start_b = int(rng.integers(0, shape[(axis + 2) % 3] - size_b))
+            pos = int(rng.integers(0, shape[axis]))  # plane position
+
+            box = [None] * 3
+            box[axis] = slice(pos, pos + env_thickness)
+            box[(axis + 1) % 3] = slice(start_a, start_a + size_a)
+            box[(axis + 2) % 3] = slice(start_b, start_b + size_b)
+            env_boxes.append(tuple(box))
+
+    # Cluster cells inside each bounding box (sphere ∩ random fill)
+    r = cluster_radius
+    x, y, z = np.ogrid[-r:r + 1, -r:r + 1, -r:r + 1]
+    sphere = x**2 + y**2 + z**2 <= r**2
+    fills = [sphere & (_stream(base, CLUSTER, c).random(sphere.shape) < p) for c, (_, p) in enumerate(clusters)]
+
+    volume = out if out is not None else np.zeros(shape, dtype=np.int32 if compact else int)
+    has_env = False
+    next_id = n_clusters + 1
+    n_noise_total = 0
+    if noise_ids is not None:
+        if noise_ids < 1:
+            raise ValueError("noise_ids must be a positive number of IDs or None.")
+        noise_colors = _stream(base, NOISE_COLORS, 0).random((noise_ids, 3))
+    planes = max(1, INIT_CHUNK // int(np.prod(shape[1:])))
+    for lo in range(0, shape[0], planes):
+        hi = min(lo + planes, shape[0])
+        tile = np.zeros((hi - lo,) + shape[1:], dtype=np.int64)
+
+        # --- Clusters (later ones overwrite earlier ones); boxes lie inside the volume ---
+        for c, ((cx, cy, cz), _) in enumerate(clusters):
+            a, b = max(cx - r, lo), min(cx + r + 1, hi)
+            if a < b:
+                target = tile[a - lo:b - lo, cy - r:cy + r + 1, cz - r:cz + r + 1]
+                target[fills[c][a - (cx - r):b - (cx - r)]] = c + 1
+
+        # --- Noise: IDs in C order (one per voxel, or cycling through noise_ids) ---
+        if noise_density is not None and noise_density > 0:
+            for plane in range(lo, hi):
+                stream = _stream(base, NOISE, plane)
+                mask = (stream.random(shape[1:]) < noise_density) & (tile[plane - lo] == 0)
+                n_noise = int(np.count_nonzero(mask))
+                if noise_ids is None:
+                    tile[plane - lo][mask] = np.arange(next_id, next_id + n_noise)
+                    ids.extend(range(next_id, next_id + n_noise))
+                    colors.extend(stream.random((n_noise, 3)))
+                    next_id += n_noise
+                else:
+                    offsets = np.arange(n_noise_total, n_noise_total + n_noise) % noise_ids
+                    tile[plane - lo][mask] = n_clusters + 1 + offsets
+                n_noise_total += n_noise
+
+        # --- Environment ---
         if env_type == "speckles":
-            env_mask = (np.random.rand(*shape) < env_density) & (volume == 0)
-
+            env_mask = np.stack([_stream(base, SPECKLES, plane).random(shape[1:]) < env_density
+                                 for plane in range(lo, hi)])
         elif env_type == "structured":
-            env_mask = np.zeros(shape, dtype=bool)
-            num_planes = np.random.randint(3, 8)  # number of random planes
-            for _ in range(num_planes):
-                axis = np.random.choice([0, 1, 2])  # orientation
-                # Random size (at least 3×3)
-                size_a = np.random.randint(3, shape[(axis + 1) % 3] // 2)
-                size_b = np.random.randint(3, shape[(axis + 2) % 3] // 2)
-
-                # Random start so it fits
-                start_a = np.random.randint(0, shape[(axis + 1) % 3] - size_a)
-                start_b = np.random.randint(0, shape[(axis + 2) % 3] - size_b)
-
-                pos = np.random.randint(0, shape[axis])  # plane position
-
-                if axis == 0:  # plane normal to X
-                    env_mask[pos:pos+env_thickness, start_a:start_a+size_a, start_b:start_b+size_b] = True
-                elif axis == 1:  # plane normal to Y
-                    env_mask[start_a:start_a+size_a, pos:pos+env_thickness, start_b:start_b+size_b] = True
-                else:  # axis == 2, plane normal to Z
-                    env_mask[start_a:start_a+size_a, start_b:start_b+size_b, pos:pos+env_thickness] = True
-
-            env_mask &= (volume == 0)
-
+            env_mask = np.zeros(tile.shape, dtype=bool)
+            for box in env_boxes:
+                a, b = max(box[0].start, lo), min(box[0].stop, hi)
+                if a < b:
+                    env_mask[(slice(a - lo, b - lo),) + box[1:]] = True
         else:
             env_mask = None
+        if env_mask is not None:
+            env_mask &= tile == 0
+            tile[env_mask] = env_id
+            has_env |= bool(env_mask.any())
 
-        if env_mask is not None and np.any(env_mask):
-            volume[env_mask] = env_id
-            color_map[env_id] = (0.0, 0.0, 0.0)  # Black
+        volume[lo:hi] = tile
 
-    return volume, color_map
+    if noise_ids is not None:
+        used = min(noise_ids, n_noise_total)
+        ids.extend(range(n_clusters + 1, n_clusters + 1 + used))
+        colors.extend(noise_colors[:used])
 
+    if compact:
+        palette = Palette(ids, np.reshape(colors, (-1, 3)), env_id)  # environment black
+        return (volume if out is not None else volume.astype(palette.dtype)), palette
+
+    color_map = {i: tuple(c) for i, c in zip(ids, colors)}
+    if has_env:
+        color_map[env_id] = (0.0, 0.0, 0.0)  # Black
+    return volume, color_map
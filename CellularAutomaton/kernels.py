@@ -0,0 +1,329 @@
+"""
+Vectorized whole-volume rule kernels
+
+Rules built by codebook.py can carry a `vectorized` attribute: a function
+(volume, out=None) -> new_volume that computes the same step as the per-voxel
+callback with array operations, writing into `out` when given. apply_rule
+uses it when available and falls back to scipy's generic_filter otherwise,
+with the rule's `low_level` callable (see native.py) when it has one.
+
+JCA
+"""
+import random
+
+import numpy as np
+from scipy import fft
+from scipy.ndimage import convolve, generic_filter
+
+
+# 26-cell Moore neighbourhood (center excluded)
+MOORE_KERNEL = np.ones((3, 3, 3), dtype=np.uint8)
+MOORE_KERNEL[1, 1, 1] = 0
+
+# Neighbour offsets in the same order generic_filter flattens a 3×3×3 window
+MOORE_OFFSETS = [(a, b, c) for a in range(3) for b in range(3) for c in range(3)
+                 if (a, b, c) != (1, 1, 1)]
+
+# Candidates processed per chunk by the majority vote (bounds N×26×26 temporaries;
+# scaled down for larger neighbourhoods)
+VOTE_CHUNK = 65536
+
+
+def rule_step(rule_fn, window_size=3):
+    """
+    Returns the function used to advance a volume one step with rule_fn.
+
+    Parameters:
+        rule_fn (function): Rule taking a flattened window and returning the new state.
+        window_size (int): Side of the cubic window. Rules carrying a
+            `window_size` attribute (see rules.py) use their own.
+
+    Returns:
+        function: f(volume, out=None) -> new_volume, writing into `out` (an
+            array distinct from `volume`) when given.
+    """
+    window_size = getattr(rule_fn, 'window_size', window_size)
+    vectorized = getattr(rule_fn, 'vectorized', None)
+    if vectorized is not None and window_size == getattr(rule_fn, 'window_size', 3):
+        return vectorized
+
+    # Compiled per-voxel rules (see native.py) run in generic_filter without the interpreter
+    function = getattr(rule_fn, 'low_level', rule_fn)
+
+    def step(volume, out=None):
+        return generic_filter(volume, function, size=window_size, mode='constant', cval=0, output=out)
+    return step
+
+
+def count_lut(counts, size=27):
+    """Boolean lookup table with True at every neighbour count in `counts`."""
+    lut = np.zeros(size, dtype=bool)
+    lut[[c for c in counts if 0 <= c < size]] = True
+    return lut
+
+
+def neighbour_count(volume):
+    """
+    Number of non-zero cells in the 26-cell Moore neighbourhood of every voxel.
+    Cells outside the volume count as dead.
+    """
+    alive = (volume != 0).astype(np.uint8)
+    return convolve(alive, MOORE_KERNEL, mode='constant', cval=0)
+
+
+class FFTCounter:
+    """
+    Neighbour counts by FFT convolution with a footprint: one forward and one
+    inverse real FFT per step, whatever the footprint size. The spectrum of
+    the footprint is computed once per volume shape and reused across steps.
+    Cells outside the volume count as dead.
+
+    Parameters:
+        footprint (ndarray): Symmetric boolean (2r+1)³ neighbourhood mask.
+        max_shapes (int): Spectra kept before the cache is cleared.
+    """
+    def __init__(self, footprint, max_shapes=8):
+        self.footprint = np.asarray(footprint, dtype=np.float64)
+        self.radius = self.footprint.shape[0] // 2
+        self.max_shapes = max_shapes
+        self.spectra = {}
+
+    def padded_shape(self, shape):
+        """FFT shape of a volume: large enough for a linear convolution, fast to transform."""
+        return fft_shape(shape, self.radius)
+
+    def spectrum(self, shape):
+        if shape not in self.spectra:
+            if len(self.spectra) >= self.max_shapes:
+                self.spectra.clear()
+            self.spectra[shape] = fft.rfftn(self.footprint, self.padded_shape(shape))
+        return self.spectra[shape]
+
+    def __call__(self, alive, dtype=np.uint16):
+        shape = alive.shape
+        padded = self.padded_shape(shape)
+        counts = fft.irfftn(fft.rfftn(alive, padded) * self.spectrum(shape), padded)
+        r = self.radius
+        counts = counts[r:r + shape[0], r:r + shape[1], r:r + shape[2]]
+        return np.rint(counts).astype(dtype)
+
+
+def fft_shape(shape, radius=1):
+    """Padded shape transformed by FFTCounter for a footprint of the given radius."""
+    return tuple(fft.next_fast_len(n + 2 * radius, real=True) for n in shape)
+
+
+def fft_is_faster(shape, direct_cost, radius=1):
+    """
+    True when counting by FFT is expected to beat direct convolution.
+
+    Parameters:
+        shape (tuple): Volume shape.
+        direct_cost (int): Cost per cell of the direct method, in 3D
+            convolution taps (the footprint size for a direct convolution).
+        radius (int): Footprint radius, setting the padded FFT size (see fft_shape).
+    """
+    m = int(np.prod(fft_shape(shape, radius)))
+    return int(np.prod(shape)) * direct_cost > m * np.log2(m)
+
+
+def neighbour_values(volume, cells, offsets=MOORE_OFFSETS, radius=1):
+    """
+    Gather the neighbour values of the given cells.
+
+    Parameters:
+        volume (ndarray): 3D grid.
+        cells (tuple): Index arrays (as returned by np.nonzero).
+        offsets (list): Neighbour positions in a (2 * radius + 1)³ window
+            (default: the 26-cell Moore neighbourhood).
+        radius (int): Radius of the window.
+
+    Returns:
+        ndarray: N×len(offsets) array, columns in the order of `offsets`
+            (generic_filter window order for the default).
+    """
+    padded = np.pad(volume, radius, mode='constant', constant_values=0)
+    i, j, k = cells
+    return np.stack([padded[i + a, j + b, k + c] for a, b, c in offsets], axis=1)
+
+
+def majority_id(neighbours, env_id=-1):
+    """
+    Vectorized majority vote over rows of neighbour IDs.
+    Empty (0) and environment cells do not vote.
+
+    Parameters:
+        neighbours (ndarray): N×K array of neighbour IDs.
+        env_id (int): ID of static environment cells.
+
+    Returns:
+        winner (ndarray): N array with the most common ID of each row (0 if no voter).
+        tie (ndarray): N bool array, True where two or more IDs share the top count.
+        voters (ndarray): N bool array, True where the row has at least one voter.
+    """
+    valid = (neighbours != 0) & (neighbours != env_id)
+    voters = valid.any(axis=1)
+
+    # Fast path: rows where every voter carries the same ID
+    winner = neighbours[np.arange(len(neighbours)), valid.argmax(axis=1)]
+    uniform = (np.where(valid, neighbours, winner[:, None]) == winner[:, None]).all(axis=1)
+    winner[~voters] = 0
+    tie = np.zeros(len(neighbours), dtype=bool)
+
+    mixed = np.flatnonzero(~uniform)
+    rows_per_chunk = max(1, VOTE_CHUNK * 26**2 // neighbours.shape[1]**2)
+    for start in range(0, len(mixed), rows_per_chunk):
+        chunk = mixed[start:start + rows_per_chunk]
+        rows, ok = neighbours[chunk], valid[chunk]
+
+        # votes[r, p] = how many valid neighbours share the ID at position p
+        same = (rows[:, :, None] == rows[:, None, :]) & ok[:, None, :]
+        votes = same.sum(axis=2) * ok
+        best = votes.max(axis=1)
+
+        winner[chunk] = rows[np.arange(len(rows)), votes.argmax(axis=1)]
+        # Every ID reaching the top count contributes `best` positions
+        tie[chunk] = (votes == best[:, None]).sum(axis=1) > best
+
+    return winner, tie, voters
+
+
+def life3d_step(volume, birth_set={3}, survival_set={2, 3}, env_id=-1, out=None):
+    """
+    One step of the generalized 3D Game of Life over the whole volume.
+
+    Same semantics as codebook.life3d_rule_generalized: environment cells are
+    static and count as alive, newborns inherit the majority non-environment
+    ID of their neighbours. Ties are broken with random.choice over the voting
+    neighbours, visiting cells in the same order as generic_filter, so both
+    paths give identical results under the same `random` seed.
+
+    Parameters:
+        volume (ndarray): 3D grid of IDs (0 = empty, env_id = environment).
+        birth_set (set[int]): Neighbor counts that cause a birth.
+        survival_set (set[int]): Neighbor counts that allow survival.
+        env_id (int): ID representing static environment cells.
+        out (ndarray): Array receiving the new state instead of a new allocation.
+
+    Returns:
+        new_volume (ndarray): updated volume, same dtype as the input.
+    """
+    counts = neighbour_count(volume)
+    env = volume == env_id
+    live = (volume > 0) & ~env
+
+    new_volume = np.empty_like(volume) if out is None else out
+    new_volume.fill(0)
+    np.copyto(new_volume, volume, where=live & count_lut(survival_set)[counts])
+    new_volume[env] = env_id
+
+    # Births: dead cells with the right count and at least one non-environment neighbour
+    cells = np.nonzero(~live & ~env & count_lut(birth_set)[counts])
+    if cells[0].size:
+        neighbours = neighbour_values(volume, cells)
+        winner, tie, voters = majority_id(neighbours, env_id)
+
+        for row in np.flatnonzero(tie):
+            ids = neighbours[row]
+            candidates = [int(x) for x in ids if x != 0 and x != env_id]
+            winner[row] = random.choice(candidates)
+
+        new_volume[cells] = np.where(voters, winner, 0)
+
+    return new_volume
+
+
+def encode_patterns(patterns):
+    """
+    Encode flattened binary 3×3×3 patterns as 27-bit integers.
+    Element i of a pattern becomes bit 26 - i.
+
+    Parameters:
+        patterns (array-like): N×27 array (or list of 27-tuples) of 0/1 values.
+
+    Returns:
+        ndarray: N uint32 codes.
+    """
+    patterns = np.asarray(patterns, dtype=np.uint32).reshape(-1, 27)
+    weights = np.left_shift(np.uint32(1), np.arange(26, -1, -1, dtype=np.uint32))
+    return (patterns * weights).sum(axis=1, dtype=np.uint32)
+
+
+def decode_patterns(codes):
+    """Inverse of encode_patterns: N codes -> N×27 uint8 array of 0/1 values."""
+    shifts = np.arange(26, -1, -1, dtype=np.uint32)
+    return ((np.asarray(codes, dtype=np.uint32)[:, None] >> shifts) & 1).astype(np.uint8)
+
+
+def encode_windows(volume):
+    """
+    Encode the 3×3×3 window around every voxel as a 27-bit integer, using the
+    same bit order as encode_patterns. Non-zero cells count as 1 and cells
+    outside the volume as 0. The code is built separably, three shifts per axis.
+
+    Parameters:
+        volume (ndarray): 3D binary grid.
+
+    Returns:
+        ndarray: uint32 array with the volume's shape.
+    """
+    p = np.pad(volume != 0, 1, mode='constant').astype(np.uint32)
+    code = (p[:, :, :-2] << 2) | (p[:, :, 1:-1] << 1) | p[:, :, 2:]
+    code = (code[:, :-2] << 6) | (code[:, 1:-1] << 3) | code[:, 2:]
+    return (code[:-2] << 18) | (code[1:-1] << 9) | code[2:]
+
+
+def compile_codebook(codebook):
+    """
+    Turn a codebook dict into sorted lookup arrays.
+
+    Parameters:
+        codebook (dict): Dictionary mapping 27-element patterns to new states.
+
+    Returns:
+        codes (ndarray): Sorted uint32 pattern codes.
+        states (ndarray): New state for each code.
+    """
+    keys = list(codebook.keys())
+    if any(len(key) != 27 for key in keys):
+        raise ValueError("Compiled codebooks only support 3×3×3 (27-element) patterns.")
+
+    codes = encode_patterns(keys)
+    states = np.array([codebook[key] for key in keys])
+    order = np.argsort(codes)
+    return codes[order], states[order]
+
+
+def codebook_step(volume, codes, states, rng=None, index=None, out=None):
+    """
+    One codebook step over a binary volume: a single gather into the sorted
+    code table, with all unmatched windows resolved in one batch.
+
+    Parameters:
+        volume (ndarray): 3D binary grid.
+        codes (ndarray): Sorted pattern codes (see compile_codebook).
+        states (ndarray): New state for each code.
+        rng (np.random.Generator): Generator drawing unmatched windows at random.
+        index (codebook.PatternIndex): Nearest-pattern index used for unmatched
+            windows instead of rng ('l2' strategy).
+        out (ndarray): Array receiving the new state instead of a new allocation.
+
+    Returns:
+        new_volume (ndarray): updated volume, same dtype as the input.
+    """
+    windows = encode_windows(volume)
+    new_volume = np.empty(volume.shape, dtype=volume.dtype) if out is None else out
+
+    found = np.zeros(volume.shape, dtype=bool)
+    if len(codes):
+        idx = np.minimum(np.searchsorted(codes, windows), len(codes) - 1)
+        found = codes[idx] == windows
+        new_volume[found] = states[idx[found]]
+
+    missing = ~found
+    if index is not None:
+        unique, inverse = np.unique(windows[missing], return_inverse=True)
+        new_volume[missing] = index.nearest(decode_patterns(unique))[inverse.ravel()]
+    else:
+        new_volume[missing] = rng.integers(0, 2, size=int(missing.sum()))
+    return new_volume
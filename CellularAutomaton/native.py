@@ -0,0 +1,169 @@
+"""
+Native per-voxel rules
+
+The native_rule decorator compiles a rule f(window) -> new state written in
+restricted Python (numpy scalars and arrays, loops, ifs; no Counter, sets or
+Python objects) with numba into a scipy LowLevelCallable. generic_filter
+then calls machine code for every voxel instead of the interpreter.
+Without numba, or when the rule uses something numba cannot compile, the
+decorator warns and returns the rule unchanged, so it runs on the Python
+path as before.
+
+The helpers below (neighbour_count, majority_id) are compiled too and can be
+called from native rules. Ties in majority_id are broken with numba's own
+generator (see seed), so tie-breaking differs from the Python rules, which
+use `random`. life3d_rule and life3d_rule_generalized are native versions
+of the rules in codebook.py.
+
+JCA
+"""
+import warnings
+
+import numpy as np
+from scipy import LowLevelCallable
+
+try:
+    import numba
+    from numba import types
+except ImportError:  # optional: rules stay on the Python path
+    numba = None
+
+
+def _jit(fn):
+    """numba.njit when available, the plain function otherwise."""
+    return numba.njit(fn) if numba is not None else fn
+
+
+@_jit
+def neighbour_count(window):
+    """Number of non-zero cells in a flattened window, center excluded."""
+    n = 0
+    center = len(window) // 2
+    for i in range(len(window)):
+        if i != center and window[i] != 0:
+            n += 1
+    return n
+
+
+@_jit
+def majority_id(window, env_id=-1):
+    """
+    Most common positive, non-environment ID among the neighbours of a
+    flattened window (center excluded). Without a clear majority, a random
+    voter's ID (as in codebook.life3d_rule_generalized). 0 if nobody votes.
+    """
+    center = len(window) // 2
+    best, best_votes, voters, tie = 0, 0, 0, False
+    for i in range(len(window)):
+        x = window[i]
+        if i == center or x <= 0 or x == env_id:
+            continue
+        voters += 1
+        votes = 0
+        for j in range(len(window)):
+            if j != center and window[j] == x:
+                votes += 1
+        if votes > best_votes:
+            best, best_votes, tie = x, votes, False
+        elif votes == best_votes and x != best:
+            tie = True
+    if tie:
+        pick = np.random.randint(0, voters)
+        for i in range(len(window)):
+            x = window[i]
+            if i != center and x > 0 and x != env_id:
+                if pick == 0:
+                    return x
+                pick -= 1
+    return best
+
+
+@_jit
+def _seed(value):
+    np.random.seed(value)
+
+
+def seed(value):
+    """Seed the generator used by native rules (numba keeps its own state)."""
+    _seed(value)
+
+
+def native_rule(rule_fn):
+    """
+    Decorator compiling a restricted-Python rule into a LowLevelCallable for
+    generic_filter, stored as `rule_fn.low_level` (see kernels.rule_step).
+    The rule itself is returned, so it can still be called from Python.
+
+    Parameters:
+        rule_fn (function): Rule taking a flattened window (float64 array)
+            and returning the new state.
+
+    Returns:
+        function: rule_fn, with `low_level` set when compilation succeeded.
+    """
+    if numba is None:
+        warnings.warn("numba is not installed: native_rule leaves the rule on the Python path.")
+        return rule_fn
+    try:
+        kernel = numba.njit(rule_fn)
+        signature = types.intc(types.CPointer(types.double), types.intp,
+                               types.CPointer(types.double), types.voidptr)
+
+        @numba.cfunc(signature)
+        def callback(buffer, size, result, user_data):
+            result[0] = kernel(numba.carray(buffer, (size,)))
+            return 1
+    except Exception as e:  # numba typing/lowering errors
+        warnings.warn(f"Cannot compile {getattr(rule_fn, '__name__', rule_fn)} natively, "
+                      f"using the Python path: {e}")
+        return rule_fn
+
+    rule_fn.cfunc = callback  # keeps the compiled code alive
+    rule_fn.low_level = LowLevelCallable(callback.ctypes)
+    return rule_fn
+
+
+@native_rule
+def life3d_rule(window):
+    """
+    Native counterpart of codebook.life3d_rule: survival with 2 or 3
+    neighbours, birth with exactly 3, newborns take the majority neighbour ID.
+    """
+    center_index = len(window) // 2
+    center = window[center_index]
+    live_count = 0
+    for i in range(len(window)):
+        if i != center_index and window[i] > 0:
+            live_count += 1
+    if center > 0:
+        return center if live_count == 2 or live_count == 3 else 0
+    if live_count == 3:
+        return majority_id(window, 0)
+    return 0
+
+
+def life3d_rule_generalized(env_id=-1, birth_set={3}, survival_set={2, 3}):
+    """
+    Native counterpart of codebook.life3d_rule_generalized (same parameters
+    and semantics; environment cells are static and count as alive).
+    """
+    # Sets are not available in native code: use lookup tables
+    birth = np.zeros(27, dtype=np.bool_)
+    birth[[c for c in birth_set if 0 <= c < 27]] = True
+    survival = np.zeros(27, dtype=np.bool_)
+    survival[[c for c in survival_set if 0 <= c < 27]] = True
+
+    @native_rule
+    def rule_fn(window):
+        center = window[len(window) // 2]
+        if center == env_id:
+            return env_id
+        live_count = neighbour_count(window)
+        if center > 0:
+            return center if survival[live_count] else 0
+        if birth[live_count]:
+            return majority_id(window, env_id)
+        return 0
+
+    rule_fn.params = {'env_id': env_id, 'birth_set': birth_set, 'survival_set': survival_set}
+    return rule_fn
@@ -0,0 +1,118 @@
+"""
+Out-of-core stepping for volumes larger than RAM
+
+The state lives in two disk-backed .npy memmaps (double buffer). Each step
+reads slabs along the first axis together with a halo of `radius` planes,
+steps them in memory and writes their interior to the other buffer, so the
+resident set is bounded by the memory budget rather than the volume size.
+
+JCA
+"""
+import os
+import shutil
+import tempfile
+
+import numpy as np
+
+import CellularAutomaton.kernels as kernels
+from CellularAutomaton.engines import Engine
+
+
+# Bytes of temporaries per cell of a slab while stepping it (neighbour counts,
+# masks, the new state, ...), relative to the cell's own size
+STEP_OVERHEAD = 12
+
+
+def open_volume(path, shape, dtype=np.int8, mode='w+'):
+    """Disk-backed volume: a .npy file opened as a memmap."""
+    return np.lib.format.open_memmap(path, mode=mode, dtype=dtype, shape=tuple(shape))
+
+
+def slab_size(shape, dtype, memory_budget, radius=1):
+    """Planes per slab such that stepping one slab stays within memory_budget bytes."""
+    plane = int(np.prod(shape[1:])) * np.dtype(dtype).itemsize * (1 + STEP_OVERHEAD)
+    return int(max(1, min(shape[0], memory_budget // max(plane, 1) - 2 * radius)))
+
+
+def unique_ids(volume, memory_budget=256 * 2**20):
+    """
+    Sorted distinct values of `volume`. A memmap is read slab by slab (within
+    memory_budget bytes) instead of being loaded whole.
+    """
+    if not isinstance(volume, np.memmap):
+        return np.unique(volume)
+    slab = slab_size(volume.shape, volume.dtype, memory_budget, radius=0)
+    found = np.empty(0, dtype=volume.dtype)
+    for lo in range(0, volume.shape[0], slab):
+        found = np.union1d(found, np.unique(volume[lo:lo + slab]))
+    return found
+
+
+def step_slabs(source, target, step, slab, radius=1):
+    """
+    One step of `source` into `target` (same shape), `slab` planes at a time.
+
+    Parameters:
+        source (ndarray): Current state, usually a memmap.
+        target (ndarray): Array receiving the new state.
+        step (function): f(volume) -> new_volume (see kernels.rule_step).
+        slab (int): Planes stepped per call.
+        radius (int): Halo planes read on each side of a slab.
+    """
+    n = source.shape[0]
+    for lo in range(0, n, slab):
+        hi = min(lo + slab, n)
+        a, b = max(lo - radius, 0), min(hi + radius, n)
+        new = step(np.asarray(source[a:b]))
+        target[lo:hi] = new[lo - a:hi - a]
+
+
+class OutOfCoreEngine(Engine):
+    """
+    Steps a volume stored on disk, slab by slab.
+
+    Parameters:
+        rule_fn (function): Rule applied at every step.
+        window_size (int): Side of the cubic neighbourhood window.
+        path (str): Directory holding the two state buffers (default: a
+            temporary directory removed on close).
+        memory_budget (int): Bytes allowed for the slab being stepped.
+    """
+    def __init__(self, rule_fn, window_size=3, path=None, memory_budget=256 * 2**20):
+        super().__init__(rule_fn, window_size)
+        self.radius = self.window_size // 2
+        self.memory_budget = memory_budget
+        self.owned = path is None
+        self.path = tempfile.mkdtemp(prefix='ca-') if path is None else path
+        os.makedirs(self.path, exist_ok=True)
+
+    def reset(self, volume):
+        os.makedirs(self.path, exist_ok=True)
+        self.buffers = [open_volume(os.path.join(self.path, f'state-{i}.npy'), volume.shape, volume.dtype)
+                        for i in range(2)]
+        self.slab = slab_size(volume.shape, volume.dtype, self.memory_budget, self.radius)
+        for lo in range(0, volume.shape[0], self.slab):
+            self.buffers[0][lo:lo + self.slab] = volume[lo:lo + self.slab]
+        self.current = 0
+        self._step = kernels.rule_step(self.rule_fn, self.window_size)
+
+    def step(self):
+        source, target = self.buffers[self.current], self.buffers[1 - self.current]
+        step_slabs(source, target, self._step, self.slab, self.radius)
+        target.flush()
+        self.current = 1 - self.current
+
+    def volume(self):
+        return self.buffers[self.current]
+
+    def close(self):
+        """
+        Drop the memmaps and, for a temporary directory, delete it with the
+        state files. volume() is no longer available afterwards.
+        """
+        self.buffers = []
+        if self.owned:
+            shutil.rmtree(self.path, ignore_errors=True)
+
+    def __del__(self):
+        self.close()
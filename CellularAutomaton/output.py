@@ -0,0 +1,163 @@
+"""
+Asynchronous per-step output for evolve_volume
+
+Frames are handed to a pool of background workers through a bounded number
+of in-flight slots, so simulation and file writing overlap. When every slot
+is taken, submit blocks until a frame is written (backpressure), which keeps
+memory bounded to max_pending frame copies.
+
+JCA
+"""
+import threading
+import time
+import warnings
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import CellularAutomaton.visualization as viz
+
+
+# Default writers: PNG render of every frame. States are stored in a run file
+# (see runfile.py); PLY point clouds are an export from it, or add
+# auxfun.save_as_pointcloud to the writers.
+WRITERS = (viz.render_as_pointcloud,)
+
+
+# State of a worker process, set by _init_worker
+_worker = {}
+
+
+def write_frame(writers, volume, path, timestep, kwargs):
+    """Run every writer on one frame. Returns the seconds spent writing."""
+    start = time.perf_counter()
+    for writer in writers:
+        writer(volume, path, timestep, **kwargs)
+    return time.perf_counter() - start
+
+
+def _init_worker(writers, path, options):
+    _worker.update(writers=writers, path=path, options=options)
+
+
+def _write_in_worker(volume, timestep, kwargs):
+    """write_frame with the writers, path and options sent once to this process."""
+    return write_frame(_worker['writers'], volume, _worker['path'], timestep, dict(_worker['options'], **kwargs))
+
+
+class FrameWriter:
+    """
+    Writes frames with a pool of background workers.
+
+    Parameters:
+        path (str): Output directory.
+        writers (tuple): Functions f(volume, path, timestep, **kwargs) run on
+            every frame (default: PNG render).
+        workers (int): Background workers; 0 writes synchronously in submit.
+        max_pending (int): Frames queued or being written before submit blocks.
+        processes (bool): Use worker processes (matplotlib's pyplot is not
+            thread-safe) instead of threads.
+        **options: Keyword arguments given to every writer for every frame
+            (e.g. voxel_size, cmap_dict). Worker processes receive them once,
+            when they start, rather than with every frame.
+
+    Attributes:
+        latencies (dict): Seconds spent writing each frame, by timestep.
+        errors (list): (timestep, exception) of every failed frame.
+    """
+    def __init__(self, path, writers=WRITERS, workers=2, max_pending=8, processes=True, **options):
+        self.path = path
+        self.writers = tuple(writers)
+        self.workers = workers
+        self.processes = processes
+        self.options = options
+        self.latencies = {}
+        self.errors = []
+        self.pending = 0
+        self.idle = threading.Condition()
+        self.slots = threading.BoundedSemaphore(max(1, max_pending))
+        self.executor = None
+
+    def set_defaults(self, **options):
+        """Options for every frame that were not given to the constructor. Call before the first submit."""
+        if self.executor is not None:
+            raise RuntimeError("FrameWriter options cannot change once frames were submitted.")
+        self.options = dict(options, **self.options)
+
+    def _start(self):
+        if self.processes:
+            self.executor = ProcessPoolExecutor(max_workers=self.workers, initializer=_init_worker,
+                                                initargs=(self.writers, self.path, self.options))
+        else:
+            self.executor = ThreadPoolExecutor(max_workers=self.workers)
+
+    def submit(self, volume, timestep, **kwargs):
+        """
+        Queue one frame. The volume is copied, so engine buffers can be reused.
+        `kwargs` are per-frame writer options on top of the constructor's.
+        """
+        if self.workers <= 0:
+            try:
+                self.latencies[timestep] = write_frame(self.writers, volume, self.path, timestep,
+                                                       dict(self.options, **kwargs))
+            except Exception as error:
+                self.errors.append((timestep, error))
+            return
+
+        if self.executor is None:
+            self._start()
+        self.slots.acquire()
+        with self.idle:
+            self.pending += 1
+        if self.processes:
+            future = self.executor.submit(_write_in_worker, volume.copy(), timestep, kwargs)
+        else:
+            future = self.executor.submit(write_frame, self.writers, volume.copy(), self.path, timestep,
+                                          dict(self.options, **kwargs))
+        future.add_done_callback(lambda f: self._done(f, timestep))
+
+    def _done(self, future, timestep):
+        try:
+            self.latencies[timestep] = future.result()
+        except Exception as error:
+            self.errors.append((timestep, error))
+        finally:
+            self.slots.release()
+            with self.idle:
+                self.pending -= 1
+                self.idle.notify_all()
+
+    def flush(self):
+        """
+        Wait until every queued frame is written. Raises RuntimeError, chained to
+        the first writer error, if any frame failed.
+        """
+        with self.idle:
+            self.idle.wait_for(lambda: self.pending == 0)
+
+        if self.errors:
+            errors, self.errors = sorted(self.errors, key=lambda e: e[0]), []
+            timestep, error = errors[0]
+            raise RuntimeError(f"{len(errors)} frame(s) failed to write, first at timestep {timestep}: "
+                               f"{error!r}") from error
+
+    def close(self, raise_errors=True):
+        """
+        Flush and stop the workers. With raise_errors False (used while
+        another exception propagates), failed frames are reported with a
+        warning instead of an exception that would replace it.
+        """
+        try:
+            self.flush()
+        except RuntimeError as error:
+            if raise_errors:
+                raise
+            warnings.warn(f"Frame writer errors ignored while handling another exception: {error}")
+        finally:
+            if self.executor is not None:
+                self.executor.shutdown()
+                self.executor = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        self.close(raise_errors=exc_type is None)
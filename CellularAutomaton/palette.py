@@ -0,0 +1,132 @@
+"""
+Dense ID palettes
+
+Cluster IDs are remapped to dense codes (0 = empty, 1..n = clusters, env_id
+kept as is) stored in the smallest signed dtype that fits, with a colour
+lookup table indexed by code, so colouring a volume is a single gather.
+Rules only compare IDs, so a run on codes gives the same result as a run on
+the original IDs.
+
+JCA
+"""
+import numpy as np
+
+
+def compact_dtype(lo, hi):
+    """Smallest signed integer dtype (int8, int16 or int32) holding [lo, hi]."""
+    for dtype in (np.int8, np.int16, np.int32):
+        info = np.iinfo(dtype)
+        if info.min <= lo and hi <= info.max:
+            return np.dtype(dtype)
+    return np.dtype(np.int64)
+
+
+class Palette:
+    """
+    Code -> colour table for a volume of dense codes. Also answers get() and
+    [] like a cmap_dict, so it can be passed wherever one is expected.
+
+    Parameters:
+        ids (array-like): Original ID of codes 1..n.
+        colors (array-like): n×3 RGB colours (0–1 floats) of codes 1..n.
+        env_id (int): Negative code of environment cells (kept as is).
+        env_color (tuple): Colour of environment cells.
+        empty_color (tuple): Colour of code 0.
+        default (tuple): Colour of codes without an entry.
+    """
+    def __init__(self, ids, colors, env_id=-1, env_color=(0.0, 0.0, 0.0), empty_color=(0.0, 0.0, 0.0),
+                 default=(0.5, 0.5, 0.5)):
+        if env_id >= 0:
+            raise ValueError("Palette needs a negative env_id.")
+        self.ids = np.asarray(ids, dtype=np.int64).reshape(-1)
+        self.env_id = env_id
+        self.default = tuple(default)
+        self.lo = env_id
+        self.hi = len(self.ids)
+        self.dtype = compact_dtype(self.lo, self.hi)
+
+        # Row i holds the colour of code lo + i
+        self.lut = np.empty((self.hi - self.lo + 1, 3), dtype=np.float32)
+        self.lut[:] = default
+        self.lut[env_id - self.lo] = env_color
+        self.lut[-self.lo] = empty_color
+        self.lut[1 - self.lo:] = np.asarray(colors, dtype=np.float32).reshape(-1, 3)
+
+        order = np.argsort(self.ids)
+        self._sorted_ids = self.ids[order]
+        self._sorted_codes = order + 1
+
+    @classmethod
+    def from_volume(cls, volume, cmap_dict=None, env_id=-1, **kwargs):
+        """
+        Palette of the positive IDs in `volume`, coloured from cmap_dict
+        (ID -> RGB, 0–1 floats) or at random.
+        """
+        ids = np.unique(volume[volume > 0])
+        if cmap_dict is None:
+            colors = np.random.rand(len(ids), 3)
+        else:
+            default = kwargs.get('default', (0.5, 0.5, 0.5))
+            colors = [cmap_dict.get(int(i), default) for i in ids]
+            if env_id in cmap_dict:
+                kwargs.setdefault('env_color', cmap_dict[env_id])
+        return cls(ids, colors, env_id, **kwargs)
+
+    def encode(self, volume):
+        """Volume of original IDs -> volume of codes in the palette dtype."""
+        codes = np.zeros(volume.shape, dtype=self.dtype)
+        live = volume > 0
+        codes[live] = self._sorted_codes[np.searchsorted(self._sorted_ids, volume[live])]
+        codes[volume == self.env_id] = self.env_id
+        return codes
+
+    def decode(self, codes, dtype=np.int64):
+        """Volume of codes -> volume of original IDs."""
+        table = np.concatenate([[0], self.ids]).astype(dtype)
+        volume = table[np.maximum(codes, 0)]
+        volume[codes == self.env_id] = self.env_id
+        return volume
+
+    def colors(self, codes):
+        """
+        RGB (0–1 floats) of every code, by one gather into the lookup table.
+        Codes outside [lo, hi] get the default colour.
+        """
+        rows = np.asarray(codes, dtype=np.intp) - self.lo
+        outside = (rows < 0) | (rows >= len(self.lut))
+        colors = self.lut[np.where(outside, 0, rows)]
+        colors[outside] = self.default
+        return colors
+
+    def get(self, code, default=None):
+        code = int(code)
+        if self.lo <= code <= self.hi:
+            return tuple(self.lut[code - self.lo])
+        return default
+
+    def __getitem__(self, code):
+        color = self.get(code)
+        if color is None:
+            raise KeyError(code)
+        return color
+
+    def __contains__(self, code):
+        return self.lo <= int(code) <= self.hi
+
+    def __len__(self):
+        return len(self.lut)
+
+
+def color_values(values, cmap_dict, default=(0.5, 0.5, 0.5)):
+    """
+    RGB of every value from a Palette (one gather) or a cmap_dict (one dict
+    lookup per distinct value).
+
+    Returns:
+        ndarray: N×3 float32 colours.
+    """
+    if isinstance(cmap_dict, Palette):
+        return cmap_dict.colors(values)
+    ids, inverse = np.unique(values, return_inverse=True)
+    lut = np.array([cmap_dict.get(int(v), default) for v in ids], dtype=np.float32).reshape(-1, 3)
+    return lut[inverse.ravel()]
@@ -0,0 +1,109 @@
+"""
+Multi-core stepping with shared memory
+
+The volume is split into slabs along the first axis. Two state buffers live
+in multiprocessing.shared_memory and a persistent pool of workers steps
+every slab, reading it with a halo of `radius` cells from one buffer and
+writing its interior to the other. Each generation is one pool.map, which
+acts as the barrier between generations. Slab edges see their real
+neighbours through the halo, so deterministic rules give exactly the
+single-process result.
+
+JCA
+"""
+import multiprocessing as mp
+import os
+from multiprocessing import shared_memory
+
+import numpy as np
+
+import CellularAutomaton.kernels as kernels
+from CellularAutomaton.engines import Engine
+
+
+# State of a pool worker, set by _init_worker
+_worker = {}
+
+
+def _init_worker(names, shape, dtype, rule_fn, window_size, bounds):
+    _worker['shm'] = [shared_memory.SharedMemory(name=name) for name in names]
+    _worker['buffers'] = [np.ndarray(shape, dtype=dtype, buffer=shm.buf) for shm in _worker['shm']]
+    _worker['step'] = kernels.rule_step(rule_fn, window_size)
+    _worker['radius'] = window_size // 2
+    _worker['bounds'] = bounds
+
+
+def _step_slab(task):
+    """Step slab `k` from buffer `src` into the other buffer."""
+    k, src = task
+    source, target = _worker['buffers'][src], _worker['buffers'][1 - src]
+    lo, hi = _worker['bounds'][k]
+    r = _worker['radius']
+    a, b = max(lo - r, 0), min(hi + r, source.shape[0])
+    new = _worker['step'](source[a:b])
+    target[lo:hi] = new[lo - a:hi - a]
+
+
+class ParallelEngine(Engine):
+    """
+    Steps slabs of a dense volume in parallel worker processes.
+
+    Parameters:
+        rule_fn (function): Rule applied at every step. Must be picklable on
+            platforms without the 'fork' start method.
+        window_size (int): Side of the cubic neighbourhood window.
+        workers (int): Worker processes (default: CPU count).
+        slabs (int): Slabs per generation (default: one per worker).
+    """
+    def __init__(self, rule_fn, window_size=3, workers=None, slabs=None):
+        super().__init__(rule_fn, window_size)
+        self.workers = workers or os.cpu_count() or 1
+        self.slabs = slabs or self.workers
+        self.pool = None
+        self.shm = []
+
+    def reset(self, volume):
+        self.close()
+        self.shape, self.dtype = volume.shape, volume.dtype
+
+        self.shm = [shared_memory.SharedMemory(create=True, size=max(volume.nbytes, 1)) for _ in range(2)]
+        self.buffers = [np.ndarray(volume.shape, dtype=volume.dtype, buffer=shm.buf) for shm in self.shm]
+        self.buffers[0][:] = volume
+        self.current = 0
+
+        edges = np.linspace(0, volume.shape[0], min(self.slabs, volume.shape[0]) + 1).astype(int)
+        bounds = list(zip(edges[:-1], edges[1:]))
+        self.tasks = len(bounds)
+
+        # 'fork' passes rule_fn (often a closure) to the workers without pickling
+        methods = mp.get_all_start_methods()
+        context = mp.get_context('fork' if 'fork' in methods else None)
+        self.pool = context.Pool(self.workers, _init_worker,
+                                 ([shm.name for shm in self.shm], volume.shape, volume.dtype,
+                                  self.rule_fn, self.window_size, bounds))
+
+    def step(self):
+        self.pool.map(_step_slab, [(k, self.current) for k in range(self.tasks)])
+        self.current = 1 - self.current
+
+    def volume(self):
+        return self.buffers[self.current]
+
+    def close(self):
+        """
+        Stop the workers and release the shared buffers. The state is copied
+        out first, so volume() keeps serving it until the engine is reset.
+        """
+        if self.pool is not None:
+            self.pool.terminate()
+            self.pool.join()
+            self.pool = None
+            state = self.buffers[self.current].copy()
+            self.buffers = [state, state]   # drop the views before the segments are closed
+            for shm in self.shm:
+                shm.close()
+                shm.unlink()
+            self.shm = []
+
+    def __del__(self):
+        self.close()
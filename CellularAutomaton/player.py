@@ -0,0 +1,443 @@
+"""
+Animated Open3D playback of a run
+
+A Player shows a sequence of volumes (the states returned by evolve_volume,
+a RunReader, a DeltaHistory, ...) or an iterator of volumes in one Open3D
+window. The point cloud is created once; between frames only the points of
+cells that appeared, disappeared or changed ID are rewritten. Frames are
+decoded (live cells, coordinates and colours) ahead of the playback
+position on a background thread, each only once: as its delta with the
+previous frame when decoded in order, in full otherwise. Playing forward
+thus costs the number of changed cells, not the number of live ones. The
+full form needed to seek to a delta-decoded frame is built on demand, from
+the source for sequences and by replaying the deltas since the last
+keyframe for iterators. The event loop is driven with tick(), so playback
+never blocks in draw_geometries.
+
+Keys: space play/pause, right/left one step, up/down ten steps, Home/End
+first/last frame.
+
+JCA
+"""
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+import open3d as o3d
+
+from CellularAutomaton.palette import color_values
+
+
+# GLFW key codes
+KEY_SPACE, KEY_RIGHT, KEY_LEFT, KEY_DOWN, KEY_UP, KEY_HOME, KEY_END = 32, 262, 263, 264, 265, 268, 269
+
+
+def decode_frame(volume, cmap_dict=None, voxel_size=1.0, color=(0.6, 0.6, 0.6)):
+    """
+    Sparse form of a volume for playback.
+
+    Returns:
+        cells (ndarray): Flat indices of the non-zero cells, ascending.
+        values (ndarray): Their values.
+        points (ndarray): N×3 coordinates.
+        colors (ndarray): N×3 RGB (0–1 floats).
+    """
+    volume = np.asarray(volume)
+    cells = np.flatnonzero(volume)
+    values = volume.ravel()[cells]
+    points = np.column_stack(np.unravel_index(cells, volume.shape)).astype(np.float64) * voxel_size
+    if cmap_dict is None:
+        colors = np.tile(np.asarray(color, dtype=np.float64), (len(cells), 1))
+    else:
+        colors = color_values(values, cmap_dict, default=color).astype(np.float64)
+    return cells, values, points, colors
+
+
+def decode_delta(volume, previous, cmap_dict=None, voxel_size=1.0, color=(0.6, 0.6, 0.6)):
+    """
+    Cells that differ between `previous` and `volume`, in the form of
+    decode_frame (values 0 for cells that became empty).
+    """
+    volume = np.asarray(volume)
+    cells = np.flatnonzero(volume != previous)
+    values = volume.ravel()[cells]
+    points = np.column_stack(np.unravel_index(cells, volume.shape)).astype(np.float64) * voxel_size
+    if cmap_dict is None:
+        colors = np.tile(np.asarray(color, dtype=np.float64), (len(cells), 1))
+    else:
+        colors = color_values(values, cmap_dict, default=color).astype(np.float64)
+    return cells, values, points, colors
+
+
+class Prefetcher:
+    """
+    Decodes frames on a background thread.
+
+    Sequences (len and indexing) are decoded `ahead` frames past the last
+    requested position into an LRU cache of `cache` frames. Iterators are
+    consumed in order and every decoded frame is kept, so they can be
+    seeked backwards.
+
+    Parameters:
+        source: Sequence or iterator of volumes.
+        decode (function): f(volume, previous) -> decoded frame, `previous`
+            being the volume of the frame before when it was the last one
+            decoded (None otherwise).
+        ahead (int): Frames decoded past the requested position.
+        cache (int): Decoded frames kept for sequences.
+        keyframe_every (int): Iterators: `previous` is None every this many
+            frames (0, k, 2k, ...), so a frame can be rebuilt from a keyframe
+            at most k - 1 frames before it.
+    """
+    def __init__(self, source, decode, ahead=16, cache=64, keyframe_every=32):
+        self.decode = decode
+        self.ahead = ahead
+        self.cache_size = max(cache, ahead + 1)
+        self.keyframe_every = keyframe_every
+        self.indexed = hasattr(source, '__len__') and hasattr(source, '__getitem__')
+        self.source = source if self.indexed else iter(source)
+        self.frames = OrderedDict() if self.indexed else []
+        self.length = len(source) if self.indexed else None
+        self.target = 0
+        self.last = (None, None)  # (position, volume) of the last decoded frame
+        self.closed = False
+        self.reading = threading.Lock()  # sources are read from both threads (see read)
+        self.changed = threading.Condition()
+        self.thread = threading.Thread(target=self._work, daemon=True)
+        self.thread.start()
+
+    def __len__(self):
+        """Number of frames (for iterators, decoded so far until exhausted)."""
+        return self.length if self.length is not None else len(self.frames)
+
+    @property
+    def complete(self):
+        """True when the number of frames is known."""
+        return self.length is not None
+
+    def _next_index(self):
+        """Next sequence position to decode, or None when the window is full."""
+        for i in range(self.target, min(self.target + self.ahead + 1, self.length)):
+            if i not in self.frames:
+                return i
+        return None
+
+    def _work(self):
+        while True:
+            with self.changed:
+                while not self.closed:
+                    if self.indexed:
+                        i = self._next_index()
+                        if i is not None:
+                            break
+                    elif self.length is None and len(self.frames) <= self.target + self.ahead:
+                        break
+                    self.changed.wait()
+                if self.closed:
+                    return
+
+            if self.indexed:
+                volume = self.read(i)
+                position, previous = self.last
+                frame = self.decode(volume, previous if position == i - 1 else None)
+                self.last = (i, volume)
+                with self.changed:
+                    self.frames[i] = frame
+                    while len(self.frames) > self.cache_size:
+                        self.frames.popitem(last=False)
+                    self.changed.notify_all()
+            else:
+                volume = next(self.source, None)
+                frame = None
+                if volume is not None:
+                    keyframe = len(self.frames) % self.keyframe_every == 0
+                    frame = self.decode(volume, None if keyframe else self.last[1])
+                    # Iterators may reuse their buffer (e.g. iterate_volume)
+                    self.last = (len(self.frames), np.array(volume))
+                with self.changed:
+                    if frame is None:
+                        self.length = len(self.frames)
+                    else:
+                        self.frames.append(frame)
+                    self.changed.notify_all()
+
+    def read(self, i):
+        """Volume at position `i` of a sequence source."""
+        with self.reading:
+            return self.source[i]
+
+    def get(self, i):
+        """Decoded frame `i`, waiting for it if needed (None past the end)."""
+        with self.changed:
+            self.target = i
+            self.changed.notify_all()
+            while True:
+                if self.length is not None and i >= self.length:
+                    return None
+                if self.indexed and i in self.frames:
+                    self.frames.move_to_end(i)
+                    return self.frames[i]
+                if not self.indexed and i < len(self.frames):
+                    return self.frames[i]
+                self.changed.wait()
+
+    def close(self):
+        with self.changed:
+            self.closed = True
+            self.changed.notify_all()
+        self.thread.join()
+
+
+class PointSlots:
+    """
+    Compact point and colour buffers following the live cells of a volume.
+
+    Slots [0, n) hold the shown cells. show() and advance() rewrite only the
+    slots of cells that appeared, disappeared (their slot is refilled with an
+    added cell or with a cell moved from the end) or changed colour.
+
+    Parameters:
+        size (int): Number of cells of the volume.
+        capacity (int): Initial number of slots (grown by doubling).
+    """
+    def __init__(self, size, capacity=1024):
+        self.points = np.zeros((capacity, 3))
+        self.colors = np.zeros((capacity, 3))
+        self.cell = np.zeros(capacity, dtype=np.int64)       # cell shown by each slot
+        self.slot = np.full(size, -1, dtype=np.int64)        # slot of each cell
+        self.values = None                                   # value shown at each cell
+        self.stamp = np.zeros(size, dtype=np.int64)
+        self.frame = 0
+        self.n = 0
+
+    def _reserve(self, n):
+        if n > len(self.cell):
+            capacity = max(n, 2 * len(self.cell))
+            grow = capacity - len(self.cell)
+            self.points = np.concatenate([self.points, np.zeros((grow, 3))])
+            self.colors = np.concatenate([self.colors, np.zeros((grow, 3))])
+            self.cell = np.concatenate([self.cell, np.zeros(grow, dtype=np.int64)])
+
+    def show(self, frame):
+        """
+        Move the buffers to a decoded frame (see decode_frame).
+
+        Returns:
+            ndarray: Slots below the new n whose point or colour changed
+                (slots from the old n up are rewritten anyway).
+        """
+        cells, values, points, colors = frame
+        if self.values is None:
+            self.values = np.zeros(len(self.slot), dtype=values.dtype)
+
+        # Cells shown now but not in the frame
+        self.frame += 1
+        self.stamp[cells] = self.frame
+        shown = self.cell[:self.n]
+        removed = shown[self.stamp[shown] != self.frame]
+        return self._update(cells, values, points, colors, removed)
+
+    def advance(self, delta):
+        """
+        Move the buffers by the delta to the next frame (see decode_delta).
+        Same result as show() on that frame, at a cost that only depends on
+        the number of changed cells.
+        """
+        cells, values, points, colors = delta
+        old = self.values[cells]
+        removed = cells[(values == 0) & (old != 0)]
+        keep = values != 0
+        return self._update(cells[keep], values[keep], points[keep], colors[keep], removed)
+
+    def _update(self, cells, values, points, colors, removed):
+        """Show `cells` (added or recoloured when their value changed) and hide `removed`."""
+        old = self.values[cells]
+        added = np.flatnonzero(old == 0)
+        recolor = np.flatnonzero((old != 0) & (old != values))
+        self.values[removed] = 0
+        self.values[cells] = values
+
+        holes = np.sort(self.slot[removed])  # added cells fill the lowest holes, all below the new end
+        self.slot[removed] = -1
+        k = min(len(holes), len(added))
+        n = self.n + len(added) - len(holes)
+
+        # Fill holes with added cells, append the rest
+        targets = np.concatenate([holes[:k], np.arange(self.n, self.n + len(added) - k)])
+        self._reserve(n)
+
+        moved = np.zeros(0, dtype=np.int64)
+        if len(holes) > k:
+            # Close the remaining holes with the live slots past the new end
+            left = holes[k:]
+            tail = np.setdiff1d(np.arange(n, self.n), left, assume_unique=True)
+            moved = left[left < n]
+            self.points[moved] = self.points[tail]
+            self.colors[moved] = self.colors[tail]
+            self.cell[moved] = self.cell[tail]
+            self.slot[self.cell[moved]] = moved
+
+        self.cell[targets] = cells[added]
+        self.slot[cells[added]] = targets
+        self.points[targets] = points[added]
+        self.colors[targets] = colors[added]
+        recolored = self.slot[cells[recolor]]
+        self.colors[recolored] = colors[recolor]
+
+        self.n = n
+        changed = np.concatenate([targets, moved, recolored])
+        return changed[changed < n]
+
+
+class Player:
+    """
+    Interactive playback of a run in an Open3D window.
+
+    Parameters:
+        source: Sequence (list of states, RunReader, DeltaHistory, ...) or
+            iterator of volumes.
+        cmap_dict (dict or Palette): ID -> RGB mapping (0–1 floats); without
+            it every cell gets `color`.
+        voxel_size (float): Point spacing.
+        fps (float): Frames per second while playing.
+        loop (bool): Restart from the first frame at the end.
+        color (tuple): RGB of cells without a colour.
+        point_size (float): Rendered point size in pixels.
+        prefetch (int): Frames decoded ahead on the background thread.
+        cache (int): Decoded frames kept (sequences).
+        keyframe_every (int): Frames of an iterator decoded in full (see
+            Prefetcher): seeking replays at most this many deltas.
+        window_name (str), width (int), height (int): Window options.
+
+    Use run() for a blocking loop or call tick() from your own loop.
+    """
+    def __init__(self, source, cmap_dict=None, voxel_size=1.0, fps=10, loop=False, color=(0.6, 0.6, 0.6),
+                 point_size=5.0, prefetch=16, cache=64, keyframe_every=32, window_name='CellularAutomaton',
+                 width=1024, height=768):
+        self.decode_frame = lambda volume: decode_frame(volume, cmap_dict, voxel_size, color)
+
+        def decode(volume, previous):
+            # (shape, full frame, delta): only one of the two is decoded
+            if previous is None:
+                return volume.shape, self.decode_frame(volume), None
+            return volume.shape, None, decode_delta(volume, previous, cmap_dict, voxel_size, color)
+        self.frames = Prefetcher(source, decode, prefetch, cache, keyframe_every)
+        self.fps = fps
+        self.loop = loop
+        self.playing = True
+        self.position = -1
+        self.next_time = 0.0
+        self.slots = None
+
+        self.pcd = o3d.geometry.PointCloud()
+        self.vis = o3d.visualization.VisualizerWithKeyCallback()
+        self.vis.create_window(window_name=window_name, width=width, height=height)
+        self.vis.get_render_option().point_size = point_size
+        for key, action in ((KEY_SPACE, self.toggle), (KEY_RIGHT, lambda: self.step(1)),
+                            (KEY_LEFT, lambda: self.step(-1)), (KEY_UP, lambda: self.step(10)),
+                            (KEY_DOWN, lambda: self.step(-10)), (KEY_HOME, lambda: self.seek(0)),
+                            (KEY_END, lambda: self.seek(-1))):
+            self.vis.register_key_callback(key, lambda vis, action=action: action() or False)
+        self.seek(0)
+
+    def _show(self, i):
+        frame = self.frames.get(i)
+        if frame is None:
+            return False
+        shape, frame, delta = frame
+        first = self.slots is None
+        if delta is not None and not first and i == self.position + 1:
+            old_n = self.slots.n
+            changed = self.slots.advance(delta)
+        elif frame is not None or self.frames.indexed:
+            if frame is None:
+                frame = self.decode_frame(self.frames.read(i))
+            if first:
+                self.slots = PointSlots(int(np.prod(shape)), max(1024, 2 * len(frame[0])))
+            old_n = self.slots.n
+            changed = self.slots.show(frame)
+        else:
+            # Iterator frame decoded as a delta: replay from the keyframe before it
+            k = i - i % self.frames.keyframe_every
+            keyframe = self.frames.get(k)[1]
+            if first:
+                self.slots = PointSlots(int(np.prod(shape)), max(1024, 2 * len(keyframe[0])))
+            old_n = self.slots.n
+            self.slots.show(keyframe)
+            for j in range(k + 1, i + 1):
+                self.slots.advance(self.frames.get(j)[2])
+            changed = np.arange(self.slots.n)
+        n = self.slots.n
+
+        points, colors = self.pcd.points, self.pcd.colors
+        if n < old_n:
+            del points[n:], colors[n:]
+        elif n > old_n:
+            points.extend(o3d.utility.Vector3dVector(self.slots.points[old_n:n]))
+            colors.extend(o3d.utility.Vector3dVector(self.slots.colors[old_n:n]))
+        changed = changed[changed < min(n, old_n)]
+        if len(changed):
+            np.asarray(points)[changed] = self.slots.points[changed]
+            np.asarray(colors)[changed] = self.slots.colors[changed]
+
+        if first:
+            self.vis.add_geometry(self.pcd)
+        else:
+            self.vis.update_geometry(self.pcd)
+        self.position = i
+        return True
+
+    def seek(self, i):
+        """Show frame `i` (negative counts from the end, once the length is known)."""
+        if i < 0:
+            if not self.frames.complete:
+                return
+            i += len(self.frames)
+        self._show(max(i, 0))
+
+    def step(self, n=1):
+        """Pause and move `n` frames."""
+        self.playing = False
+        self.seek(max(self.position + n, 0))
+
+    def play(self):
+        self.playing = True
+
+    def pause(self):
+        self.playing = False
+
+    def toggle(self):
+        self.playing = not self.playing
+
+    def tick(self):
+        """
+        One iteration of the event loop: advance when playing and the frame
+        is due, process window events and render.
+
+        Returns:
+            bool: False once the window is closed.
+        """
+        now = time.perf_counter()
+        if self.playing and now >= self.next_time:
+            self.next_time = now + 1.0 / self.fps
+            if not self._show(self.position + 1):
+                if self.loop:
+                    self._show(0)
+                else:
+                    self.playing = False
+        alive = self.vis.poll_events()
+        self.vis.update_renderer()
+        return alive
+
+    def run(self):
+        """Play until the window is closed."""
+        try:
+            while self.tick():
+                time.sleep(0.001)
+        finally:
+            self.close()
+
+    def close(self):
+        self.frames.close()
+        self.vis.destroy_window()
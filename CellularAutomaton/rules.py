@@ -0,0 +1,370 @@
+"""
+Declarative rules
+
+A RuleSpec describes a rule instead of hiding it in a callback: survival
+and birth counts, neighbourhood (Moore or von Neumann, radius r),
+environment handling, how newborns get their ID and the number of states.
+compile_rule turns a spec into a rule function with a fused vectorized
+kernel, compiled once per spec. Neighbours are counted with separable box
+sums (Moore) or by FFT with a cached kernel spectrum, whichever is cheaper,
+so the cost of a step barely depends on the radius (Larger than Life-style
+rules). parse_rule reads the usual S/B/C/N notation of 3D rules, e.g.
+"4/5/2/M" or "2,6,9/4,6,8-9/10/M".
+
+Rules with more than 2 states are 'Generations' rules: a live cell that does
+not survive starts decaying through C - 2 dying stages before it is empty
+again. Dying cells do not count as neighbours and nothing is born on them.
+They are stored as negative codes: stage k (1 = just died) is -(k + 1), so
+-2 ... -(C - 1), and env_id must lie outside that range.
+
+JCA
+"""
+import random
+from collections import Counter
+from functools import lru_cache
+
+import numpy as np
+from scipy.ndimage import convolve, correlate1d, maximum_filter
+
+import CellularAutomaton.kernels as kernels
+from CellularAutomaton.codebook import life3d_rule_generalized
+
+
+NEIGHBOURHOODS = ('moore', 'von_neumann')
+INHERIT = ('majority', 'max', 'none')
+METHODS = ('auto', 'direct', 'fft')  # neighbour counting
+
+# Neighbourhood letters of the S/B/C/N notation
+LETTERS = {'M': 'moore', 'N': 'von_neumann', 'VN': 'von_neumann'}
+
+
+class RuleSpec:
+    """
+    Declarative description of a rule. Specs are immutable, hashable and
+    compare equal when they describe the same rule.
+
+    Parameters:
+        survival (iterable[int]): Neighbour counts for which a live cell survives.
+        birth (iterable[int]): Neighbour counts for which an empty cell is born.
+        states (int): Number of states (2 = Life-like, more = Generations decay).
+        neighbourhood (str): 'moore' (cube) or 'von_neumann' (|dx|+|dy|+|dz| <= radius).
+        radius (int): Neighbourhood radius.
+        env_id (int): ID of static environment cells.
+        env_counts (bool): Environment cells count as live neighbours.
+        inherit (str): ID of newborns: 'majority' of the live neighbours (ties
+            broken with random.choice), their 'max' ID, or 'none' (always 1).
+            With 'majority' and 'max' a birth needs a live neighbour to inherit
+            from. The majority vote gathers every neighbour of every birth, so
+            prefer 'max' or 'none' for large radii.
+    """
+    def __init__(self, survival=(2, 3), birth=(3,), states=2, neighbourhood='moore', radius=1,
+                 env_id=-1, env_counts=True, inherit='majority'):
+        if neighbourhood not in NEIGHBOURHOODS:
+            raise ValueError(f"neighbourhood must be one of {NEIGHBOURHOODS}.")
+        if inherit not in INHERIT:
+            raise ValueError(f"inherit must be one of {INHERIT}.")
+        if radius < 1:
+            raise ValueError("radius must be at least 1.")
+        if states < 2:
+            raise ValueError("A rule needs at least 2 states.")
+        if -(states - 1) <= env_id <= -2 or env_id >= 0:
+            raise ValueError(f"env_id must be negative and outside the dying codes -2..-{states - 1}.")
+
+        self.survival = frozenset(int(c) for c in survival)
+        self.birth = frozenset(int(c) for c in birth)
+        self.states = int(states)
+        self.neighbourhood = neighbourhood
+        self.radius = int(radius)
+        self.env_id = int(env_id)
+        self.env_counts = bool(env_counts)
+        self.inherit = inherit
+
+    @property
+    def key(self):
+        return (self.survival, self.birth, self.states, self.neighbourhood, self.radius,
+                self.env_id, self.env_counts, self.inherit)
+
+    @property
+    def window_size(self):
+        return 2 * self.radius + 1
+
+    def footprint(self):
+        """Boolean (2r+1)³ mask of the neighbourhood, center excluded."""
+        r = self.radius
+        x, y, z = np.ogrid[-r:r + 1, -r:r + 1, -r:r + 1]
+        if self.neighbourhood == 'moore':
+            mask = np.ones((self.window_size,) * 3, dtype=bool)
+        else:
+            mask = np.abs(x) + np.abs(y) + np.abs(z) <= r
+        mask[r, r, r] = False
+        return mask
+
+    @property
+    def size(self):
+        """Number of neighbours."""
+        return int(self.footprint().sum())
+
+    @property
+    def life_like(self):
+        """True for rules life3d_rule_generalized (and the engines built on it) can run."""
+        return (self.states == 2 and self.neighbourhood == 'moore' and self.radius == 1
+                and self.env_counts and self.inherit == 'majority')
+
+    def params(self):
+        """JSON-friendly dict of the spec."""
+        return {'survival': sorted(self.survival), 'birth': sorted(self.birth), 'states': self.states,
+                'neighbourhood': self.neighbourhood, 'radius': self.radius, 'env_id': self.env_id,
+                'env_counts': self.env_counts, 'inherit': self.inherit}
+
+    def __eq__(self, other):
+        return isinstance(other, RuleSpec) and self.key == other.key
+
+    def __hash__(self):
+        return hash(self.key)
+
+    def __str__(self):
+        """S/B/C/N notation (the radius and the ID options are not part of it)."""
+        letter = 'M' if self.neighbourhood == 'moore' else 'N'
+        return f'{_format_counts(self.survival)}/{_format_counts(self.birth)}/{self.states}/{letter}'
+
+    def __repr__(self):
+        return 'RuleSpec({})'.format(', '.join(f'{k}={v!r}' for k, v in self.params().items()))
+
+
+def _format_counts(counts):
+    """Sorted counts with runs written as ranges: {4, 6, 8, 9, 10} -> '4,6,8-10'."""
+    parts, counts = [], sorted(counts)
+    i = 0
+    while i < len(counts):
+        j = i
+        while j + 1 < len(counts) and counts[j + 1] == counts[j] + 1:
+            j += 1
+        parts.append(str(counts[i]) if j - i < 2 else f'{counts[i]}-{counts[j]}')
+        if j - i == 1:
+            parts.append(str(counts[j]))
+        i = j + 1
+    return ','.join(parts)
+
+
+def _parse_counts(field, digits=False):
+    """'4,6,8-10' -> {4, 6, 8, 9, 10}. With `digits`, '23' (Life notation) -> {2, 3}."""
+    if digits and field.isdigit():
+        return {int(c) for c in field}
+    counts = set()
+    for part in filter(None, field.replace(' ', '').split(',')):
+        lo, _, hi = part.partition('-')
+        counts.update(range(int(lo), int(hi or lo) + 1))
+    return counts
+
+
+def parse_rule(notation, **kwargs):
+    """
+    RuleSpec from the S/B/C/N notation of 3D rules: survival counts, birth
+    counts, number of states and neighbourhood ('M' = Moore, 'N' = von
+    Neumann), e.g. "4/5/2/M" or "9-26/5-7,12-13,15/5/M". The Life notation
+    "B3/S23" is read too (one digit per count unless commas or ranges are
+    used). Other RuleSpec options (radius, env_id, ...) are given as keyword
+    arguments.
+    """
+    fields = notation.strip().upper().split('/')
+    if fields[0].startswith(('B', 'S')):
+        named = {f[:1]: f[1:] for f in fields}
+        if set(named) != {'B', 'S'}:
+            raise ValueError(f"Cannot parse rule '{notation}': expected 'B.../S...'.")
+        return RuleSpec(_parse_counts(named['S'], True), _parse_counts(named['B'], True), **kwargs)
+
+    if len(fields) != 4 or fields[3] not in LETTERS:
+        raise ValueError(f"Cannot parse rule '{notation}': expected 'S/B/C/N', e.g. '4/5/2/M'.")
+    survival, birth, states, letter = fields
+    return RuleSpec(_parse_counts(survival), _parse_counts(birth), int(states), LETTERS[letter], **kwargs)
+
+
+def neighbour_counter(spec, method='auto'):
+    """
+    Returns f(alive) -> number of alive neighbours of every cell for the
+    neighbourhood of `spec`.
+
+    Parameters:
+        spec (RuleSpec): Rule whose neighbourhood is counted.
+        method (str): 'direct' (Moore boxes summed separably in three 1D
+            passes, other shapes with one 3D convolution), 'fft' (see
+            kernels.FFTCounter) or 'auto', choosing per volume shape from the
+            estimated cost of both (kernels.fft_is_faster).
+    """
+    if method not in METHODS:
+        raise ValueError(f"method must be one of {METHODS}.")
+    size = spec.size
+    dtype = np.uint8 if size < 2**8 else np.uint16
+    if spec.neighbourhood == 'moore':
+        ones = np.ones(spec.window_size, dtype=dtype)
+        direct_cost = spec.window_size  # three 1D passes, each cheaper than a 3D tap
+
+        def direct(alive):
+            alive = alive.astype(dtype)
+            counts = alive
+            for axis in range(3):
+                counts = correlate1d(counts, ones, axis=axis, mode='constant', cval=0)
+            counts -= alive
+            return counts
+    else:
+        kernel = spec.footprint().astype(dtype)
+        direct_cost = size
+
+        def direct(alive):
+            return convolve(alive.astype(dtype), kernel, mode='constant', cval=0)
+
+    if method == 'direct':
+        return direct
+    spectral = kernels.FFTCounter(spec.footprint())
+    if method == 'fft':
+        return lambda alive: spectral(alive, dtype)
+
+    def count(alive):
+        if kernels.fft_is_faster(alive.shape, direct_cost, spectral.radius):
+            return spectral(alive, dtype)
+        return direct(alive)
+    return count
+
+
+def neighbour_maximum(spec):
+    """
+    Returns f(ids) -> largest value in the neighbourhood of every cell (the
+    cell itself included; births only happen on empty cells). Moore boxes take
+    three 1D passes and a von Neumann diamond of radius r is r passes of the
+    radius-1 cross, so the cost grows at most linearly with the radius.
+    """
+    if spec.neighbourhood == 'moore':
+        return lambda ids: maximum_filter(ids, size=spec.window_size, mode='constant', cval=0)
+
+    cross = RuleSpec(neighbourhood='von_neumann').footprint()
+    cross[1, 1, 1] = True
+
+    def maximum(ids):
+        for _ in range(spec.radius):
+            ids = maximum_filter(ids, footprint=cross, mode='constant', cval=0)
+        return ids
+    return maximum
+
+
+def rule_kernel(spec, method='auto'):
+    """
+    Fused whole-volume step for `spec`: f(volume, out=None) -> new_volume.
+    Survival, decay, environment and births are evaluated with array
+    operations over one neighbour count (see neighbour_counter for `method`).
+    """
+    count = neighbour_counter(spec, method)
+    survive_lut = kernels.count_lut(spec.survival, spec.size + 1)
+    birth_lut = kernels.count_lut(spec.birth, spec.size + 1)
+    last = -(spec.states - 1)  # code of the last dying stage
+    r, env_id = spec.radius, spec.env_id
+    offsets = [tuple(o) for o in np.argwhere(spec.footprint())]
+    neighbour_max = neighbour_maximum(spec)
+
+    def step(volume, out=None):
+        env = volume == env_id
+        live = volume > 0
+        counts = count(live | env if spec.env_counts else live)
+
+        new_volume = np.empty_like(volume) if out is None else out
+        new_volume.fill(0)
+        survive = live & survive_lut[counts]
+        np.copyto(new_volume, volume, where=survive)
+        if spec.states > 2:
+            # Live cells that do not survive start dying; dying cells move one stage on
+            new_volume[live & ~survive] = -2
+            np.copyto(new_volume, volume - 1, where=(volume < -1) & (volume > last))
+        new_volume[env] = env_id
+
+        births = (volume == 0) & birth_lut[counts]
+        if spec.inherit == 'none':
+            new_volume[births] = 1
+        elif spec.inherit == 'max':
+            nearest = neighbour_max(np.where(live, volume, 0))
+            np.copyto(new_volume, nearest, where=births)
+        else:
+            cells = np.nonzero(births)
+            if cells[0].size:
+                neighbours = kernels.neighbour_values(volume, cells, offsets, r)
+                neighbours[neighbours < 0] = 0  # environment and dying cells do not vote
+                winner, tie, voters = kernels.majority_id(neighbours, env_id)
+                for row in np.flatnonzero(tie):
+                    winner[row] = random.choice([int(x) for x in neighbours[row] if x > 0])
+                new_volume[cells] = np.where(voters, winner, 0)
+        return new_volume
+    return step
+
+
+def rule_function(spec):
+    """
+    Per-voxel form of `spec` for generic_filter: f(vector) -> new state,
+    `vector` being the flattened (2r+1)³ window. Reference implementation of
+    rule_kernel (slow).
+    """
+    mask = spec.footprint().ravel()
+    last = -(spec.states - 1)
+
+    def rule_fn(vector):
+        center = int(vector[len(vector) // 2])
+        neighbours = vector[mask].astype(int)
+        if center == spec.env_id:
+            return spec.env_id
+        if last <= center <= -2:
+            return center - 1 if center > last else 0
+
+        ids = [int(x) for x in neighbours if x > 0]
+        live_count = len(ids)
+        if spec.env_counts:
+            live_count += int(np.count_nonzero(neighbours == spec.env_id))
+
+        if center > 0:
+            if live_count in spec.survival:
+                return center
+            return -2 if spec.states > 2 else 0
+        if live_count not in spec.birth:
+            return 0
+        if spec.inherit == 'none':
+            return 1
+        if not ids:
+            return 0
+        if spec.inherit == 'max':
+            return max(ids)
+        most_common = Counter(ids).most_common()
+        if len(most_common) == 1 or most_common[0][1] > most_common[1][1]:
+            return most_common[0][0]
+        return random.choice(ids)
+    return rule_fn
+
+
+@lru_cache(maxsize=None)
+def _compile(spec, method):
+    if spec.life_like and method == 'auto':
+        rule_fn = life3d_rule_generalized(spec.env_id, set(spec.birth), set(spec.survival))
+    else:
+        rule_fn = rule_function(spec)
+        rule_fn.vectorized = rule_kernel(spec, method)
+    rule_fn.spec = spec
+    rule_fn.window_size = spec.window_size
+    return rule_fn
+
+
+def compile_rule(spec, method='auto', **kwargs):
+    """
+    Rule function for a RuleSpec or a notation string (see parse_rule, which
+    receives `kwargs`). Compiled once per spec and `method` (neighbour
+    counting, see neighbour_counter): equal specs return the same function.
+
+    Returns:
+        function: A rule function compatible with the evolve_volume() system.
+            `vectorized` holds its fused kernel, `spec` the RuleSpec and
+            `window_size` the side of its window. Life-like specs (2 states,
+            Moore radius 1, majority inheritance) come from
+            life3d_rule_generalized, so they also carry `params` and run on
+            every engine (with the default `method`).
+    """
+    if isinstance(spec, str):
+        spec = parse_rule(spec, **kwargs)
+    elif kwargs:
+        raise ValueError("Options are only accepted with a notation string.")
+    if method not in METHODS:
+        raise ValueError(f"method must be one of {METHODS}.")
+    return _compile(spec, method)
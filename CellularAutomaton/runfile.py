@@ -0,0 +1,233 @@
+"""
+Run files: chunked, compressed multi-timestep volumes
+
+Layout of a run file:
+    MAGIC | chunk data ... | header (JSON) | header offset (uint64) | MAGIC
+
+Every timestep is cut into chunks of `chunk_shape` cells, each compressed
+with zlib (or stored raw) and appended as it is written. The header, written
+on close, holds the shape, dtype, colours, rule parameters and the offset
+and size of every chunk, so a reader can decompress (or memory-map, for raw
+chunks) a single chunk or timestep without reading the rest of the file.
+
+JCA
+"""
+import json
+import os
+import struct
+import zlib
+
+import numpy as np
+
+import CellularAutomaton.auxfun as aux
+from CellularAutomaton.history import History
+from CellularAutomaton.palette import Palette
+
+
+MAGIC = b'CARUN\x00\x01\x00'
+COMPRESSIONS = (None, 'zlib')
+
+
+def _encode_colors(cmap_dict):
+    """JSON form of a cmap_dict or Palette."""
+    if cmap_dict is None:
+        return None
+    if isinstance(cmap_dict, Palette):
+        return {'palette': {'ids': cmap_dict.ids.tolist(), 'lut': cmap_dict.lut.tolist(),
+                            'env_id': cmap_dict.env_id}}
+    return {'dict': [[int(k), [float(c) for c in v]] for k, v in cmap_dict.items()]}
+
+
+def _decode_colors(colors):
+    if colors is None:
+        return None
+    if 'dict' in colors:
+        return {k: tuple(v) for k, v in colors['dict']}
+    p = colors['palette']
+    palette = Palette(p['ids'], np.zeros((len(p['ids']), 3)), p['env_id'])
+    palette.lut[:] = p['lut']
+    return palette
+
+
+def _encode_params(rule_fn):
+    """
+    JSON form of the parameters of a rule from life3d_rule_generalized (sets
+    as sorted lists) or of the RuleSpec of a rule from rules.compile_rule.
+    """
+    params = getattr(rule_fn, 'params', None)
+    if params is None:
+        spec = getattr(rule_fn, 'spec', None)
+        return None if spec is None else spec.params()
+    return {k: sorted(v) if isinstance(v, (set, frozenset)) else v for k, v in params.items()}
+
+
+class RunWriter(History):
+    """
+    Writes the states of a run to a run file. Also a History, so it can be
+    passed as evolve_volume(keep=RunWriter(...)); states() then closes the
+    file and returns a RunReader.
+
+    Parameters:
+        path (str): Output file.
+        chunk_shape (tuple): Cells per chunk along each axis.
+        compression (str): 'zlib' or None (raw chunks, memory-mappable).
+        level (int): zlib level (1 = fastest).
+        cmap_dict (dict or Palette): Colours stored in the header.
+        rule_fn (function): Rule whose `params` are stored in the header.
+        metadata (dict): Extra JSON-serializable header entries.
+    """
+    def __init__(self, path, chunk_shape=(64, 64, 64), compression='zlib', level=1,
+                 cmap_dict=None, rule_fn=None, metadata=None):
+        if compression not in COMPRESSIONS:
+            raise ValueError(f"compression must be one of {COMPRESSIONS}.")
+        self.path = path
+        self.chunk_shape = tuple(chunk_shape)
+        self.compression = compression
+        self.level = level
+        self.header = {'colors': _encode_colors(cmap_dict), 'rule': _encode_params(rule_fn),
+                       'metadata': metadata or {}}
+        self.shape = None
+        self.dtype = None
+        self.timesteps = []
+        self.index = []   # per timestep: [offset, nbytes] of every chunk
+        self.file = open(path, 'wb')
+        self.file.write(MAGIC)
+
+    def chunks(self):
+        """Slices of every chunk, in C order of the chunk grid."""
+        grid = [range(0, n, c) for n, c in zip(self.shape, self.chunk_shape)]
+        for corner in np.ndindex(*[len(g) for g in grid]):
+            yield tuple(slice(g[i], g[i] + c) for g, i, c in zip(grid, corner, self.chunk_shape))
+
+    def append(self, timestep, volume):
+        if self.shape is None:
+            self.shape, self.dtype = volume.shape, volume.dtype
+        elif volume.shape != self.shape:
+            raise ValueError("Every state of a run file must have the same shape.")
+
+        entries = []
+        for chunk in self.chunks():
+            data = np.ascontiguousarray(volume[chunk], dtype=self.dtype).tobytes()
+            if self.compression == 'zlib':
+                data = zlib.compress(data, self.level)
+            entries.append([self.file.tell(), len(data)])
+            self.file.write(data)
+        self.index.append(entries)
+        self.timesteps.append(int(timestep))
+
+    def close(self):
+        """Write the header. The file is complete only after this."""
+        if self.file is None:
+            return
+        header = dict(self.header, shape=list(self.shape or ()),
+                      dtype=None if self.dtype is None else str(self.dtype),
+                      chunk_shape=list(self.chunk_shape), compression=self.compression,
+                      timesteps=self.timesteps, index=self.index)
+        offset = self.file.tell()
+        self.file.write(json.dumps(header).encode())
+        self.file.write(struct.pack('<Q', offset))
+        self.file.write(MAGIC)
+        self.file.close()
+        self.file = None
+
+    def states(self):
+        self.close()
+        return RunReader(self.path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class RunReader:
+    """
+    Random access to a run file. Behaves as a read-only sequence of states
+    (len, indexing by position, iteration).
+
+    Attributes:
+        shape (tuple), dtype (np.dtype), timesteps (list[int]),
+        cmap_dict (dict or Palette), rule (dict), metadata (dict).
+    """
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as f:
+            if f.read(len(MAGIC)) != MAGIC:
+                raise ValueError(f"{path} is not a run file.")
+            f.seek(-len(MAGIC) - 8, os.SEEK_END)
+            end = f.tell()
+            offset, = struct.unpack('<Q', f.read(8))
+            if f.read(len(MAGIC)) != MAGIC:
+                raise ValueError(f"{path} is incomplete (the writer was not closed).")
+            f.seek(offset)
+            header = json.loads(f.read(end - offset))
+
+        self.shape = tuple(header['shape'])
+        self.dtype = None if header['dtype'] is None else np.dtype(header['dtype'])
+        self.chunk_shape = tuple(header['chunk_shape'])
+        self.compression = header['compression']
+        self.timesteps = header['timesteps']
+        self.index = header['index']
+        self.cmap_dict = _decode_colors(header['colors'])
+        self.rule = header['rule']
+        self.metadata = header['metadata']
+
+        grid = [range(0, n, c) for n, c in zip(self.shape, self.chunk_shape)]
+        self.grid = tuple(len(g) for g in grid)
+        self.slices = [tuple(slice(g[i], min(g[i] + c, n)) for g, i, c, n in
+                             zip(grid, corner, self.chunk_shape, self.shape))
+                       for corner in np.ndindex(*self.grid)]
+
+    def chunk(self, i, corner):
+        """
+        Chunk at grid position `corner` of the state at position `i`. Raw chunks
+        are returned memory-mapped, compressed ones decompressed.
+        """
+        k = int(np.ravel_multi_index(corner, self.grid))
+        offset, nbytes = self.index[i][k]
+        shape = tuple(s.stop - s.start for s in self.slices[k])
+        if self.compression is None:
+            return np.memmap(self.path, dtype=self.dtype, mode='r', offset=offset, shape=shape)
+        with open(self.path, 'rb') as f:
+            f.seek(offset)
+            data = zlib.decompress(f.read(nbytes))
+        return np.frombuffer(data, dtype=self.dtype).reshape(shape)
+
+    def read(self, i):
+        """Dense state at position `i` (negative counts from the end)."""
+        i = range(len(self.index))[i]
+        volume = np.empty(self.shape, dtype=self.dtype)
+        for corner, chunk in zip(np.ndindex(*self.grid), self.slices):
+            volume[chunk] = self.chunk(i, corner)
+        return volume
+
+    def __len__(self):
+        return len(self.index)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self.read(j) for j in range(len(self))[i]]
+        return self.read(i)
+
+    def __iter__(self):
+        return (self.read(i) for i in range(len(self)))
+
+
+def export_ply(run, path, positions=None, voxel_size=1.0, name='points', surface=False):
+    """
+    Export states of a run file as PLY point clouds (one file per timestep).
+
+    Parameters:
+        run (str or RunReader): Run file.
+        path (str): Output directory.
+        positions (iterable): Positions of the states to export (default: all).
+        voxel_size (float): Scale factor for coordinates.
+        name (str): Base filename.
+        surface (bool): Export only the surface cells of every state.
+    """
+    if not isinstance(run, RunReader):
+        run = RunReader(run)
+    for i in (range(len(run)) if positions is None else positions):
+        aux.save_as_pointcloud(run.read(i), path, run.timesteps[i], voxel_size=voxel_size,
+                               name=name, cmap_dict=run.cmap_dict, surface=surface)
@@ -0,0 +1,100 @@
+"""
+Steady-state and cycle detection
+
+A rolling window of 64-bit hashes (blake2b over the raw buffer) of the last
+states finds extinction, fixed points and cycles of period up to
+max_period, so a run can stop as soon as nothing new can happen. With
+keep_period, copies of the last max_period states are kept as well, so a
+run can output only the states of the detected period. Only valid
+for deterministic rules: with random tie-breaking a repeated state does not
+imply a repeated future.
+
+JCA
+"""
+import hashlib
+from collections import deque
+
+import numpy as np
+
+
+def state_hash(volume):
+    """64-bit hash of the raw contents of a volume."""
+    return hashlib.blake2b(np.ascontiguousarray(volume), digest_size=8).digest()
+
+
+class SteadyStateDetector:
+    """
+    Parameters:
+        max_period (int): Longest cycle looked for (1 = fixed points only).
+        stop (bool): End the run on detection. A repeated state is then not
+            emitted, so the frames written end with exactly one period of the
+            cycle.
+        keep_period (bool): Keep copies of the last max_period states, so a
+            run outputs only the detected period (see period_frames) instead
+            of every state.
+
+    Attributes:
+        reason (str): None, 'extinct', 'fixed' or 'cycle'.
+        period (int): Period of the detected cycle (1 for fixed points).
+        timestep (int): Timestep at which the detection happened.
+    """
+    def __init__(self, max_period=8, stop=True, keep_period=False):
+        self.max_period = max_period
+        self.stop = stop
+        self.keep_period = keep_period
+        self.reset()
+
+    def reset(self):
+        self.hashes = deque(maxlen=self.max_period)
+        self.states = deque(maxlen=self.max_period)
+        self.reason = None
+        self.period = None
+        self.timestep = None
+
+    def update(self, timestep, volume):
+        """
+        Record the state of `timestep`. Returns the reason code if a steady
+        state is detected at this step (only the first detection is reported).
+        """
+        if self.reason is not None:
+            return None
+
+        h = state_hash(volume)
+        for period, previous in enumerate(reversed(self.hashes), 1):
+            if h == previous:
+                self.reason = 'fixed' if period == 1 else 'cycle'
+                self.period = period
+                break
+        else:
+            self.hashes.append(h)
+            if self.keep_period:
+                self.states.append((timestep, volume.copy()))
+            if not (volume > 0).any():
+                self.reason, self.period = 'extinct', 1
+
+        if self.reason is not None:
+            self.timestep = timestep
+        return self.reason
+
+    def period_frames(self):
+        """
+        (timestep, volume) of one period with keep_period: the states of the
+        cycle, the fixed point or the extinct state, or the last max_period
+        states when nothing was detected.
+        """
+        frames = list(self.states)
+        if self.reason is not None:
+            frames = frames[-self.period:]
+        return frames
+
+    @property
+    def repeated(self):
+        """True when the last state given was a repeat of an earlier one."""
+        return self.reason in ('fixed', 'cycle')
+
+    def __str__(self):
+        if self.reason is None:
+            return 'running'
+        if self.reason == 'cycle':
+            return f'cycle of period {self.period} at step {self.timestep}'
+        return f'{self.reason} at step {self.timestep}'
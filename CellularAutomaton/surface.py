@@ -0,0 +1,243 @@
+"""
+Surface extraction and mesh export
+
+Only the boundary of a cluster can be seen, so exports and renders can skip
+the enclosed interior. surface_mask keeps the occupied cells with an empty
+face neighbour (6-neighbour occupancy test, vectorized), and the meshers
+build a closed surface per cluster ID:
+
+    - greedy_mesh: exposed voxel faces merged into rectangles (runs along
+      one axis, then identical runs stacked along the next), so a flat side
+      is a handful of quads instead of one per voxel.
+    - marching_cubes_mesh: smooth isosurface of every ID (needs scikit-image).
+
+Coordinates match volume_to_pointcloud: voxel i is centred at i * voxel_size.
+
+JCA
+"""
+import os
+
+import numpy as np
+import open3d as o3d
+from scipy.ndimage import find_objects
+
+from CellularAutomaton.palette import color_values
+
+try:
+    from skimage.measure import marching_cubes
+except ImportError:  # optional: only needed for method='marching_cubes'
+    marching_cubes = None
+
+
+MESH_METHODS = ('greedy', 'marching_cubes')
+
+
+def _neighbours(volume):
+    """The 6 face neighbours of every cell (zero outside the volume), as views of one padded copy."""
+    padded = np.pad(volume, 1, mode='constant', constant_values=0)
+    inner = [slice(1, -1)] * 3
+    for axis in range(3):
+        for shift in (slice(None, -2), slice(2, None)):
+            index = list(inner)
+            index[axis] = shift
+            yield padded[tuple(index)]
+
+
+def surface_mask(volume, by_id=False):
+    """
+    Occupied cells with at least one empty face neighbour (cells outside the
+    volume count as empty).
+
+    Parameters:
+        volume (ndarray): 3D array of IDs (0 = empty).
+        by_id (bool): Also keep cells touching a different ID, i.e. the
+            boundary of every cluster rather than of the occupied region.
+
+    Returns:
+        ndarray: Boolean mask.
+    """
+    occupied = volume != 0
+    hidden = occupied.copy()
+    for neighbour in _neighbours(volume):
+        hidden &= (neighbour == volume) if by_id else (neighbour != 0)
+    return occupied & ~hidden
+
+
+def surface_points(volume, voxel_size=1.0, by_id=False):
+    """
+    Like auxfun.volume_to_pointcloud, for the surface cells only.
+
+    Returns:
+        points (ndarray): N×3 coordinates.
+        values (ndarray): N values.
+    """
+    cells = np.flatnonzero(surface_mask(volume, by_id))
+    points = np.column_stack(np.unravel_index(cells, volume.shape)).astype(np.float32) * voxel_size
+    return points, volume.ravel()[cells]
+
+
+def _quads(faces, ids):
+    """
+    Merge the faces of one orientation into rectangles.
+
+    Parameters:
+        faces (ndarray): 3D boolean mask of faces, indexed (slice, u, v).
+        ids (ndarray): ID owning each face.
+
+    Returns:
+        ndarray: Q×6 (slice, u0, u1, v0, v1, id), inclusive cell ranges.
+    """
+    # Runs along v of faces with the same ID
+    same = np.zeros_like(faces)
+    same[:, :, 1:] = faces[:, :, 1:] & faces[:, :, :-1] & (ids[:, :, 1:] == ids[:, :, :-1])
+    starts = np.nonzero(faces & ~same)
+    stops = np.nonzero(faces & ~np.concatenate([same[:, :, 1:], np.zeros_like(same[:, :, :1])], axis=2))
+    s, u, v0 = starts
+    v1 = stops[2]
+    if not len(s):
+        return np.zeros((0, 6), dtype=np.int64)
+    run_id = ids[starts]
+
+    # Stack identical runs (same slice, extent and ID) of consecutive rows
+    order = np.lexsort((u, run_id, v1, v0, s))
+    s, u, v0, v1, run_id = s[order], u[order], v0[order], v1[order], run_id[order]
+    key = np.column_stack([s, v0, v1, run_id])
+    new = np.ones(len(s), dtype=bool)
+    new[1:] = (key[1:] != key[:-1]).any(axis=1) | (u[1:] != u[:-1] + 1)
+    first = np.flatnonzero(new)
+    last = np.r_[first[1:], len(s)] - 1
+    return np.column_stack([s[first], u[first], u[last], v0[first], v1[first], run_id[first]])
+
+
+def greedy_mesh(volume, voxel_size=1.0, by_id=True):
+    """
+    Surface of the occupied cells as merged quads.
+
+    Parameters:
+        volume (ndarray): 3D array of IDs (0 = empty).
+        voxel_size (float): Voxel side.
+        by_id (bool): Also emit faces between different IDs, so every cluster
+            gets a closed surface of its own.
+
+    Returns:
+        vertices (ndarray): V×3 float coordinates (4 per quad).
+        triangles (ndarray): T×3 vertex indices, wound outwards.
+        ids (ndarray): ID of every triangle.
+    """
+    occupied = volume != 0
+    vertices, triangles, tri_ids = [], [], []
+    count = 0
+    for index, neighbour in enumerate(_neighbours(volume)):
+        axis, outward = index // 2, index % 2  # outward: face on the + side
+        exposed = occupied & ((neighbour != volume) if by_id else (neighbour == 0))
+        # (slice, u, v) views with slice = `axis`, u and v the other two in order
+        others = [a for a in range(3) if a != axis]
+        quads = _quads(np.moveaxis(exposed, axis, 0), np.moveaxis(volume, axis, 0))
+        if not len(quads):
+            continue
+
+        s, u0, u1, v0, v1, qid = quads.T
+        plane = s + outward - 0.5
+        corners = [(u0 - 0.5, v0 - 0.5), (u1 + 0.5, v0 - 0.5), (u1 + 0.5, v1 + 0.5), (u0 - 0.5, v1 + 0.5)]
+        quad_vertices = np.empty((len(quads), 4, 3))
+        for k, (cu, cv) in enumerate(corners):
+            quad_vertices[:, k, axis] = plane
+            quad_vertices[:, k, others[0]] = cu
+            quad_vertices[:, k, others[1]] = cv
+
+        # Corners go counter-clockwise around +axis for even permutations (u, v, axis)
+        flip = (outward == 0) != (axis == 1)
+        base = count + 4 * np.arange(len(quads))[:, None]
+        order = np.array([[0, 2, 1], [0, 3, 2]]) if flip else np.array([[0, 1, 2], [0, 2, 3]])
+        vertices.append(quad_vertices.reshape(-1, 3) * voxel_size)
+        triangles.append((base[:, None, :] + order[None]).reshape(-1, 3))
+        tri_ids.append(np.repeat(qid, 2))
+        count += 4 * len(quads)
+
+    if not vertices:
+        return np.zeros((0, 3)), np.zeros((0, 3), dtype=np.int64), np.zeros(0, dtype=volume.dtype)
+    return np.concatenate(vertices), np.concatenate(triangles), np.concatenate(tri_ids)
+
+
+def marching_cubes_mesh(volume, voxel_size=1.0):
+    """
+    Smooth isosurface of every ID, each computed inside the bounding box of
+    its cells, wound outwards as in greedy_mesh. Needs scikit-image.
+
+    Returns:
+        vertices, triangles, ids: As greedy_mesh.
+    """
+    if marching_cubes is None:
+        raise ImportError("marching_cubes_mesh needs scikit-image (pip install scikit-image).")
+    ids = np.unique(volume[volume != 0])
+    labels = np.where(volume != 0, np.searchsorted(ids, volume) + 1, 0)
+    vertices, triangles, tri_ids = [], [], []
+    count = 0
+    for cid, box in zip(ids, find_objects(labels)):
+        mask = np.pad(volume[box] == cid, 1).astype(np.float32)
+        verts, faces, _, _ = marching_cubes(mask, level=0.5)
+        verts += [b.start - 1 for b in box]
+        vertices.append(verts * voxel_size)
+        # marching_cubes winds triangles towards increasing values (inwards here): reverse them
+        triangles.append(faces[:, ::-1] + count)
+        tri_ids.append(np.full(len(faces), cid, dtype=volume.dtype))
+        count += len(verts)
+
+    if not vertices:
+        return np.zeros((0, 3)), np.zeros((0, 3), dtype=np.int64), np.zeros(0, dtype=volume.dtype)
+    return np.concatenate(vertices), np.concatenate(triangles), np.concatenate(tri_ids)
+
+
+def volume_to_mesh(volume, method='greedy', voxel_size=1.0):
+    """Mesh of a volume with `method` ('greedy' or 'marching_cubes')."""
+    if method == 'greedy':
+        return greedy_mesh(volume, voxel_size)
+    if method == 'marching_cubes':
+        return marching_cubes_mesh(volume, voxel_size)
+    raise ValueError(f"method must be one of {MESH_METHODS}.")
+
+
+def save_as_mesh(volume, filepath, timestep, method='greedy', voxel_size=1.0, name='mesh', cmap_dict=None,
+                 per_cluster=False):
+    """
+    Save the surface of a volume as a triangle mesh (.ply).
+
+    Parameters:
+        volume (ndarray): 3D array of IDs (0 = empty).
+        filepath (str): Output directory.
+        timestep (int): Current timestep for filename.
+        method (str): 'greedy' (merged voxel faces) or 'marching_cubes'.
+        voxel_size (float): Scale factor for coordinates.
+        name (str): Base filename.
+        cmap_dict (dict or Palette): ID -> RGB colours of the faces.
+        per_cluster (bool): One file per ID ({name}-{timestep}-{id}.ply)
+            instead of one for the whole volume.
+    """
+    vertices, triangles, ids = volume_to_mesh(volume, method, voxel_size)
+    os.makedirs(filepath, exist_ok=True)
+
+    if per_cluster:
+        # Triangles grouped by ID, each group keeping only the vertices it uses
+        order = np.argsort(ids, kind='stable')
+        starts = np.flatnonzero(np.diff(ids[order])) + 1
+        groups = [(ids[rows[0]], rows) for rows in np.split(order, starts) if len(rows)]
+    else:
+        groups = [(None, None)]
+
+    for cid, rows in groups:
+        if rows is None:
+            used, faces = vertices, triangles
+        else:
+            used, inverse = np.unique(triangles[rows], return_inverse=True)
+            used, faces = vertices[used], inverse.reshape(-1, 3)
+        mesh = o3d.geometry.TriangleMesh()
+        mesh.vertices = o3d.utility.Vector3dVector(used)
+        mesh.triangles = o3d.utility.Vector3iVector(faces.astype(np.int32))
+        if cmap_dict is not None:
+            # Colour of the triangle ID at every vertex (vertices are not shared across IDs)
+            vertex_ids = np.zeros(len(used), dtype=ids.dtype)
+            vertex_ids[faces.ravel()] = np.repeat(ids if rows is None else ids[rows], 3)
+            mesh.vertex_colors = o3d.utility.Vector3dVector(color_values(vertex_ids, cmap_dict).astype(np.float64))
+
+        suffix = '' if cid is None else f'-{cid}'
+        o3d.io.write_triangle_mesh(os.path.join(filepath, f'{name}-{timestep}{suffix}.ply'), mesh)
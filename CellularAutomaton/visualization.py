@@ -11,6 +11,9 @@ import matplotlib.pyplot as plt
 import matplotlib.cm as cm
 from tqdm import tqdm
 from CellularAutomaton.auxfun import volume_to_pointcloud
+from CellularAutomaton.palette import color_values
+from CellularAutomaton.player import Player
+from CellularAutomaton.surface import surface_mask
 
 
 def make_voxel_outline(center, size):
@@ -91,6 +94,16 @@ def visualize_volume(volume, mode='voxel', voxel_size=1.0, color=(0.6, 0.6, 0.6)
     o3d.visualization.draw_geometries(to_draw)
 
 
+def play_volumes(volumes, **kwargs):
+    """
+    Animated playback of a run (the states returned by evolve_volume, a
+    RunReader, an iterator of volumes, ...) in one Open3D window, updating
+    the geometry in place. Blocks until the window is closed; see
+    player.Player for the options and the keyboard controls.
+    """
+    Player(volumes, **kwargs).run()
+
+
 
 
 
@@ -115,8 +128,91 @@ def visualize_volume(volume, mode='voxel', voxel_size=1.0, color=(0.6, 0.6, 0.6)
 #     plt.close(fig)
 
 
+class Rasterizer:
+    """
+    Headless orthographic voxel renderer in NumPy, with a fixed camera for a
+    given volume shape so every frame of a run is framed the same way.
+
+    Only surface voxels (with at least one empty face neighbour) are projected.
+    Each is splatted as a 2×2 pixel block at one pixel per voxel, the nearest
+    voxel per pixel wins (z-buffer) and is darkened with depth. The raster is then upscaled to about `resolution` pixels.
+
+    Parameters:
+        shape (tuple): Volume shape.
+        resolution (int): Approximate side of the output image in pixels.
+        elev (float): Camera elevation in degrees (matplotlib's default view).
+        azim (float): Camera azimuth in degrees.
+        shade (float): Darkening of the farthest voxels, from 0 (none) to 1.
+        background (tuple): RGB background in [0, 1].
+    """
+    def __init__(self, shape, resolution=800, elev=30, azim=-60, shade=0.6, background=(1, 1, 1)):
+        self.shape = tuple(shape)
+        e, a = np.radians(elev), np.radians(azim)
+        # Rows: screen right, screen up, towards the camera
+        self.rotation = np.array([
+            [-np.sin(a), np.cos(a), 0],
+            [-np.sin(e) * np.cos(a), -np.sin(e) * np.sin(a), np.cos(e)],
+            [np.cos(e) * np.cos(a), np.cos(e) * np.sin(a), np.sin(e)],
+        ], dtype=np.float32)
+        # Contribution of each index along each axis to (right, up, depth)
+        centered = [np.arange(m, dtype=np.float32) - (m - 1) / 2 for m in self.shape]
+        self.axes = [[row[axis] * centered[axis] for row in self.rotation] for axis in range(3)]
+        self.radius = float(np.linalg.norm(self.shape)) / 2
+        self.size = int(np.ceil(2 * self.radius)) + 2
+        self.scale = max(1, resolution // self.size)
+        self.shade = shade
+        self.background = np.array(background, dtype=np.float32)
+
+    def colors(self, values, cmap_dict=None):
+        """RGB in [0, 1] of every value: from cmap_dict (or a Palette), or viridis over the values."""
+        if cmap_dict is not None:
+            return color_values(values, cmap_dict)
+        ids, inverse = np.unique(values, return_inverse=True)
+        lut = plt.cm.viridis(ids / max(ids.max(), 1))[:, :3].astype(np.float32)
+        return lut[inverse.ravel()]
+
+    def __call__(self, volume, cmap_dict=None):
+        """Image of `volume` as an (H, W, 3) uint8 array."""
+        n = self.size
+        image = np.empty((n * n, 3), dtype=np.float32)
+        image[:] = self.background
+
+        # Surface: occupied cells with an empty face neighbour (or on the border)
+        cells = np.flatnonzero(surface_mask(volume))
+
+        if len(cells):
+            # Screen coordinates and depth, summed from per-axis tables
+            u, v, depth = 0, 0, 0
+            for index, axis in zip(np.unravel_index(cells, self.shape), self.axes):
+                u, v, depth = u + axis[0][index], v + axis[1][index], depth + axis[2][index]
+            x = (u + n / 2 - 1).astype(np.intp)
+            y = (n / 2 - 1 - v).astype(np.intp)
+            pixel = y * n + x
+
+            # Z-buffer over a 2×2 splat: the nearest voxel of every pixel wins
+            zbuffer = np.full(n * n, np.inf, dtype=np.float32)
+            owner = np.full(n * n, -1, dtype=np.intp)
+            near = -depth
+            for offset in (0, 1, n, n + 1):
+                np.minimum.at(zbuffer, pixel + offset, near)
+            for offset in (0, 1, n, n + 1):
+                win = np.flatnonzero(near == zbuffer[pixel + offset])
+                owner[pixel[win] + offset] = win
+
+            hit = np.flatnonzero(owner >= 0)
+            voxel = owner[hit]
+            shading = 1 - self.shade * (self.radius - depth[voxel]) / (2 * self.radius)
+            image[hit] = self.colors(volume.ravel()[cells[voxel]], cmap_dict) * shading[:, None]
+
+        image = (np.clip(image, 0, 1) * 255).astype(np.uint8).reshape(n, n, 3)
+        if self.scale > 1:
+            image = image.repeat(self.scale, axis=0).repeat(self.scale, axis=1)
+        return image
+
+
 def render_as_pointcloud(volume, path, timestep, cmap_dict=None,
-                         name='render', voxel_size=1.0, figsize=(8, 8), colorbar=False):
+                         name='render', voxel_size=1.0, figsize=(8, 8), colorbar=False,
+                         renderer='raster'):
     """
     Render a 3D volume as a point cloud with optional fixed colors per ID.
 
@@ -124,20 +220,44 @@ def render_as_pointcloud(volume, path, timestep, cmap_dict=None,
         volume (ndarray): 3D NumPy array of IDs (0 = empty).
         path (str): Folder to save images.
         timestep (int): Current simulation step.
-        cmap_dict (dict): Mapping from ID -> RGB tuple in [0, 1].
+        cmap_dict (dict or Palette): Mapping from ID -> RGB tuple in [0, 1].
         name (str): Base filename for saving.
-        voxel_size (float): Scaling for voxel spacing.
-        figsize (tuple): Matplotlib figure size.
+        voxel_size (float): Scaling for voxel spacing. Both renderers frame the
+            whole volume, so a uniform spacing does not change the image.
+        figsize (tuple): Matplotlib figure size (the raster image is 100 px per unit).
         colorbar (bool): Show colorbar if True (ignored if cmap_dict given).
+            The raster image is then drawn in a matplotlib figure next to it.
+        renderer (str): 'raster' (NumPy Rasterizer, fast) or 'matplotlib'
+            (3D scatter at 300 dpi).
     """
-    points, values = volume_to_pointcloud(volume, voxel_size)
+    filename = os.path.join(path, f'{name}-{timestep}.png')
+    if renderer == 'raster':
+        image = Rasterizer(volume.shape, resolution=int(100 * max(figsize)))(volume, cmap_dict)
+        if not colorbar or cmap_dict is not None:
+            plt.imsave(filename, image)
+            return
+        # Same normalization as Rasterizer.colors: over the visible (surface) values
+        visible = volume[surface_mask(volume)]
+        norm = plt.Normalize(0, max(int(visible.max()) if visible.size else 1, 1))
+        fig, ax = plt.subplots(figsize=figsize)
+        ax.imshow(image)
+        ax.set_axis_off()
+        fig.colorbar(cm.ScalarMappable(norm=norm, cmap='viridis'), ax=ax, label='Voxel Value')
+        plt.savefig(filename, dpi=100)
+        plt.close(fig)
+        return
+    if renderer != 'matplotlib':
+        raise ValueError("renderer must be 'raster' or 'matplotlib'.")
+
+    # Interior voxels are hidden behind the surface: only scatter the shell
+    points, values = volume_to_pointcloud(volume, voxel_size, surface=True)
 
     fig = plt.figure(figsize=figsize)
     ax = fig.add_subplot(111, projection='3d')
 
     if cmap_dict is not None:
         # Map IDs to RGB colors
-        colors = np.array([cmap_dict.get(v, (0.5, 0.5, 0.5)) for v in values])
+        colors = color_values(values, cmap_dict)
         sc = ax.scatter(points[:, 0], points[:, 1], points[:, 2],
                         c=colors, s=2, alpha=0.7)
     else:
@@ -149,6 +269,25 @@ def render_as_pointcloud(volume, path, timestep, cmap_dict=None,
     ax.set_axis_off()
     plt.tight_layout()
 
-    filename = os.path.join(path, f'{name}-{timestep}.png')
     plt.savefig(filename, dpi=300)
     plt.close(fig)
+
+
+def render_sequence(volumes, path, cmap_dict=None, name='render', start=0, **kwargs):
+    """
+    Render every frame of a run with one Rasterizer (same camera for all frames).
+
+    Parameters:
+        volumes (iterable): 3D arrays of IDs, e.g. the states returned by evolve_volume.
+        path (str): Folder to save images.
+        cmap_dict (dict): Mapping from ID -> RGB tuple in [0, 1].
+        name (str): Base filename for saving.
+        start (int): Timestep of the first frame.
+        **kwargs: Rasterizer options (resolution, elev, azim, shade, background).
+    """
+    os.makedirs(path, exist_ok=True)
+    rasterizer = None
+    for timestep, volume in enumerate(volumes, start):
+        if rasterizer is None:
+            rasterizer = Rasterizer(volume.shape, **kwargs)
+        plt.imsave(os.path.join(path, f'{name}-{timestep}.png'), rasterizer(volume, cmap_dict))
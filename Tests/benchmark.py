@@ -0,0 +1,212 @@
+"""
+Benchmark suite
+
+Times rule steps, initializers and output paths across grid sizes and
+densities, writes the results as JSON and compares them with a saved
+baseline. Headless: matplotlib uses the Agg backend and no Open3D window
+is opened.
+
+    python Tests/benchmark.py --out results.json
+    python Tests/benchmark.py --baseline results.json --tolerance 0.25
+
+JCA
+"""
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+
+import matplotlib
+matplotlib.use('Agg')
+
+import numpy as np
+
+import CellularAutomaton.automaton as automaton
+import CellularAutomaton.auxfun as aux
+import CellularAutomaton.initializers as init
+import CellularAutomaton.native as native
+import CellularAutomaton.surface as surface
+import CellularAutomaton.visualization as viz
+from CellularAutomaton.codebook import generate_random_codebook, life3d_rule, life3d_rule_generalized
+from CellularAutomaton.rules import compile_rule
+
+
+SIZES = (32, 64, 128, 256)
+DENSITIES = (0.05, 0.2, 0.5)
+
+
+def random_volume(size, density, seed=0):
+    rng = np.random.default_rng(seed)
+    return (rng.random((size,) * 3) < density).astype(int)
+
+
+def per_voxel(rule_fn):
+    """Same rule without its vectorized kernel (forces the generic_filter path)."""
+    return lambda vector: rule_fn(vector)
+
+
+def step_case(make_rule):
+    def setup(n, d, tmp):
+        volume, rule = random_volume(n, d), make_rule()
+        return lambda: automaton.apply_rule(volume, rule)
+    return setup
+
+
+def clusters_case(n, d, tmp):
+    return lambda: init.initialize_volume_clusters((n,) * 3, n_clusters=5, cluster_radius=max(n // 8, 2),
+                                                   density=d, noise_density=d / 10, seed=0)
+
+
+def pointcloud_case(n, d, tmp):
+    volume = random_volume(n, d)
+    return lambda: aux.volume_to_pointcloud(volume)
+
+
+def save_case(n, d, tmp):
+    volume = random_volume(n, d)
+    return lambda: aux.save_as_pointcloud(volume, tmp, 0, cmap_dict={1: (1, 1, 1)})
+
+
+def surface_save_case(n, d, tmp):
+    volume = random_volume(n, d)
+    return lambda: aux.save_as_pointcloud(volume, tmp, 0, cmap_dict={1: (1, 1, 1)}, surface=True)
+
+
+def mesh_case(method):
+    def setup(n, d, tmp):
+        volume = random_volume(n, d)
+        return lambda: surface.save_as_mesh(volume, tmp, 0, method=method, cmap_dict={1: (1, 1, 1)})
+    return setup
+
+
+def render_case(renderer):
+    def setup(n, d, tmp):
+        volume = random_volume(n, d)
+        return lambda: viz.render_as_pointcloud(volume, tmp, 0, cmap_dict={1: (1, 1, 1)}, renderer=renderer)
+    return setup
+
+
+def b4s5():
+    return life3d_rule_generalized(birth_set={4}, survival_set={5})
+
+
+# name -> (setup(size, density, tmpdir) returning the timed callable, largest size).
+# Per-voxel rules and the matplotlib renderer are capped: they take minutes beyond
+CASES = {
+    'apply_rule/life3d_rule': (step_case(lambda: life3d_rule), 32),
+    'apply_rule/life3d_rule_generalized': (step_case(b4s5), 256),
+    'apply_rule/life3d_rule_generalized-per-voxel': (step_case(lambda: per_voxel(b4s5())), 32),
+    'apply_rule/life3d_rule_generalized-native': (
+        step_case(lambda: native.life3d_rule_generalized(birth_set={4}, survival_set={5})), 128),
+    'apply_rule/codebook_rule_fn': (
+        step_case(lambda: automaton.codebook_rule_fn(generate_random_codebook(64, seed=0))), 32),
+    'apply_rule/codebook_rule_fn-compiled': (
+        step_case(lambda: automaton.codebook_rule_fn(generate_random_codebook(64, seed=0), compiled=True, seed=0)),
+        256),
+    'apply_rule/compile_rule-moore-r5': (step_case(lambda: compile_rule('30-60/20-30/2/M', radius=5, inherit='max')), 256),
+    'apply_rule/compile_rule-von_neumann-r5': (
+        step_case(lambda: compile_rule('10-40/8-15/2/N', radius=5, inherit='max')), 256),
+    'initialize_volume_clusters': (clusters_case, 256),
+    'volume_to_pointcloud': (pointcloud_case, 256),
+    'save_as_pointcloud': (save_case, 256),
+    'save_as_pointcloud-surface': (surface_save_case, 256),
+    'save_as_mesh-greedy': (mesh_case('greedy'), 256),
+    'save_as_mesh-marching_cubes': (mesh_case('marching_cubes'), 128),
+    'render_as_pointcloud': (render_case('raster'), 256),
+    'render_as_pointcloud-matplotlib': (render_case('matplotlib'), 64),
+}
+
+# Cases left out without their optional dependency: native rules would time
+# the per-voxel Python fallback, marching cubes would raise ImportError
+if native.numba is None:
+    del CASES['apply_rule/life3d_rule_generalized-native']
+if surface.marching_cubes is None:
+    del CASES['save_as_mesh-marching_cubes']
+
+
+def time_call(fn, repeat=3):
+    """Best and median wall time of `repeat` calls."""
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return min(times), float(np.median(times))
+
+
+def run(cases=None, sizes=SIZES, densities=DENSITIES, repeat=3, verbose=True):
+    """
+    Time every case at every size and density.
+
+    Returns:
+        dict: {'meta': environment, 'results': [{case, size, density, best, median,
+            cells_per_second}, ...]}
+    """
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for name in cases or CASES:
+            setup, largest = CASES[name]
+            for n in sizes:
+                if n > largest:
+                    continue
+                for d in densities:
+                    best, median = time_call(setup(n, d, tmp), repeat)
+                    results.append({'case': name, 'size': n, 'density': d, 'best': best, 'median': median,
+                                    'cells_per_second': n ** 3 / best})
+                    if verbose:
+                        print(f'{name:48s} {n:4d}³ {d:5.2f}  {best * 1e3:10.2f} ms')
+    meta = {'python': platform.python_version(), 'numpy': np.__version__, 'machine': platform.machine(),
+            'processor': platform.processor(), 'date': time.strftime('%Y-%m-%dT%H:%M:%S')}
+    return {'meta': meta, 'results': results}
+
+
+def compare(report, baseline, tolerance=0.25):
+    """
+    Cases slower than the baseline by more than `tolerance` (relative, on the
+    best time).
+
+    Returns:
+        list[dict]: Regressions with the current and baseline times and their ratio.
+    """
+    key = lambda r: (r['case'], r['size'], r['density'])
+    reference = {key(r): r for r in baseline['results']}
+    regressions = []
+    for r in report['results']:
+        base = reference.get(key(r))
+        if base is not None and r['best'] > base['best'] * (1 + tolerance):
+            regressions.append(dict(r, baseline=base['best'], ratio=r['best'] / base['best']))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0].strip())
+    parser.add_argument('--cases', nargs='*', choices=sorted(CASES), help='Cases to run (default: all).')
+    parser.add_argument('--sizes', nargs='*', type=int, default=SIZES)
+    parser.add_argument('--densities', nargs='*', type=float, default=DENSITIES)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--out', help='Write the results to this JSON file.')
+    parser.add_argument('--baseline', help='JSON results to compare against.')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='Allowed relative slowdown.')
+    args = parser.parse_args(argv)
+
+    report = run(args.cases, args.sizes, args.densities, args.repeat)
+    if args.out:
+        os.makedirs(os.path.dirname(os.path.abspath(args.out)), exist_ok=True)
+        with open(args.out, 'w') as f:
+            json.dump(report, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(report, json.load(f), args.tolerance)
+        for r in regressions:
+            print(f"REGRESSION {r['case']} {r['size']}³ {r['density']:.2f}: "
+                  f"{r['best'] * 1e3:.2f} ms vs {r['baseline'] * 1e3:.2f} ms ({r['ratio']:.2f}×)")
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -29,7 +29,7 @@ print(initial_volume.sum())
 
 # Codebook: All-zero and all-one 3×3×3 blocks
 codebook = generate_random_codebook(num_rules=5)
-rule = automaton.codebook_rule_fn(codebook, not_found='random')
+rule = automaton.codebook_rule_fn(codebook, not_found='random', compiled=True)
 
 ### Run CA
 volumes = automaton.evolve_volume(initial_volume, rule, steps=5)
@@ -0,0 +1,30 @@
+"""
+Shared test fixtures
+
+Run from the repository root with `python -m pytest Tests`. The scripts in
+this folder (beta_test.py opens Open3D windows, benchmark.py times large
+grids) are not collected.
+
+JCA
+"""
+import matplotlib
+matplotlib.use('Agg')
+
+import numpy as np
+import pytest
+
+
+collect_ignore = ['beta_test.py', 'benchmark.py']
+
+
+@pytest.fixture
+def rng():
+    """Fresh seeded generator for every test, so each test is deterministic on its own."""
+    return np.random.default_rng(1234)
+
+
+def random_ids(rng, shape, density=0.3, n_ids=3, env_id=-1, env_density=0.0):
+    """Volume of IDs 1..n_ids at `density`, with environment cells at `env_density`."""
+    volume = np.where(rng.random(shape) < density, rng.integers(1, n_ids + 1, shape), 0)
+    volume[(volume == 0) & (rng.random(shape) < env_density)] = env_id
+    return volume
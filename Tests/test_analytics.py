@@ -0,0 +1,99 @@
+"""
+Streamed per-cluster statistics against brute force
+
+JCA
+"""
+import numpy as np
+import pytest
+from scipy.ndimage import label
+
+import CellularAutomaton.analytics as analytics
+import CellularAutomaton.automaton as automaton
+from CellularAutomaton.analytics import ClusterStats, component_counts, make_stats
+from CellularAutomaton.codebook import life3d_rule_generalized
+
+from conftest import random_ids
+
+
+def sequence(rng, steps=12, shape=(12, 11, 10), n_ids=6):
+    """Random states with small changes between them, env cells included."""
+    volume = random_ids(rng, shape, density=0.2, n_ids=n_ids, env_density=0.02)
+    states = [volume]
+    for _ in range(steps):
+        volume = volume.copy()
+        flip = rng.random(shape) < 0.05
+        volume[flip] = np.where(rng.random(int(flip.sum())) < 0.5, 0, rng.integers(1, n_ids + 3, int(flip.sum())))
+        states.append(volume)
+    return states
+
+
+def brute_rows(t, volume, previous, components):
+    rows = {}
+    ids = set(np.unique(volume[volume > 0]).tolist())
+    if previous is not None:
+        ids |= set(np.unique(previous[previous > 0]).tolist())
+    for i in sorted(ids):
+        cells = np.argwhere(volume == i)
+        row = {'population': len(cells),
+               'births': 0 if previous is None else int(((volume == i) & (previous != i)).sum()),
+               'deaths': 0 if previous is None else int(((volume != i) & (previous == i)).sum())}
+        lo, hi = (cells.min(axis=0), cells.max(axis=0)) if len(cells) else ([-1] * 3, [-1] * 3)
+        for axis, name in enumerate('xyz'):
+            row[name + '0'], row[name + '1'] = int(lo[axis]), int(hi[axis])
+        if components:
+            row['components'] = label(volume == i)[1]
+        rows[(t, i)] = row
+    return rows
+
+
+@pytest.mark.parametrize('rescan_limit', [0, 32])
+def test_matches_brute_force(rng, monkeypatch, rescan_limit):
+    monkeypatch.setattr(analytics, 'RESCAN_LIMIT', rescan_limit)
+    states = sequence(rng)
+    stats = ClusterStats(bounds=True, components_every=1)
+    expected = {}
+    for t, volume in enumerate(states):
+        stats.update(t, volume)
+        expected.update(brute_rows(t, volume, states[t - 1] if t else None, True))
+
+    table = stats.table()
+    assert len(table['id']) == len(expected)
+    for r in range(len(table['id'])):
+        row = expected[(int(table['timestep'][r]), int(table['id'][r]))]
+        assert {name: int(table[name][r]) for name in row} == row
+
+
+def test_components_every(rng):
+    states = sequence(rng, steps=4)
+    stats = ClusterStats(components_every=2)
+    for t, volume in enumerate(states):
+        stats.update(t, volume)
+    table = stats.table()
+    assert set(table) == {'timestep', 'id', 'population', 'births', 'deaths', 'components'}
+    assert (table['components'][table['timestep'] % 2 == 1] == -1).all()
+    assert (table['components'][table['timestep'] % 2 == 0] >= 0).all()
+
+
+def test_component_counts(rng):
+    volume = random_ids(rng, (10, 10, 10), density=0.4, n_ids=4, env_density=0.05)
+    counts = component_counts(volume, minlength=6)
+    assert len(counts) == 6 and counts[0] == 0 and counts[5] == 0
+    for i in range(1, 5):
+        assert counts[i] == label(volume == i)[1]
+    assert component_counts(np.zeros((3, 3, 3), dtype=int), minlength=2).tolist() == [0, 0]
+
+
+def test_evolve_volume_stats(rng, tmp_path):
+    volume = random_ids(rng, (10, 10, 10), density=0.3, n_ids=3)
+    rule = life3d_rule_generalized(birth_set={4}, survival_set={5})
+    path = str(tmp_path / 'stats.npz')
+    stats = make_stats(path)
+    states, _ = automaton.evolve_volume(volume, rule, steps=5, stats=stats)
+    saved = np.load(path)
+    for name, column in stats.table().items():
+        np.testing.assert_array_equal(saved[name], column)
+    timesteps, population = stats.series('population', 1)
+    for t, p in zip(timesteps, population):
+        assert p == (states[t] == 1).sum()
+    assert make_stats(None) is None and make_stats(False) is None
+    assert isinstance(make_stats(True), ClusterStats) and make_stats(stats) is stats
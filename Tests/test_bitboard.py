@@ -0,0 +1,64 @@
+"""
+Bit-packed volumes against the dense kernel
+
+JCA
+"""
+import numpy as np
+import pytest
+
+import CellularAutomaton.automaton as automaton
+from CellularAutomaton.bitboard import BitVolume, BitboardEngine, pack_bits, unpack_bits
+from CellularAutomaton.codebook import life3d_rule_generalized
+from CellularAutomaton.engines import DenseEngine
+
+from conftest import random_ids
+
+
+RULES = [({3}, {2, 3}), ({4}, {5}), ({0, 2, 7}, {1, 4, 9, 26})]
+
+
+def two_state(volume, env_id=-1):
+    """Liveness and environment of a volume of IDs (what a bitboard keeps)."""
+    return np.where(volume == env_id, env_id, volume > 0)
+
+
+@pytest.mark.parametrize('depth', [1, 63, 64, 65, 130])
+def test_pack_unpack_roundtrip(rng, depth):
+    mask = rng.random((3, 4, depth)) < 0.5
+    words = pack_bits(mask)
+    assert words.shape == (3, 4, -(-depth // 64))
+    np.testing.assert_array_equal(unpack_bits(words, depth), mask)
+
+
+def test_from_array_roundtrip(rng):
+    volume = random_ids(rng, (6, 7, 70), env_density=0.1)
+    bits = BitVolume.from_array(volume)
+    np.testing.assert_array_equal(bits.to_array(), two_state(volume))
+    assert bits.count() == int(((volume > 0)).sum())
+
+
+@pytest.mark.parametrize('birth, survival', RULES)
+def test_engine_matches_dense_over_12_steps(rng, birth, survival):
+    rule = life3d_rule_generalized(birth_set=birth, survival_set=survival)
+    volume = random_ids(rng, (11, 12, 70), density=0.3, env_density=0.05)
+    dense, bits = DenseEngine(rule), BitboardEngine(rule)
+    dense.reset(volume)
+    bits.reset(volume)
+    for _ in range(12):
+        dense.step()
+        bits.step()
+        np.testing.assert_array_equal(bits.volume(), two_state(dense.volume()))
+
+
+def test_evolve_volume_only_unpacks_kept_states(rng, monkeypatch):
+    rule = life3d_rule_generalized(birth_set={4}, survival_set={5})
+    volume = random_ids(rng, (10, 10, 10), density=0.3)
+    calls = []
+    to_array = BitVolume.to_array
+    monkeypatch.setattr(BitVolume, 'to_array', lambda self, *a: calls.append(1) or to_array(self, *a))
+
+    states, _ = automaton.evolve_volume(volume, rule, steps=12, engine='bitboard', keep=('every', 4))
+    assert len(calls) == 3                      # timesteps 4, 8, 12
+    expected, _ = automaton.evolve_volume(volume, rule, steps=12, keep=('every', 4))
+    for state, reference in zip(states, expected):
+        np.testing.assert_array_equal(two_state(state), two_state(reference))
@@ -0,0 +1,82 @@
+"""
+Compiled codebook rules against the per-voxel codebook lookup
+
+JCA
+"""
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+from scipy.ndimage import generic_filter
+
+import CellularAutomaton.kernels as kernels
+from CellularAutomaton.automaton import codebook_rule_fn
+
+
+def windows_of(volume):
+    """Every 3×3×3 window of a binary volume (zero padded), flattened in C order."""
+    padded = np.pad(volume != 0, 1).astype(np.uint8)
+    return sliding_window_view(padded, (3, 3, 3)).reshape(-1, 27)
+
+
+def codebook_of(volume, rng, fraction=1.0):
+    """Codebook with a random new state for (a fraction of) the windows of `volume`."""
+    keys = np.unique(windows_of(volume), axis=0)
+    keys = keys[rng.random(len(keys)) < fraction]
+    return {tuple(int(x) for x in key): int(rng.integers(0, 2)) for key in keys}
+
+
+def per_voxel(rule, volume):
+    return generic_filter(volume, rule, size=3, mode='constant', cval=0)
+
+
+def test_encode_patterns_roundtrip(rng):
+    patterns = rng.integers(0, 2, size=(100, 27))
+    np.testing.assert_array_equal(kernels.decode_patterns(kernels.encode_patterns(patterns)), patterns)
+
+
+def test_encode_windows_matches_window_codes(rng):
+    volume = (rng.random((7, 8, 9)) < 0.4).astype(int)
+    expected = kernels.encode_patterns(windows_of(volume)).reshape(volume.shape)
+    np.testing.assert_array_equal(kernels.encode_windows(volume), expected)
+
+
+def test_compiled_codebook_matches_lookup(rng):
+    volume = (rng.random((10, 10, 10)) < 0.3).astype(int)
+    rule = codebook_rule_fn(codebook_of(volume, rng), compiled=True, seed=0)
+    np.testing.assert_array_equal(rule.vectorized(volume), per_voxel(rule, volume))
+
+
+def test_compiled_codebook_l2_fallback_matches_lookup(rng):
+    volume = (rng.random((9, 9, 9)) < 0.3).astype(int)
+    rule = codebook_rule_fn(codebook_of(volume, rng, fraction=0.3), not_found='l2', compiled=True)
+    np.testing.assert_array_equal(rule.vectorized(volume), per_voxel(rule, volume))
+
+
+def test_compiled_codebook_random_fallback_is_seeded(rng):
+    volume = (rng.random((9, 9, 9)) < 0.3).astype(int)
+    codebook = codebook_of(volume, rng, fraction=0.5)
+    first = codebook_rule_fn(codebook, compiled=True, seed=3).vectorized(volume)
+    second = codebook_rule_fn(codebook, compiled=True, seed=3).vectorized(volume)
+    np.testing.assert_array_equal(first, second)
+    assert set(np.unique(first)) <= {0, 1}
+
+    # Matched windows get their codebook state whatever the seed
+    codes, states = kernels.compile_codebook(codebook)
+    windows = kernels.encode_windows(volume)
+    idx = np.minimum(np.searchsorted(codes, windows), len(codes) - 1)
+    found = codes[idx] == windows
+    np.testing.assert_array_equal(first[found], states[idx[found]])
+
+
+def test_pattern_index_matches_argmin_l2(rng):
+    from CellularAutomaton.codebook import PatternIndex
+    keys = rng.integers(0, 2, size=(40, 27))
+    codebook = {tuple(int(x) for x in key): i for i, key in enumerate(keys)}
+    keys = np.array(list(codebook.keys()))
+    index = PatternIndex(codebook, cache_size=64)
+
+    queries = rng.integers(0, 2, size=(300, 27))
+    expected = np.array(list(codebook.values()))[
+        np.argmin(((queries[:, None, :] - keys[None]) ** 2).sum(axis=2), axis=1)]
+    np.testing.assert_array_equal(index.nearest(queries), expected)
+    # Memoized (and cache-cleared) lookups give the same answer
+    np.testing.assert_array_equal(index.nearest(queries[::-1]), expected[::-1])
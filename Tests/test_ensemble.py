@@ -0,0 +1,60 @@
+"""
+Batched ensembles against single bit-packed runs
+
+JCA
+"""
+import numpy as np
+import pytest
+
+from CellularAutomaton.bitboard import BitVolume
+from CellularAutomaton.ensemble import member_volume, run_ensemble, sweep
+
+from conftest import random_ids
+
+
+def reference(volume, birth, survival, steps):
+    """Live counts and final state of one member stepped on its own."""
+    bits = BitVolume.from_array(volume)
+    counts = [bits.count()]
+    for _ in range(steps):
+        bits = bits.step(birth, survival)
+        counts.append(bits.count())
+    return np.array(counts), bits.to_array()
+
+
+@pytest.mark.parametrize('batch_size', [1, 2, 8])
+def test_members_match_single_runs_over_12_steps(rng, batch_size):
+    rules = [({3}, {2, 3}), ({4}, {5}), ({0, 2, 7}, {1, 4, 9, 26})]
+    configs = [dict(volume=random_ids(rng, (9, 10, 11), density=0.3, env_density=0.05),
+                    birth_set=b, survival_set=s) for b, s in rules * 2]
+    results = run_ensemble(configs, steps=12, keep_final=True, batch_size=batch_size)
+    assert len(results) == len(configs)
+    for config, result in zip(configs, results):
+        counts, final = reference(config['volume'], config['birth_set'], config['survival_set'], 12)
+        np.testing.assert_array_equal(result['live'], counts)
+        np.testing.assert_array_equal(result['final'], final)
+        np.testing.assert_array_equal(result['births'] - result['deaths'], np.diff(counts))
+
+
+def test_generated_members_follow_their_seed():
+    configs = sweep([{3}], [{2, 3}], [0, 1], n_clusters=2, cluster_radius=2, noise_density=0.05)
+    results = run_ensemble(configs, shape=(12, 12, 12), steps=4, keep_final=True)
+    for config, result in zip(configs, results):
+        _, final = reference(member_volume(config, (12, 12, 12)), {3}, {2, 3}, 4)
+        np.testing.assert_array_equal(result['final'], final)
+
+
+def test_zero_steps(rng):
+    configs = [dict(volume=random_ids(rng, (6, 6, 6)), birth_set={3}, survival_set={2, 3})
+               for _ in range(3)]
+    for result, config in zip(run_ensemble(configs, steps=0, keep_final=True), configs):
+        assert result['births'].shape == result['deaths'].shape == (0,)
+        assert result['live'].tolist() == [int((config['volume'] > 0).sum())]
+    with pytest.raises(ValueError):
+        run_ensemble(configs, steps=-1)
+
+
+def test_configs_cannot_set_env_id():
+    with pytest.raises(ValueError, match='env_id'):
+        run_ensemble([dict(seed=0, env_id=-2, birth_set={3}, survival_set={2, 3})],
+                     shape=(8, 8, 8), steps=1)
@@ -0,0 +1,71 @@
+"""
+FFT neighbour counts against direct convolution
+
+JCA
+"""
+import numpy as np
+import pytest
+from scipy.ndimage import convolve
+
+import CellularAutomaton.kernels as kernels
+from CellularAutomaton.rules import RuleSpec, compile_rule, neighbour_counter, rule_kernel
+
+from conftest import random_ids
+
+
+SPECS = [RuleSpec(neighbourhood=n, radius=r) for n in ('moore', 'von_neumann') for r in (1, 2, 5)]
+
+
+@pytest.mark.parametrize('spec', SPECS, ids=lambda s: f'{s.neighbourhood}-{s.radius}')
+@pytest.mark.parametrize('shape', [(16, 16, 16), (13, 7, 22), (3, 30, 5)])
+def test_fft_counter_matches_convolve(rng, spec, shape):
+    alive = rng.random(shape) < 0.4
+    footprint = spec.footprint()
+    expected = convolve(alive.astype(np.int32), footprint.astype(np.int32), mode='constant', cval=0)
+    np.testing.assert_array_equal(kernels.FFTCounter(footprint)(alive), expected)
+    for method in ('direct', 'fft', 'auto'):
+        np.testing.assert_array_equal(neighbour_counter(spec, method)(alive), expected)
+
+
+def test_spectrum_cache(rng):
+    counter = kernels.FFTCounter(RuleSpec(radius=2).footprint(), max_shapes=2)
+    for shape in [(8, 8, 8), (8, 8, 8), (9, 8, 8)]:
+        counter(rng.random(shape) < 0.5)
+    assert set(counter.spectra) == {(8, 8, 8), (9, 8, 8)}
+    counter(rng.random((10, 8, 8)) < 0.5)
+    assert set(counter.spectra) == {(10, 8, 8)}
+
+
+def test_fft_is_faster():
+    assert not kernels.fft_is_faster((64, 64, 64), 3)
+    assert kernels.fft_is_faster((64, 64, 64), RuleSpec(radius=5).size, radius=5)
+
+
+def test_fft_choice_follows_the_padded_size():
+    # 20 + 2 pads to 24, 22 + 2 is already a fast length: the larger volume is cheaper
+    assert kernels.FFTCounter(RuleSpec(radius=1).footprint()).padded_shape((20, 20, 20)) == (24, 24, 24)
+    assert not kernels.fft_is_faster((20, 20, 20), 20)
+    assert kernels.fft_is_faster((22, 22, 22), 20)
+    # A wider footprint pads more
+    assert not kernels.fft_is_faster((22, 22, 22), 20, radius=2)
+
+
+def test_auto_counter_passes_the_radius(monkeypatch):
+    calls = []
+    estimate = kernels.fft_is_faster
+    monkeypatch.setattr(kernels, 'fft_is_faster', lambda *args: calls.append(args) or estimate(*args))
+    neighbour_counter(RuleSpec(radius=3), 'auto')(np.ones((9, 10, 11), dtype=bool))
+    assert calls == [((9, 10, 11), 7, 3)]
+
+
+@pytest.mark.parametrize('notation, radius', [('30-60/20-30/3/M', 3), ('10-40/8-15/2/N', 4)])
+def test_fft_steps_match_direct_steps(rng, notation, radius):
+    direct = compile_rule(notation, method='direct', radius=radius, inherit='max')
+    spectral = compile_rule(notation, method='fft', radius=radius, inherit='max')
+    assert direct is not spectral and direct.spec == spectral.spec
+    volume = random_ids(rng, (20, 18, 16), density=0.3, n_ids=5, env_density=0.02)
+    a = b = volume
+    for _ in range(12):
+        a, b = direct.vectorized(a), spectral.vectorized(b)
+        np.testing.assert_array_equal(a, b)
+    np.testing.assert_array_equal(rule_kernel(direct.spec)(volume), rule_kernel(direct.spec, 'fft')(volume))
@@ -0,0 +1,62 @@
+"""
+HashLife octree engine against the dense engine
+
+JCA
+"""
+import numpy as np
+import pytest
+
+import CellularAutomaton.automaton as automaton
+from CellularAutomaton.codebook import life3d_rule_generalized
+from CellularAutomaton.engines import DenseEngine
+from CellularAutomaton.hashlife import HashLifeEngine
+
+from conftest import random_ids
+
+
+def two_state(volume, env_id=-1):
+    return np.where(volume == env_id, env_id, volume > 0)
+
+
+@pytest.mark.parametrize('birth, survival', [({4}, {4, 5}), ({3}, {2, 3}), ({5, 6}, {4, 5, 6, 7})])
+def test_matches_dense_over_12_steps(rng, birth, survival):
+    rule = life3d_rule_generalized(birth_set=birth, survival_set=survival)
+    volume = random_ids(rng, (9, 12, 10), density=0.3, env_density=0.05)
+    dense, hashlife = DenseEngine(rule), HashLifeEngine(rule)
+    dense.reset(volume)
+    hashlife.reset(volume)
+    for _ in range(12):
+        dense.step()
+        hashlife.step()
+        np.testing.assert_array_equal(hashlife.volume(), two_state(dense.volume()))
+
+
+def test_advance_jumps_like_single_steps(rng):
+    rule = life3d_rule_generalized(birth_set={4}, survival_set={4, 5})
+    volume = random_ids(rng, (12, 12, 12), density=0.3, env_density=0.02)
+    stepped, jumped = HashLifeEngine(rule), HashLifeEngine(rule)
+    stepped.reset(volume)
+    jumped.reset(volume)
+    for _ in range(13):
+        stepped.step()
+    jumped.advance(13)
+    np.testing.assert_array_equal(jumped.volume(), stepped.volume())
+
+
+def test_evolve_volume_leaps_over_unkept_states(rng, monkeypatch):
+    rule = life3d_rule_generalized(birth_set={4}, survival_set={4, 5})
+    volume = random_ids(rng, (10, 10, 10), density=0.3)
+    leaps, densified = [], []
+    advance, dense = HashLifeEngine.advance, HashLifeEngine.volume
+    monkeypatch.setattr(HashLifeEngine, 'advance', lambda self, n: leaps.append(n) or advance(self, n))
+    monkeypatch.setattr(HashLifeEngine, 'volume', lambda self: densified.append(1) or dense(self))
+
+    states, _ = automaton.evolve_volume(volume, rule, steps=16, engine='hashlife', keep=('every', 8))
+    assert leaps == [8, 8]
+    assert len(densified) == 2
+
+    last, _ = automaton.evolve_volume(volume, rule, steps=16, engine='hashlife', keep='last')
+    assert leaps[2:] == [16]
+    reference, _ = automaton.evolve_volume(volume, rule, steps=16, keep='last')
+    np.testing.assert_array_equal(last[0], two_state(reference[0]))
+    np.testing.assert_array_equal(states[-1], last[0])
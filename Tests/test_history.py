@@ -0,0 +1,134 @@
+"""
+Retention policies against the full history of a run
+
+JCA
+"""
+import numpy as np
+import pytest
+
+import CellularAutomaton.automaton as automaton
+from CellularAutomaton.codebook import life3d_rule_generalized
+from CellularAutomaton.history import (DeltaHistory, FullHistory, LastHistory, NoHistory, StrideHistory,
+                                       make_history)
+
+from conftest import random_ids
+
+
+STEPS = 12
+
+
+@pytest.fixture
+def run(rng):
+    """Every state of a 12-step run, as fresh copies."""
+    rule = life3d_rule_generalized(birth_set={4}, survival_set={4, 5})
+    volume = random_ids(rng, (10, 10, 10), density=0.3, n_ids=1)
+    states, _ = automaton.evolve_volume(volume, rule, steps=STEPS)
+    return rule, volume, states
+
+
+def feed(history, states):
+    """Offer every state through one reused buffer, as engines do."""
+    buffer = np.empty_like(states[0])
+    for t, state in enumerate(states):
+        buffer[:] = state
+        history.append(t, buffer)
+    return history
+
+
+def assert_states(kept, expected):
+    assert len(kept) == len(expected)
+    for a, b in zip(kept, expected):
+        np.testing.assert_array_equal(a, b)
+
+
+def test_full_history_copies(run):
+    _, _, states = run
+    assert_states(feed(FullHistory(), states).states(), states)
+
+
+def test_last_history_ring(run):
+    _, _, states = run
+    history = feed(LastHistory(5), states)
+    assert history.timesteps == list(range(STEPS - 4, STEPS + 1))
+    assert_states(history.states(), states[-5:])
+
+
+def test_stride_history(run):
+    _, _, states = run
+    history = feed(StrideHistory(5), states)
+    assert history.timesteps == [0, 5, 10]
+    assert_states(history.states(), states[::5])
+
+
+def test_no_history(run):
+    _, _, states = run
+    assert feed(NoHistory(), states).states() == []
+
+
+@pytest.mark.parametrize('keep, select', [
+    ('all', slice(None)), ('last', slice(-1, None)), (4, slice(-4, None)), (None, slice(0)),
+    (('every', 3), slice(None, None, 3)),
+])
+def test_evolve_volume_keep(run, keep, select):
+    rule, volume, states = run
+    kept, _ = automaton.evolve_volume(volume, rule, steps=STEPS, keep=keep)
+    assert_states(list(kept), states[select])
+
+
+def test_wants_matches_what_is_kept():
+    for keep in ('all', 'last', 3, None, ('every', 4)):
+        history = make_history(keep)
+        kept = [t for t in range(STEPS + 1) if history.wants(t, STEPS)]
+        feed(history, [np.full((2, 2, 2), t) for t in range(STEPS + 1)])
+        assert kept == [int(state[0, 0, 0]) for state in history.states()]
+
+
+def test_make_history_rejects_unknown_options():
+    with pytest.raises(ValueError):
+        make_history('first')
+    with pytest.raises(ValueError):
+        LastHistory(0)
+
+
+@pytest.mark.parametrize('on_disk', [False, True])
+@pytest.mark.parametrize('keyframe_every', [1, 4, 32])
+def test_delta_history_roundtrip(run, tmp_path, on_disk, keyframe_every):
+    _, _, states = run
+    history = feed(DeltaHistory(keyframe_every, tmp_path if on_disk else None), states)
+    assert len(history) == len(states)
+    assert history.timesteps == list(range(STEPS + 1))
+
+    assert_states(list(history), states)
+    assert_states([history[i] for i in range(-1, -len(states) - 1, -1)], states[::-1])
+    assert_states(history[3:11:2], states[3:11:2])
+    assert_states(list(history.iter_range(5, 9)), states[5:9])
+    with pytest.raises(IndexError):
+        history[len(states)]
+
+    # Changes are small: deltas take less room than full states
+    if keyframe_every > 1:
+        assert history.nbytes < sum(s.nbytes for s in states)
+
+
+@pytest.mark.parametrize('select', [slice(5, 2, -1), slice(None, None, -1), slice(-2, None, -3),
+                                    slice(10, 1, -4), slice(2, 5, -1), slice(None, None, 5)])
+def test_delta_history_slices(run, select):
+    _, _, states = run
+    history = feed(DeltaHistory(4), states)
+    assert_states(history[select], states[select])
+
+
+def test_delta_history_states_are_independent(run):
+    _, _, states = run
+    history = feed(DeltaHistory(4), states)
+    first = history[5]
+    first[:] = 0
+    np.testing.assert_array_equal(history[5], states[5])
+
+
+def test_evolve_volume_keep_delta(run):
+    rule, volume, states = run
+    kept, _ = automaton.evolve_volume(volume, rule, steps=STEPS, keep=('delta', 5))
+    assert isinstance(kept, DeltaHistory)
+    assert_states(list(kept), states)
+    assert all(kept.wants(t, STEPS) for t in range(STEPS + 1))
@@ -0,0 +1,75 @@
+"""
+Seeded, tiled initializers
+
+JCA
+"""
+import numpy as np
+import pytest
+
+import CellularAutomaton.initializers as init
+from CellularAutomaton.outofcore import open_volume
+
+
+SHAPE = (24, 20, 16)
+OPTIONS = dict(n_clusters=4, cluster_radius=3, density=0.6, noise_density=0.05, env_density=0.05)
+
+
+@pytest.mark.parametrize('env_type', [None, 'speckles', 'structured'])
+def test_same_seed_same_volume(env_type):
+    a, colors_a = init.initialize_volume_clusters(SHAPE, env_type=env_type, seed=3, **OPTIONS)
+    b, colors_b = init.initialize_volume_clusters(SHAPE, env_type=env_type, rng=np.random.default_rng(3),
+                                                  **OPTIONS)
+    np.testing.assert_array_equal(a, b)
+    assert colors_a.keys() == colors_b.keys()
+    c, _ = init.initialize_volume_clusters(SHAPE, env_type=env_type, seed=4, **OPTIONS)
+    assert (a != c).any()
+
+
+@pytest.mark.parametrize('env_type', [None, 'speckles', 'structured'])
+@pytest.mark.parametrize('noise_ids', [1024, 7, None])
+def test_tiling_does_not_change_the_volume(monkeypatch, env_type, noise_ids):
+    whole, colors = init.initialize_volume_clusters(SHAPE, env_type=env_type, noise_ids=noise_ids, seed=5,
+                                                    **OPTIONS)
+    for chunk in (1, 3 * 20 * 16, 5 * 20 * 16):
+        monkeypatch.setattr(init, 'INIT_CHUNK', chunk)
+        tiled, tiled_colors = init.initialize_volume_clusters(SHAPE, env_type=env_type, noise_ids=noise_ids,
+                                                              seed=5, **OPTIONS)
+        np.testing.assert_array_equal(tiled, whole)
+        assert tiled_colors == colors
+
+
+def test_ids_and_colors(rng):
+    volume, colors = init.initialize_volume_clusters(SHAPE, env_type='speckles', rng=rng, **OPTIONS)
+    ids = set(np.unique(volume).tolist()) - {0}
+    assert ids <= set(colors)
+    assert colors[-1] == (0.0, 0.0, 0.0)
+    assert set(range(1, 5)) & ids
+
+    codes, palette = init.initialize_volume_clusters(SHAPE, env_type='speckles', compact=True,
+                                                     rng=np.random.default_rng(1234), **OPTIONS)
+    assert codes.dtype == np.int16      # ~400 noise IDs
+    np.testing.assert_array_equal(codes, volume)
+    np.testing.assert_array_equal(palette.ids, sorted(ids - {-1}))
+
+
+def test_out_matches_in_memory(tmp_path, monkeypatch):
+    monkeypatch.setattr(init, 'INIT_CHUNK', 4 * 20 * 16)
+    volume, _ = init.initialize_volume_clusters(SHAPE, env_type='structured', seed=9, **OPTIONS)
+    out = open_volume(str(tmp_path / 'init.npy'), SHAPE, np.int16)
+    result, _ = init.initialize_volume_clusters(SHAPE, env_type='structured', seed=9, out=out, **OPTIONS)
+    assert result is out
+    np.testing.assert_array_equal(out, volume)
+
+    space, _ = init.initialize_space(SHAPE, prob=0.3, seed=2)
+    out = open_volume(str(tmp_path / 'space.npy'), SHAPE, np.int8)
+    init.initialize_space(SHAPE, prob=0.3, seed=2, out=out)
+    np.testing.assert_array_equal(out, space)
+
+
+def test_initialize_space():
+    volume, colors = init.initialize_space((30, 30, 30), prob=0.25, seed=0)
+    assert set(np.unique(volume)) <= {0, 1} and colors == {1: (0.8, 0.8, 0.8)}
+    assert abs(volume.mean() - 0.25) < 0.02
+    compact, palette = init.initialize_space((30, 30, 30), prob=0.25, seed=0, compact=True)
+    assert compact.dtype == np.int8
+    np.testing.assert_array_equal(compact, volume)
@@ -0,0 +1,85 @@
+"""
+Per-step instrumentation of evolve_volume
+
+JCA
+"""
+import json
+
+import numpy as np
+import pytest
+
+import CellularAutomaton.automaton as automaton
+import CellularAutomaton.instrument as instrument
+from CellularAutomaton.codebook import life3d_rule_generalized
+from CellularAutomaton.instrument import PHASES, Instrumentation, make_instrumentation
+from CellularAutomaton.output import FrameWriter
+
+from conftest import random_ids
+
+
+def rule():
+    return life3d_rule_generalized(birth_set={4}, survival_set={5})
+
+
+def test_events(rng, tmp_path):
+    volume = random_ids(rng, (8, 8, 8), density=0.3, n_ids=3)
+    seen = []
+    metrics = Instrumentation(callbacks=[seen.append], path=str(tmp_path / 'metrics.jsonl'), populations=True)
+    states, _ = automaton.evolve_volume(volume, rule(), steps=5, metrics=metrics, stats=True)
+
+    assert [e['timestep'] for e in metrics.events] == list(range(6)) and seen == metrics.events
+    for event, state in zip(metrics.events, states):
+        assert set(PHASES) <= set(event)
+        assert event['live'] == int((state > 0).sum())
+        ids, counts = np.unique(state[state > 0], return_counts=True)
+        assert event['populations'] == dict(zip(ids.tolist(), counts.tolist()))
+    assert metrics.events[-1]['copy'] > 0 and metrics.events[-1]['stats'] > 0
+    assert metrics.events[-1]['submit'] == metrics.events[-1]['runfile'] == 0.0
+
+    lines = (tmp_path / 'metrics.jsonl').read_text().splitlines()
+    assert [json.loads(line) for line in lines] == json.loads(json.dumps(metrics.events))
+    assert set(metrics.totals()) == set(PHASES)
+
+
+def test_writer_phases(rng, tmp_path):
+    volume = random_ids(rng, (6, 6, 6), density=0.3, n_ids=1)
+    metrics = Instrumentation()
+    writer = FrameWriter(str(tmp_path), writers=(), workers=0)
+    automaton.evolve_volume(volume, rule(), steps=2, savepath=str(tmp_path), writer=writer, metrics=metrics)
+    assert all(e['submit'] > 0 and e['runfile'] > 0 for e in metrics.events)
+
+
+def test_no_timers_without_metrics(rng, monkeypatch):
+    volume = random_ids(rng, (6, 6, 6), density=0.3, n_ids=1)
+
+    def perf_counter():
+        raise AssertionError('timed without metrics')
+    monkeypatch.setattr(automaton.time, 'perf_counter', perf_counter)
+    states, _ = automaton.evolve_volume(volume, rule(), steps=3, stats=True)
+    assert len(states) == 4
+
+
+def test_make_instrumentation(tmp_path):
+    assert make_instrumentation(None) is None
+    metrics = Instrumentation()
+    assert make_instrumentation(metrics) is metrics
+    assert make_instrumentation(str(tmp_path / 'm.jsonl')).path == str(tmp_path / 'm.jsonl')
+    assert len(make_instrumentation(print).callbacks) == 1
+    assert len(make_instrumentation([print, print]).callbacks) == 2
+
+
+@pytest.mark.parametrize('platform, expected', [('darwin', 5000), ('linux', 5000 * 1024)])
+def test_peak_memory_units(monkeypatch, platform, expected):
+    class Usage:
+        ru_maxrss = 5000
+
+    class Resource:
+        RUSAGE_SELF = 0
+
+        @staticmethod
+        def getrusage(who):
+            return Usage
+
+    monkeypatch.setattr(instrument, 'resource', Resource)
+    monkeypatch.setattr(instrument.sys, 'platform', platform)
+    assert instrument.peak_memory() == expected
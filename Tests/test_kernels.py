@@ -0,0 +1,68 @@
+"""
+Vectorized whole-volume kernels against the per-voxel rules
+
+JCA
+"""
+import random
+from collections import Counter
+
+import numpy as np
+import pytest
+from scipy.ndimage import generic_filter
+
+import CellularAutomaton.kernels as kernels
+from CellularAutomaton.codebook import life3d_rule_generalized
+
+from conftest import random_ids
+
+
+def per_voxel(rule_fn, volume):
+    return generic_filter(volume, rule_fn, size=3, mode='constant', cval=0)
+
+
+@pytest.mark.parametrize('birth, survival', [({3}, {2, 3}), ({4}, {5}), ({2, 3, 4}, {1, 2, 6})])
+def test_life3d_step_matches_generic_filter(rng, birth, survival):
+    rule = life3d_rule_generalized(birth_set=birth, survival_set=survival)
+    volume = random_ids(rng, (12, 13, 14), density=0.35, n_ids=4, env_density=0.05)
+    for _ in range(4):
+        random.seed(7)
+        expected = per_voxel(rule, volume)
+        random.seed(7)
+        result = rule.vectorized(volume)
+        np.testing.assert_array_equal(result, expected)
+        volume = expected
+
+
+def test_life3d_step_writes_into_out(rng):
+    rule = life3d_rule_generalized()
+    volume = random_ids(rng, (10, 10, 10), density=0.4)
+    out = np.full_like(volume, 99)
+    random.seed(0)
+    result = kernels.life3d_step(volume, out=out)
+    random.seed(0)
+    assert result is out
+    np.testing.assert_array_equal(out, per_voxel(rule, volume))
+
+
+def test_majority_id_matches_counter(rng):
+    neighbours = rng.integers(-1, 4, size=(2000, 26))
+    neighbours[:50] = 0                      # no voters
+    neighbours[50:100] = np.where(rng.random((50, 26)) < 0.5, 2, 0)  # one ID only
+    winner, tie, voters = kernels.majority_id(neighbours, env_id=-1)
+
+    for row, w, t, v in zip(neighbours, winner, tie, voters):
+        counts = Counter(int(x) for x in row if x > 0).most_common()
+        assert v == bool(counts)
+        if not counts:
+            assert w == 0 and not t
+            continue
+        top = [i for i, c in counts if c == counts[0][1]]
+        assert t == (len(top) > 1)
+        assert w in top
+
+
+def test_apply_rule_uses_vectorized_step(rng):
+    from CellularAutomaton.automaton import apply_rule
+    rule = life3d_rule_generalized(birth_set={4}, survival_set={5})
+    rule.vectorized = lambda volume, out=None: np.full_like(volume, 7)
+    assert (apply_rule(random_ids(rng, (5, 5, 5)), rule) == 7).all()
@@ -0,0 +1,81 @@
+"""
+Native per-voxel rules against the Python rules
+
+JCA
+"""
+from collections import Counter
+
+import numpy as np
+import pytest
+
+numba = pytest.importorskip('numba')
+
+import CellularAutomaton.codebook as codebook
+import CellularAutomaton.native as native
+from CellularAutomaton.kernels import rule_step
+
+from conftest import random_ids
+
+
+def run_both(python_rule, native_rule, volume, steps=12):
+    python_step, native_step = rule_step(python_rule), rule_step(native_rule)
+    a = b = volume
+    for _ in range(steps):
+        a, b = python_step(a), native_step(b)
+        np.testing.assert_array_equal(b, a)
+
+
+@pytest.mark.parametrize('birth, survival', [({3}, {2, 3}), ({4}, {5}), ({0, 2, 7}, {1, 4, 9, 26})])
+def test_generalized_matches_python_over_12_steps(rng, birth, survival):
+    # A single ID: no majority ties, whose tie-breaking differs between the two
+    volume = random_ids(rng, (10, 11, 12), density=0.3, n_ids=1, env_density=0.05)
+    rule = native.life3d_rule_generalized(birth_set=birth, survival_set=survival)
+    assert hasattr(rule, 'low_level') and rule.params['birth_set'] == birth
+    run_both(codebook.life3d_rule_generalized(birth_set=birth, survival_set=survival), rule, volume)
+
+
+def test_life3d_rule_matches_python(rng):
+    volume = random_ids(rng, (9, 9, 9), density=0.3, n_ids=1)
+    run_both(codebook.life3d_rule, native.life3d_rule, volume, steps=4)
+
+
+def test_majority_id(rng):
+    native.seed(3)
+    for _ in range(300):
+        window = rng.integers(-1, 4, 27).astype(np.float64)
+        counts = Counter(int(x) for i, x in enumerate(window) if i != 13 and x > 0).most_common()
+        winner = native.majority_id(window, -1)
+        if not counts:
+            assert winner == 0
+        elif len(counts) == 1 or counts[0][1] > counts[1][1]:
+            assert winner == counts[0][0]
+        else:
+            assert winner in dict(counts)    # a random voter, as in the Python rule
+    window = np.zeros(27)
+    window[[0, 1]] = 5
+    assert native.majority_id(window, -1) == 5 and native.neighbour_count(window) == 2
+
+
+def test_custom_rule_and_fallback():
+    @native.native_rule
+    def parity(window):
+        return float(native.neighbour_count(window) % 2)
+
+    volume = np.zeros((5, 5, 5))
+    volume[2, 2, 2] = 1
+    assert hasattr(parity, 'low_level')
+    assert rule_step(parity)(volume).sum() == 26
+    assert parity(np.ones(27)) == 0.0   # still callable from Python
+
+    with pytest.warns(UserWarning, match='natively'):
+        @native.native_rule
+        def uses_counter(window):
+            return Counter(window.tolist()).most_common()[0][0]
+    assert not hasattr(uses_counter, 'low_level')
+
+
+def test_without_numba(monkeypatch):
+    monkeypatch.setattr(native, 'numba', None)
+    with pytest.warns(UserWarning, match='not installed'):
+        rule = native.native_rule(lambda window: window[13])
+    assert not hasattr(rule, 'low_level')
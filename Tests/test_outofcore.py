@@ -0,0 +1,105 @@
+"""
+Out-of-core engine against the dense engine
+
+JCA
+"""
+import os
+
+import numpy as np
+import pytest
+
+import CellularAutomaton.automaton as automaton
+from CellularAutomaton.codebook import life3d_rule_generalized
+from CellularAutomaton.engines import DenseEngine
+from CellularAutomaton.kernels import rule_step
+from CellularAutomaton.outofcore import OutOfCoreEngine, open_volume, slab_size, step_slabs, unique_ids
+from CellularAutomaton.rules import compile_rule
+
+from conftest import random_ids
+
+
+def run_both(rule, volume, steps=12, **kwargs):
+    dense, disk = DenseEngine(rule), OutOfCoreEngine(rule, **kwargs)
+    dense.reset(volume)
+    disk.reset(volume)
+    for _ in range(steps):
+        dense.step()
+        disk.step()
+        np.testing.assert_array_equal(disk.volume(), dense.volume())
+    return disk
+
+
+def test_slab_size():
+    shape = (100, 10, 10)
+    assert slab_size(shape, np.int8, 10**9) == 100
+    assert slab_size(shape, np.int8, 0) == 1
+    assert slab_size(shape, np.int8, 20 * 100 * 13) == 18  # 20 planes minus the halo
+
+
+@pytest.mark.parametrize('memory_budget', [1, 5 * 1300, 2**30])
+def test_matches_dense_over_12_steps(rng, tmp_path, memory_budget):
+    rule = life3d_rule_generalized(birth_set={4}, survival_set={4, 5})
+    volume = random_ids(rng, (17, 10, 10), density=0.25, n_ids=1, env_density=0.03).astype(np.int8)
+    disk = run_both(rule, volume, path=str(tmp_path), memory_budget=memory_budget)
+    disk.close()
+    assert sorted(os.listdir(tmp_path)) == ['state-0.npy', 'state-1.npy']
+
+
+def test_matches_dense_with_a_larger_window(rng):
+    rule = compile_rule('9-20/8-12/2/M', radius=2, inherit='max')
+    volume = random_ids(rng, (14, 10, 10), density=0.3, n_ids=1)
+    disk = run_both(rule, volume, memory_budget=3 * 1300 * 8)
+    assert disk.radius == 2 and disk.slab < volume.shape[0]
+    disk.close()
+
+
+def test_step_slabs_on_memmaps(rng, tmp_path):
+    rule = life3d_rule_generalized(birth_set={4}, survival_set={5})
+    volume = random_ids(rng, (9, 8, 8), density=0.3, n_ids=1)
+    source = open_volume(str(tmp_path / 'a.npy'), volume.shape, volume.dtype)
+    source[:] = volume
+    target = open_volume(str(tmp_path / 'b.npy'), volume.shape, volume.dtype)
+    step = rule_step(rule)
+    step_slabs(source, target, step, slab=2)
+    np.testing.assert_array_equal(target, step(volume))
+
+
+def test_close_removes_the_temporary_directory(rng):
+    rule = life3d_rule_generalized(birth_set={4}, survival_set={5})
+    volume = random_ids(rng, (8, 8, 8), density=0.3, n_ids=1)
+    disk = OutOfCoreEngine(rule)
+    disk.reset(volume)
+    disk.step()
+    assert os.path.isdir(disk.path)
+    disk.close()
+    assert not os.path.exists(disk.path) and disk.buffers == []
+    disk.close()
+
+    # The engine can be reset after close, and a run closes it
+    states, _ = automaton.evolve_volume(volume, rule, steps=3, engine=disk, keep='last')
+    assert not os.path.exists(disk.path)
+    expected, _ = automaton.evolve_volume(volume, rule, steps=3, keep='last')
+    np.testing.assert_array_equal(states[-1], expected[-1])
+
+
+def test_unique_ids_reads_memmaps_by_slab(rng, tmp_path):
+    volume = random_ids(rng, (12, 5, 4), density=0.4, n_ids=9, env_density=0.1)
+    disk = open_volume(str(tmp_path / 'v.npy'), volume.shape, volume.dtype)
+    disk[:] = volume
+    # A budget of about one plane per slab
+    np.testing.assert_array_equal(unique_ids(disk, memory_budget=1), np.unique(volume))
+    np.testing.assert_array_equal(unique_ids(volume), np.unique(volume))
+
+
+def test_outofcore_run_rejects_keep_all(rng):
+    rule = life3d_rule_generalized(birth_set={4}, survival_set={5})
+    volume = random_ids(rng, (6, 6, 6), density=0.3, n_ids=1)
+    disk = OutOfCoreEngine(rule)
+    for engine in ('outofcore', disk):
+        with pytest.raises(ValueError):
+            automaton.evolve_volume(volume, rule, steps=2, engine=engine)
+    disk.close()
+    states, cmap_dict = automaton.evolve_volume(volume, rule, steps=2, engine='outofcore', keep='last')
+    assert len(states) == 1
+    # Nothing writes frames: no default colormap is built
+    assert cmap_dict is None
@@ -0,0 +1,94 @@
+"""
+Asynchronous frame writer and run shutdown
+
+JCA
+"""
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pytest
+
+import CellularAutomaton.automaton as automaton
+from CellularAutomaton.codebook import life3d_rule_generalized
+from CellularAutomaton.engines import DenseEngine
+from CellularAutomaton.output import FrameWriter
+
+from conftest import random_ids
+
+
+def save_npy(volume, path, timestep, voxel_size=1.0, cmap_dict=None):
+    np.save(os.path.join(path, f'frame-{timestep}.npy'), volume * voxel_size)
+
+
+def fail(volume, path, timestep, **kwargs):
+    raise OSError(f'disk full at {timestep}')
+
+
+class Broken(Exception):
+    pass
+
+
+class BrokenEngine(DenseEngine):
+    """Dense engine failing at its third step."""
+    def step(self):
+        if getattr(self, 'steps', 0) == 2:
+            raise Broken()
+        self.steps = getattr(self, 'steps', 0) + 1
+        super().step()
+
+
+@pytest.mark.parametrize('workers, processes', [(0, False), (2, False), (2, True)])
+def test_frames_are_written_with_the_options(rng, tmp_path, workers, processes):
+    volumes = [rng.integers(0, 3, (4, 4, 4)) for _ in range(5)]
+    with FrameWriter(str(tmp_path), writers=(save_npy,), workers=workers, processes=processes,
+                     voxel_size=2.0) as writer:
+        for t, volume in enumerate(volumes):
+            writer.submit(volume, t)
+    for t, volume in enumerate(volumes):
+        np.testing.assert_array_equal(np.load(tmp_path / f'frame-{t}.npy'), volume * 2.0)
+    assert sorted(writer.latencies) == list(range(5))
+
+
+def test_options_reach_processes_once(rng, tmp_path, monkeypatch):
+    submitted = []
+    submit = ProcessPoolExecutor.submit
+    monkeypatch.setattr(ProcessPoolExecutor, 'submit',
+                        lambda self, fn, *args: submitted.append(args) or submit(self, fn, *args))
+    writer = FrameWriter(str(tmp_path), writers=(save_npy,), workers=1)
+    writer.set_defaults(voxel_size=3.0, cmap_dict={1: (1.0, 0.0, 0.0)})
+    writer.submit(np.ones((2, 2, 2)), 0)
+    writer.close()
+    assert all('cmap_dict' not in repr(args) for args in submitted)
+    np.testing.assert_array_equal(np.load(tmp_path / 'frame-0.npy'), 3.0)
+
+
+def test_defaults_are_fixed_once_started(tmp_path):
+    with FrameWriter(str(tmp_path), writers=(save_npy,), workers=1, processes=False) as writer:
+        writer.submit(np.ones((2, 2, 2)), 0)
+        with pytest.raises(RuntimeError):
+            writer.set_defaults(voxel_size=2.0)
+
+
+def test_writer_errors_raise_after_a_normal_run(rng, tmp_path):
+    rule = life3d_rule_generalized()
+    volume = random_ids(rng, (6, 6, 6))
+    writer = FrameWriter(str(tmp_path), writers=(fail,), workers=0)
+    with pytest.raises(RuntimeError, match='failed to write'):
+        automaton.evolve_volume(volume, rule, steps=3, writer=writer)
+
+
+def test_writer_errors_do_not_mask_the_run_error(rng, tmp_path):
+    rule = life3d_rule_generalized()
+    volume = random_ids(rng, (6, 6, 6))
+    writer = FrameWriter(str(tmp_path), writers=(fail,), workers=2, processes=False)
+    with pytest.warns(UserWarning, match='failed run'), pytest.raises(Broken):
+        automaton.evolve_volume(volume, rule, steps=5, writer=writer, engine=BrokenEngine(rule),
+                                savepath=str(tmp_path))
+
+
+def test_context_manager_keeps_the_original_error(tmp_path):
+    with pytest.warns(UserWarning), pytest.raises(Broken):
+        with FrameWriter(str(tmp_path), writers=(fail,), workers=0) as writer:
+            writer.submit(np.ones((2, 2, 2)), 0)
+            raise Broken()
@@ -0,0 +1,74 @@
+"""
+Dense ID palettes
+
+JCA
+"""
+import numpy as np
+import pytest
+
+import CellularAutomaton.initializers as init
+from CellularAutomaton.palette import Palette, color_values, compact_dtype
+
+from conftest import random_ids
+
+
+def test_compact_dtype():
+    assert compact_dtype(-1, 127) == np.int8
+    assert compact_dtype(-1, 128) == np.int16
+    assert compact_dtype(-1, 40000) == np.int32
+    assert compact_dtype(-1, 2**40) == np.int64
+
+
+def test_encode_decode_round_trip(rng):
+    volume = random_ids(rng, (10, 10, 10), n_ids=200, env_density=0.1) * 7
+    volume[volume < 0] = -1
+    palette = Palette.from_volume(volume)
+    codes = palette.encode(volume)
+    assert codes.dtype == np.int16
+    assert codes.max() == len(palette.ids)
+    np.testing.assert_array_equal(palette.decode(codes), volume)
+
+
+def test_colors_match_the_cmap_dict(rng):
+    volume = random_ids(rng, (8, 8, 8), n_ids=20, env_density=0.1)
+    cmap_dict = {i: tuple(rng.random(3)) for i in range(1, 21)}
+    cmap_dict[-1] = (0.0, 0.0, 1.0)
+    palette = Palette.from_volume(volume, cmap_dict)
+    live = volume != 0
+    np.testing.assert_allclose(palette.colors(palette.encode(volume))[live],
+                               color_values(volume[live], cmap_dict), rtol=1e-6)
+
+
+def test_out_of_range_codes_get_the_default():
+    palette = Palette([5, 9], [(1.0, 0.0, 0.0), (0.0, 1.0, 0.0)], default=(0.25, 0.25, 0.25))
+    colors = palette.colors(np.array([[-3, -1, 0, 1, 2, 3, 100]]))
+    assert colors.shape == (1, 7, 3)
+    np.testing.assert_allclose(colors[0, [0, 5, 6]], 0.25)
+    np.testing.assert_allclose(colors[0, 3], (1.0, 0.0, 0.0))
+    assert palette.get(3) is None
+    with pytest.raises(KeyError):
+        palette[3]
+
+
+def test_noise_ids_are_bounded():
+    volume, palette = init.initialize_volume_clusters((40, 40, 40), n_clusters=3, noise_density=0.1,
+                                                      noise_ids=100, compact=True, seed=0)
+    assert volume.dtype == np.int8
+    assert volume.max() == 103
+    np.testing.assert_array_equal(palette.ids, np.arange(1, 104))
+
+    volume, cmap_dict = init.initialize_volume_clusters((40, 40, 40), n_clusters=3, noise_density=0.1,
+                                                        noise_ids=None, seed=0)
+    assert volume.max() == 3 + np.count_nonzero(volume > 3)
+    assert len(cmap_dict) == volume.max()
+
+
+def test_noise_ids_are_per_voxel_by_default():
+    volume, cmap_dict = init.initialize_volume_clusters((30, 30, 30), n_clusters=2, noise_density=0.2, seed=1)
+    noise = volume[volume > 2]
+    assert len(np.unique(noise)) == len(noise)
+
+    volume, palette = init.initialize_volume_clusters((64, 64, 64), noise_density=0.2, compact=True,
+                                                      noise_ids=1024, seed=1)
+    assert volume.dtype == np.int16
+    assert set(np.unique(volume[volume > 0])) == set(palette.ids)
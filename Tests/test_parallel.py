@@ -0,0 +1,65 @@
+"""
+Shared-memory parallel engine against the dense engine
+
+JCA
+"""
+import numpy as np
+import pytest
+
+from CellularAutomaton.codebook import life3d_rule_generalized
+from CellularAutomaton.engines import DenseEngine
+from CellularAutomaton.parallel import ParallelEngine
+from CellularAutomaton.rules import compile_rule
+
+from conftest import random_ids
+
+
+def run_both(rule, volume, steps=12, **kwargs):
+    dense, parallel = DenseEngine(rule), ParallelEngine(rule, **kwargs)
+    dense.reset(volume)
+    parallel.reset(volume)
+    try:
+        for _ in range(steps):
+            dense.step()
+            parallel.step()
+            np.testing.assert_array_equal(parallel.volume(), dense.volume())
+    finally:
+        parallel.close()
+    return parallel, dense
+
+
+def dense_steps(rule, volume, steps):
+    dense = DenseEngine(rule)
+    dense.reset(volume)
+    dense.advance(steps)
+    return dense.volume()
+
+
+@pytest.mark.parametrize('slabs', [1, 3, 7])
+def test_matches_dense_over_12_steps(rng, slabs):
+    rule = life3d_rule_generalized(birth_set={4}, survival_set={4, 5})
+    volume = random_ids(rng, (15, 12, 10), density=0.25, n_ids=1, env_density=0.03)
+    run_both(rule, volume, workers=2, slabs=slabs)
+
+
+def test_matches_dense_with_a_larger_window(rng):
+    rule = compile_rule('9-20/8-12/2/M', radius=2, inherit='max')
+    volume = random_ids(rng, (16, 10, 10), density=0.3, n_ids=1)
+    run_both(rule, volume, workers=2, slabs=4)
+
+
+def test_close_releases_the_segments_and_keeps_the_state(rng):
+    rule = life3d_rule_generalized(birth_set={4}, survival_set={4, 5})
+    volume = random_ids(rng, (12, 12, 12), density=0.25, n_ids=1)
+    parallel, dense = run_both(rule, volume, steps=3, workers=2)
+    assert parallel.pool is None and parallel.shm == []
+    np.testing.assert_array_equal(parallel.volume(), dense.volume())
+    parallel.close()    # idempotent
+    np.testing.assert_array_equal(parallel.volume(), dense.volume())
+
+    # A reset after close starts a new run
+    parallel.reset(volume)
+    parallel.step()
+    np.testing.assert_array_equal(parallel.volume(), dense_steps(rule, volume, 1))
+    parallel.close()
+
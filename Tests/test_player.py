@@ -0,0 +1,146 @@
+"""
+Playback buffers, prefetching and the player (without a window)
+
+JCA
+"""
+import numpy as np
+import pytest
+
+import CellularAutomaton.player as player
+from CellularAutomaton.player import PointSlots, Prefetcher, decode_delta, decode_frame
+
+from conftest import random_ids
+
+
+CMAP = {i: (i / 8, 1 - i / 8, 0.5) for i in range(-1, 9)}
+
+
+def evolving(rng, n, shape=(9, 8, 7)):
+    """Volumes changing a little between frames, with a few jumps."""
+    volume = random_ids(rng, shape, density=0.3, n_ids=8, env_density=0.05)
+    volumes = [volume]
+    for t in range(1, n):
+        volume = volume.copy()
+        flip = rng.random(shape) < (0.5 if t % 7 == 0 else 0.05)
+        volume[flip] = rng.integers(-1, 9, int(flip.sum()))
+        volumes.append(volume)
+    return volumes
+
+
+def assert_shows(slots, volume):
+    cells, _, points, colors = decode_frame(volume, CMAP)
+    shown = slots.cell[:slots.n]
+    order = np.argsort(shown)
+    np.testing.assert_array_equal(shown[order], cells)
+    np.testing.assert_array_equal(slots.points[:slots.n][order], points)
+    np.testing.assert_allclose(slots.colors[:slots.n][order], colors)
+    np.testing.assert_array_equal(slots.slot[shown], np.arange(slots.n))
+
+
+def test_point_slots_follow_random_moves(rng):
+    volumes = evolving(rng, 40)
+    slots = PointSlots(volumes[0].size, capacity=4)
+    slots.show(decode_frame(volumes[0], CMAP))
+    position = 0
+    for _ in range(120):
+        if rng.random() < 0.7 and position + 1 < len(volumes):
+            slots.advance(decode_delta(volumes[position + 1], volumes[position], CMAP))
+            position += 1
+        else:
+            position = int(rng.integers(len(volumes)))
+            slots.show(decode_frame(volumes[position], CMAP))
+        assert_shows(slots, volumes[position])
+
+
+def test_prefetcher_decodes_sequences_once(rng):
+    volumes = evolving(rng, 30)
+    calls = []
+    frames = Prefetcher(volumes, lambda volume, previous: calls.append(previous is None) or volume.sum(),
+                        ahead=4, cache=8)
+    try:
+        for i in range(30):
+            assert frames.get(i) == volumes[i].sum()
+        assert frames.get(30) is None and len(frames) == 30 and frames.complete
+        assert calls[0] and not any(calls[1:30])     # in order: only deltas after the first
+        assert len(frames.frames) <= 8
+        assert frames.get(2) == volumes[2].sum() and calls[30]   # evicted, decoded again in full
+    finally:
+        frames.close()
+
+
+def test_prefetcher_keyframes_for_iterators(rng):
+    volumes = evolving(rng, 10)
+    previous = []
+    frames = Prefetcher(iter(volumes), lambda volume, last: previous.append(last) or len(previous) - 1,
+                        ahead=20, keyframe_every=4)
+    try:
+        assert frames.get(9) == 9 and frames.get(10) is None and len(frames) == 10
+        assert [i for i, p in enumerate(previous) if p is None] == [0, 4, 8]
+        np.testing.assert_array_equal(previous[5], volumes[4])
+        assert frames.get(3) == 3
+    finally:
+        frames.close()
+
+
+class Window:
+    """Stand-in for the Open3D window."""
+    def create_window(self, **kwargs):
+        self.callbacks = {}
+
+    def get_render_option(self):
+        return type('RenderOption', (), {})()
+
+    def register_key_callback(self, key, callback):
+        self.callbacks[key] = callback
+
+    def add_geometry(self, geometry):
+        self.geometry = geometry
+
+    def update_geometry(self, geometry):
+        assert geometry is self.geometry
+
+    def poll_events(self):
+        return True
+
+    def update_renderer(self):
+        pass
+
+    def destroy_window(self):
+        pass
+
+
+def assert_cloud(play, volume):
+    cells, _, points, colors = decode_frame(volume, CMAP)
+    shown = np.asarray(play.pcd.points)
+    order = np.lexsort(shown.T[::-1])
+    np.testing.assert_array_equal(shown[order], points)
+    np.testing.assert_allclose(np.asarray(play.pcd.colors)[order], colors)
+
+
+@pytest.mark.parametrize('as_iterator', [False, True])
+def test_player_plays_and_seeks(rng, monkeypatch, as_iterator):
+    monkeypatch.setattr(player.o3d.visualization, 'VisualizerWithKeyCallback', Window)
+    full = []
+    monkeypatch.setattr(player, 'decode_frame', lambda volume, *args: full.append(1) or decode_frame(volume, *args))
+    volumes = evolving(rng, 25)
+    play = player.Player(iter(volumes) if as_iterator else volumes, cmap_dict=CMAP, fps=1e9, prefetch=30,
+                         cache=30, keyframe_every=8)
+    try:
+        assert_cloud(play, volumes[0])
+        while play.playing:
+            play.tick()
+            assert_cloud(play, volumes[play.position])
+        assert play.position == 24
+        # Played forward: only the first frame (and the iterator keyframes) decoded in full
+        assert len(full) == (4 if as_iterator else 1)
+
+        for i in [3, 20, 0, 13, -1, 12]:
+            play.seek(i)
+            assert_cloud(play, volumes[i])
+        play.step(-1)
+        assert_cloud(play, volumes[11])
+        play.step(2)
+        assert_cloud(play, volumes[13])
+        assert not play.playing
+    finally:
+        play.close()
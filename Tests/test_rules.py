@@ -0,0 +1,101 @@
+"""
+Declarative rules: notation, compiled kernels against the per-voxel reference
+
+JCA
+"""
+import random
+
+import numpy as np
+import pytest
+from scipy.ndimage import generic_filter
+
+from CellularAutomaton.rules import RuleSpec, compile_rule, parse_rule, rule_function, rule_kernel
+
+from conftest import random_ids
+
+
+def per_voxel(spec, volume):
+    return generic_filter(volume, rule_function(spec), size=spec.window_size, mode='constant', cval=0)
+
+
+@pytest.mark.parametrize('notation', ['4/5/2/M', '9-26/5-7,12,13,15/5/M', '2,6,9/4,6,8-10/10/N', '/3/2/M'])
+def test_notation_round_trip(notation):
+    spec = parse_rule(notation)
+    assert str(spec) == notation
+    assert parse_rule(str(spec)) == spec
+
+
+def test_parse_rule():
+    spec = parse_rule('4,6,8-10/3/3/VN', radius=2, inherit='max')
+    assert spec.survival == {4, 6, 8, 9, 10} and spec.birth == {3}
+    assert (spec.states, spec.neighbourhood, spec.radius, spec.inherit) == (3, 'von_neumann', 2, 'max')
+    assert parse_rule('B3/S23') == parse_rule('s23/b3') == RuleSpec((2, 3), (3,))
+    assert parse_rule('B5,10-12/S1') == RuleSpec((1,), (5, 10, 11, 12))
+    assert str(parse_rule('2/12-13/2/M')) == '2/12,13/2/M'
+    for bad in ['4/5/2', '4/5/2/X', 'B3/X2', 'B3']:
+        with pytest.raises(ValueError):
+            parse_rule(bad)
+
+
+def test_spec_validation_and_sizes():
+    assert RuleSpec().size == 26 and RuleSpec(radius=2).size == 124
+    assert RuleSpec(neighbourhood='von_neumann').size == 6
+    assert RuleSpec(neighbourhood='von_neumann', radius=2).size == 24
+    for kwargs in [dict(radius=0), dict(states=1), dict(neighbourhood='hex'), dict(inherit='min'),
+                   dict(states=4, env_id=-3), dict(env_id=0)]:
+        with pytest.raises(ValueError):
+            RuleSpec(**kwargs)
+    assert len({RuleSpec((2, 3), (3,)), RuleSpec([3, 2], {3})}) == 1
+
+
+def test_compile_rule_is_cached():
+    rule = compile_rule('4/5/2/M')
+    assert rule is compile_rule(parse_rule('4/5/2/M'))
+    assert rule.params['birth_set'] == {5} and rule.window_size == 3   # life-like: the life3d rule
+    assert compile_rule('4/5/2/M', radius=2) is not rule
+    with pytest.raises(ValueError):
+        compile_rule(RuleSpec(), radius=2)
+    with pytest.raises(ValueError):
+        compile_rule('4/5/2/M', method='gpu')
+
+
+@pytest.mark.parametrize('notation, kwargs', [
+    ('9-20/8-12/2/M', dict(radius=2, inherit='max')),
+    ('2-4/3,5/2/N', dict(radius=2, inherit='none')),
+    ('4-7/3-4/4/M', dict(inherit='max', env_counts=False)),
+    ('1-3/2/5/N', dict(radius=1, inherit='max', env_id=-9)),
+])
+def test_kernel_matches_rule_function(rng, notation, kwargs):
+    spec = parse_rule(notation, **kwargs)
+    volume = random_ids(rng, (11, 10, 9), density=0.3, n_ids=4, env_id=spec.env_id, env_density=0.05)
+    step = rule_kernel(spec, method='direct')
+    for _ in range(4):
+        expected = per_voxel(spec, volume)
+        np.testing.assert_array_equal(step(volume), expected)
+        volume = expected
+
+
+def test_majority_matches_rule_function(rng):
+    spec = parse_rule('4-6/3-5/3/M', radius=1, env_counts=False)
+    volume = random_ids(rng, (10, 10, 10), density=0.3, n_ids=1, env_density=0.05)
+    step = rule_kernel(spec, method='direct')
+    for _ in range(4):
+        random.seed(0)
+        expected = per_voxel(spec, volume)
+        np.testing.assert_array_equal(step(volume), expected)
+        volume = expected
+
+
+def test_generations_decay():
+    spec = parse_rule('//4/M')
+    volume = np.zeros((5, 5, 5), dtype=int)
+    volume[2, 2, 2] = 3
+    volume[0, 0, 0] = -1
+    step = rule_kernel(spec)
+    states = [volume]
+    for _ in range(4):
+        states.append(step(states[-1]))
+    assert [int(s[2, 2, 2]) for s in states] == [3, -2, -3, 0, 0]
+    assert all(s[0, 0, 0] == -1 for s in states)
+    out = np.full_like(volume, 5)
+    assert step(volume, out=out) is out and out[2, 2, 2] == -2
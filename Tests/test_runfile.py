@@ -0,0 +1,99 @@
+"""
+Run file round trips
+
+JCA
+"""
+import numpy as np
+import pytest
+
+import CellularAutomaton.automaton as automaton
+import CellularAutomaton.runfile as runfile
+from CellularAutomaton.codebook import life3d_rule_generalized
+from CellularAutomaton.palette import Palette
+from CellularAutomaton.runfile import RunReader, RunWriter
+
+from conftest import random_ids
+
+
+@pytest.mark.parametrize('compression', ['zlib', None])
+@pytest.mark.parametrize('chunk_shape', [(4, 4, 4), (5, 3, 7), (64, 64, 64)])
+def test_round_trip(rng, tmp_path, compression, chunk_shape):
+    volumes = [random_ids(rng, (9, 10, 11), n_ids=300, env_density=0.1).astype(np.int16) for _ in range(4)]
+    path = str(tmp_path / 'run.carun')
+    with RunWriter(path, chunk_shape=chunk_shape, compression=compression, metadata={'seed': 7}) as writer:
+        for t, volume in zip([0, 3, 6, 9], volumes):
+            writer.append(t, volume)
+
+    reader = RunReader(path)
+    assert len(reader) == 4 and reader.timesteps == [0, 3, 6, 9]
+    assert reader.shape == (9, 10, 11) and reader.dtype == np.int16
+    assert reader.metadata == {'seed': 7}
+    for state, volume in zip(reader, volumes):
+        np.testing.assert_array_equal(state, volume)
+    np.testing.assert_array_equal(reader[-1], volumes[-1])
+    assert len(reader[1:3]) == 2
+
+    # A single chunk is read on its own
+    corner = tuple(g - 1 for g in reader.grid)
+    chunk = reader.slices[int(np.ravel_multi_index(corner, reader.grid))]
+    np.testing.assert_array_equal(reader.chunk(2, corner), volumes[2][chunk])
+
+
+def test_colors_and_rule_round_trip(rng, tmp_path):
+    volume = random_ids(rng, (6, 6, 6), n_ids=5, env_density=0.1)
+    rule = life3d_rule_generalized(birth_set={5, 4}, survival_set={6})
+    cmap_dict = {i: (0.1 * i, 0.2, 0.3) for i in range(-1, 6)}
+    path = str(tmp_path / 'dict.carun')
+    reader = RunWriter(path, cmap_dict=cmap_dict, rule_fn=rule).states()
+    assert len(reader) == 0
+    assert reader.cmap_dict == pytest.approx(cmap_dict)
+    assert reader.rule['birth_set'] == [4, 5] and reader.rule['survival_set'] == [6]
+
+    palette = Palette.from_volume(volume, cmap_dict)
+    path = str(tmp_path / 'palette.carun')
+    reader = RunWriter(path, cmap_dict=palette).states()
+    np.testing.assert_array_equal(reader.cmap_dict.ids, palette.ids)
+    np.testing.assert_array_equal(reader.cmap_dict.lut, palette.lut)
+
+
+def test_bad_files(rng, tmp_path):
+    path = str(tmp_path / 'run.carun')
+    writer = RunWriter(path)
+    writer.append(0, np.zeros((3, 3, 3)))
+    with pytest.raises(ValueError, match='same shape'):
+        writer.append(1, np.zeros((3, 3, 4)))
+    writer.file.flush()
+    with pytest.raises(ValueError, match='incomplete'):
+        RunReader(path)
+    writer.close()
+    assert len(RunReader(path)) == 1
+
+    (tmp_path / 'other').write_bytes(b'x' * 64)
+    with pytest.raises(ValueError, match='not a run file'):
+        RunReader(str(tmp_path / 'other'))
+    with pytest.raises(ValueError):
+        RunWriter(str(tmp_path / 'lz4.carun'), compression='lz4')
+
+
+def test_evolve_volume_into_a_run_file(rng, tmp_path):
+    rule = life3d_rule_generalized(birth_set={4}, survival_set={5})
+    volume = random_ids(rng, (10, 10, 10), density=0.3, n_ids=1)
+    expected, _ = automaton.evolve_volume(volume, rule, steps=6)
+    reader, _ = automaton.evolve_volume(volume, rule, steps=6,
+                                        keep=RunWriter(str(tmp_path / 'run.carun'), chunk_shape=(4, 4, 4)))
+    assert reader.timesteps == list(range(7))
+    for state, reference in zip(reader, expected):
+        np.testing.assert_array_equal(state, reference)
+
+
+def test_export_ply(rng, tmp_path, monkeypatch):
+    calls = []
+    monkeypatch.setattr(runfile.aux, 'save_as_pointcloud',
+                        lambda volume, path, timestep, **kwargs: calls.append((volume, timestep)))
+    volumes = [random_ids(rng, (5, 5, 5)) for _ in range(3)]
+    with RunWriter(str(tmp_path / 'run.carun')) as writer:
+        for t, volume in enumerate(volumes):
+            writer.append(10 * t, volume)
+    runfile.export_ply(str(tmp_path / 'run.carun'), str(tmp_path), positions=[0, 2])
+    assert [t for _, t in calls] == [0, 20]
+    np.testing.assert_array_equal(calls[1][0], volumes[2])
@@ -0,0 +1,49 @@
+"""
+Block-sparse engine against the dense engine
+
+JCA
+"""
+import numpy as np
+import pytest
+
+from CellularAutomaton.codebook import life3d_rule_generalized
+from CellularAutomaton.engines import DenseEngine
+from CellularAutomaton.rules import compile_rule
+from CellularAutomaton.sparse import SparseEngine
+
+from conftest import random_ids
+
+
+def run_both(rule, volume, steps=12, **kwargs):
+    dense, sparse = DenseEngine(rule), SparseEngine(rule, **kwargs)
+    dense.reset(volume)
+    sparse.reset(volume)
+    for _ in range(steps):
+        dense.step()
+        sparse.step()
+        np.testing.assert_array_equal(sparse.volume(), dense.volume())
+    return sparse
+
+
+@pytest.mark.parametrize('block_size', [4, 5, 16])
+def test_matches_dense_over_12_steps(rng, block_size):
+    # A single ID: no majority ties, so the rule is deterministic
+    rule = life3d_rule_generalized(birth_set={4}, survival_set={4, 5})
+    volume = random_ids(rng, (13, 17, 11), density=0.25, n_ids=1, env_density=0.03)
+    run_both(rule, volume, block_size=block_size)
+
+
+def test_matches_dense_with_a_larger_window(rng):
+    rule = compile_rule('9-20/8-12/2/M', radius=2, inherit='max')
+    volume = random_ids(rng, (14, 14, 14), density=0.3, n_ids=5)
+    run_both(rule, volume, block_size=4)
+
+
+def test_idle_blocks_are_skipped(rng):
+    rule = life3d_rule_generalized(birth_set={4}, survival_set={4, 5})
+    volume = np.zeros((32, 32, 32), dtype=int)
+    volume[2:6, 2:6, 2:6] = random_ids(rng, (4, 4, 4), density=0.5, n_ids=1)
+    sparse = run_both(rule, volume, steps=6, block_size=8)
+    assert sparse.active_counts[0] == volume.size
+    # Only the corner block and its neighbours stay active
+    assert max(sparse.active_counts[1:]) <= 8 * 8**3
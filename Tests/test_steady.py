@@ -0,0 +1,106 @@
+"""
+Steady-state and cycle detection
+
+JCA
+"""
+import numpy as np
+import pytest
+
+import CellularAutomaton.automaton as automaton
+from CellularAutomaton.codebook import life3d_rule_generalized
+from CellularAutomaton.engines import Engine
+from CellularAutomaton.steady import SteadyStateDetector
+
+from conftest import random_ids
+
+
+class ScriptEngine(Engine):
+    """Plays states[1:] after states[0], then loops over states[loop:]."""
+    def __init__(self, states, loop):
+        super().__init__(None)
+        self.states, self.loop = states, loop
+
+    def reset(self, volume):
+        self.index = 0
+
+    def step(self):
+        self.index += 1
+        if self.index == len(self.states):
+            self.index = self.loop
+
+    def volume(self):
+        return self.states[self.index]
+
+
+def script(rng, n):
+    return [random_ids(rng, (4, 4, 4), density=0.5) for _ in range(n)]
+
+
+def run(states, loop, detector, steps=20):
+    return list(automaton.iterate_volume(states[0], None, steps=steps, engine=ScriptEngine(states, loop),
+                                         detector=detector))
+
+
+def test_cycle_stops_after_one_period(rng):
+    states = script(rng, 6)      # transient 0..2, cycle 3, 4, 5
+    detector = SteadyStateDetector(4)
+    frames = run(states, 3, detector)
+    assert [t for t, _ in frames] == list(range(6))
+    assert (detector.reason, detector.period, detector.timestep) == ('cycle', 3, 6)
+    assert str(detector) == 'cycle of period 3 at step 6'
+
+
+def test_keep_period_outputs_only_the_period(rng):
+    states = script(rng, 6)
+    frames = run(states, 3, SteadyStateDetector(4, keep_period=True))
+    assert [t for t, _ in frames] == [3, 4, 5]
+    for t, volume in frames:
+        np.testing.assert_array_equal(volume, states[t])
+
+
+def test_keep_period_without_detection_outputs_the_tail(rng):
+    states = script(rng, 6)
+    detector = SteadyStateDetector(2, keep_period=True)
+    frames = run(states, 3, detector, steps=5)
+    assert detector.reason is None
+    assert [t for t, _ in frames] == [4, 5]
+
+
+def test_period_longer_than_max_period_is_missed(rng):
+    states = script(rng, 6)
+    detector = SteadyStateDetector(2, stop=True)
+    assert len(run(states, 3, detector, steps=12)) == 13
+    assert detector.reason is None
+
+
+def test_fixed_point_and_extinction():
+    rule = life3d_rule_generalized(birth_set={3}, survival_set={7})
+    volume = np.zeros((8, 8, 8), dtype=int)
+    volume[2:4, 2:4, 2:4] = 1           # every cell has 7 neighbours, no cell outside has 3
+    volume[6, 6, 6] = 1                 # isolated cell dies at the first step
+    detector = SteadyStateDetector(3)
+    frames = list(automaton.iterate_volume(volume, rule, steps=10, detector=detector))
+    assert len(frames) == 2 and (detector.reason, detector.timestep) == ('fixed', 2)
+
+    volume[2:4, 2:4, 2:4] = 0
+    detector = SteadyStateDetector(3, keep_period=True)
+    frames = list(automaton.iterate_volume(volume, rule, steps=10, detector=detector))
+    assert detector.reason == 'extinct' and [t for t, _ in frames] == [1]
+    assert not frames[0][1].any()
+
+
+def test_evolve_volume_detector():
+    rule = life3d_rule_generalized(birth_set={3}, survival_set={7})
+    volume = np.zeros((8, 8, 8), dtype=int)
+    volume[2:4, 2:4, 2:4] = 1
+    volume[6, 6, 6] = 1
+    states, _ = automaton.evolve_volume(volume, rule, steps=10, detector=2)
+    assert len(states) == 2
+    states, _ = automaton.evolve_volume(volume, rule, steps=10,
+                                        detector=SteadyStateDetector(2, keep_period=True))
+    assert len(states) == 1
+    block = volume.copy()
+    block[6, 6, 6] = 0
+    np.testing.assert_array_equal(states[0], block)
+    with pytest.raises(ValueError):
+        automaton.evolve_volume(volume, rule, steps=10, detector=True)
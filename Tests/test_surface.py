@@ -0,0 +1,86 @@
+"""
+Surface masks and meshes
+
+JCA
+"""
+import numpy as np
+import pytest
+
+import CellularAutomaton.surface as surface
+
+from conftest import random_ids
+
+
+def signed_volume(vertices, triangles):
+    """Volume enclosed by a closed mesh: positive when the triangles are wound outwards."""
+    a, b, c = (vertices[triangles[:, k]] for k in range(3))
+    return float(np.einsum('ij,ij->i', a, np.cross(b, c)).sum() / 6)
+
+
+def area(vertices, triangles):
+    a, b, c = (vertices[triangles[:, k]] for k in range(3))
+    return float(np.linalg.norm(np.cross(b - a, c - a), axis=1).sum() / 2)
+
+
+def exposed_faces(volume, by_id):
+    padded = np.pad(volume, 1)
+    count = 0
+    for axis in range(3):
+        for shift in (1, -1):
+            neighbour = np.roll(padded, shift, axis=axis)[1:-1, 1:-1, 1:-1]
+            count += int(((volume != 0) & ((neighbour != volume) if by_id else (neighbour == 0))).sum())
+    return count
+
+
+def test_surface_mask_matches_brute_force(rng):
+    volume = random_ids(rng, (9, 10, 11), density=0.6, n_ids=3, env_density=0.1)
+    padded = np.pad(volume, 1)
+    for by_id in (False, True):
+        expected = np.zeros(volume.shape, dtype=bool)
+        for x, y, z in np.argwhere(volume != 0):
+            around = [padded[x + 1 + dx, y + 1 + dy, z + 1 + dz]
+                      for dx, dy, dz in [(1, 0, 0), (-1, 0, 0), (0, 1, 0), (0, -1, 0), (0, 0, 1), (0, 0, -1)]]
+            expected[x, y, z] = any(n != volume[x, y, z] if by_id else n == 0 for n in around)
+        np.testing.assert_array_equal(surface.surface_mask(volume, by_id), expected)
+    points, values = surface.surface_points(volume, voxel_size=2.0)
+    assert len(points) == surface.surface_mask(volume).sum() and (values != 0).all()
+    assert (points % 2 == 0).all()
+
+
+@pytest.mark.parametrize('by_id', [False, True])
+def test_greedy_mesh_is_closed_and_outward(rng, by_id):
+    volume = random_ids(rng, (10, 9, 8), density=0.7, n_ids=3)
+    vertices, triangles, ids = surface.greedy_mesh(volume, voxel_size=0.5, by_id=by_id)
+    assert len(triangles) == len(ids)
+    np.testing.assert_allclose(signed_volume(vertices, triangles), (volume != 0).sum() * 0.5**3)
+    np.testing.assert_allclose(area(vertices, triangles), exposed_faces(volume, by_id) * 0.5**2)
+    # Merging: far fewer quads than exposed faces on a solid block
+    block = np.ones((6, 6, 6), dtype=int)
+    assert len(surface.greedy_mesh(block)[1]) == 12
+
+
+def test_marching_cubes_mesh_is_outward(rng):
+    if surface.marching_cubes is None:
+        pytest.skip('scikit-image is not installed')
+    volume = np.zeros((12, 12, 12), dtype=int)
+    volume[2:6, 2:6, 2:6] = 1
+    volume[7:11, 3:9, 5:10] = 2
+    vertices, triangles, ids = surface.marching_cubes_mesh(volume)
+    for cid in (1, 2):
+        rows = ids == cid
+        enclosed = signed_volume(vertices, triangles[rows])
+        assert 0.7 * (volume == cid).sum() < enclosed < (volume == cid).sum()
+    assert signed_volume(*surface.greedy_mesh(volume)[:2]) > 0
+
+
+def test_volume_to_mesh_and_save(rng, tmp_path, monkeypatch):
+    written = {}
+    monkeypatch.setattr(surface.o3d.io, 'write_triangle_mesh', lambda path, mesh: written.update({path: mesh}))
+    volume = random_ids(rng, (6, 6, 6), density=0.5, n_ids=2)
+    with pytest.raises(ValueError):
+        surface.volume_to_mesh(volume, method='voxels')
+    surface.save_as_mesh(volume, str(tmp_path), 3, cmap_dict={1: (1, 0, 0), 2: (0, 1, 0)}, per_cluster=True)
+    assert sorted(written) == [str(tmp_path / 'mesh-3-1.ply'), str(tmp_path / 'mesh-3-2.ply')]
+    mesh = written[str(tmp_path / 'mesh-3-1.ply')]
+    np.testing.assert_allclose(np.asarray(mesh.vertex_colors), np.tile([1.0, 0.0, 0.0], (len(mesh.vertices), 1)))
+    assert signed_volume(np.asarray(mesh.vertices), np.asarray(mesh.triangles)) > 0
@@ -0,0 +1,97 @@
+"""
+Rasterizer images and the PNG files written by the renderers
+
+JCA
+"""
+import os
+
+import numpy as np
+import pytest
+
+import CellularAutomaton.visualization as viz
+from CellularAutomaton.visualization import Rasterizer, render_as_pointcloud, render_sequence
+
+from conftest import random_ids
+
+
+RED, GREEN = (1.0, 0.0, 0.0), (0.0, 1.0, 0.0)
+
+
+def colours(image):
+    """Set of the RGB triples in an image."""
+    return set(map(tuple, image.reshape(-1, 3).tolist()))
+
+
+def test_nearest_voxel_wins():
+    # Camera looking down axis 0: both voxels land on the same pixels, ID 2 is nearer
+    volume = np.zeros((5, 1, 1), dtype=np.int32)
+    volume[0], volume[4] = 1, 2
+    image = Rasterizer(volume.shape, resolution=10, elev=0, azim=0, shade=0)(volume, {1: RED, 2: GREEN})
+    seen = colours(image)
+    assert (0, 255, 0) in seen
+    assert (255, 0, 0) not in seen
+
+    # Seen from the other side, ID 1 is nearer
+    image = Rasterizer(volume.shape, resolution=10, elev=0, azim=180, shade=0)(volume, {1: RED, 2: GREEN})
+    seen = colours(image)
+    assert (255, 0, 0) in seen
+    assert (0, 255, 0) not in seen
+
+
+def test_cmap_colours_reach_pixels(rng):
+    volume = random_ids(rng, (8, 8, 8), density=0.5, n_ids=2)
+    cmap = {1: RED, 2: GREEN}
+    image = Rasterizer(volume.shape, resolution=64, shade=0, background=(0, 0, 1))(volume, cmap)
+    assert colours(image) == {(255, 0, 0), (0, 255, 0), (0, 0, 255)}
+
+
+def test_empty_volume_is_background():
+    volume = np.zeros((4, 4, 4), dtype=np.int32)
+    image = Rasterizer(volume.shape, resolution=32, background=(0, 0, 1))(volume)
+    assert colours(image) == {(0, 0, 255)}
+
+
+@pytest.mark.parametrize('shape, resolution', [((10, 10, 10), 200), ((4, 20, 7), 300), ((32, 32, 32), 10)])
+def test_output_shape_and_resolution(rng, shape, resolution):
+    rasterizer = Rasterizer(shape, resolution=resolution)
+    image = rasterizer(random_ids(rng, shape))
+    side = rasterizer.size * rasterizer.scale
+    assert image.shape == (side, side, 3)
+    assert image.dtype == np.uint8
+    # Upscaled by whole pixels, to about `resolution` (never below the raster itself)
+    assert side > resolution - rasterizer.size or rasterizer.scale == 1
+    assert side <= max(resolution, rasterizer.size)
+
+
+def test_render_sequence_writes_every_frame(rng, tmp_path):
+    volumes = [random_ids(rng, (6, 6, 6)) for _ in range(3)]
+    path = tmp_path / 'frames'
+    render_sequence(volumes, str(path), name='run', start=5, resolution=32)
+    assert sorted(os.listdir(path)) == ['run-5.png', 'run-6.png', 'run-7.png']
+
+
+@pytest.mark.parametrize('cmap_dict, colorbar', [({1: RED}, False), (None, False), (None, True)])
+def test_render_as_pointcloud_writes_png(rng, tmp_path, cmap_dict, colorbar):
+    volume = random_ids(rng, (6, 6, 6), n_ids=1)
+    render_as_pointcloud(volume, str(tmp_path), 3, cmap_dict=cmap_dict, name='shot',
+                         figsize=(1, 1), colorbar=colorbar)
+    assert os.listdir(tmp_path) == ['shot-3.png']
+
+
+def test_raster_colorbar_adds_a_figure(rng, tmp_path):
+    volume = random_ids(rng, (6, 6, 6))
+    render_as_pointcloud(volume, str(tmp_path), 0, name='plain', figsize=(2, 2))
+    render_as_pointcloud(volume, str(tmp_path), 0, name='bar', figsize=(2, 2), colorbar=True)
+    plain = viz.plt.imread(str(tmp_path / 'plain-0.png'))
+    bar = viz.plt.imread(str(tmp_path / 'bar-0.png'))
+    assert plain.shape[:2] == Rasterizer(volume.shape, resolution=200)(volume).shape[:2]
+    assert bar.shape[:2] == (200, 200)
+    # IDs 1..3 are coloured over 0..3: viridis(0) only shows in the colorbar
+    low = (np.array(viz.plt.cm.viridis(0.0)[:3]) * 255).round()
+    assert not np.any(np.all(np.abs(plain[..., :3] * 255 - low) <= 4, axis=-1))
+    assert np.any(np.all(np.abs(bar[..., :3] * 255 - low) <= 4, axis=-1))
+
+
+def test_unknown_renderer(tmp_path):
+    with pytest.raises(ValueError):
+        render_as_pointcloud(np.ones((2, 2, 2), dtype=np.int32), str(tmp_path), 0, renderer='vtk')
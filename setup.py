@@ -12,6 +12,7 @@ setup(
     install_requires=[
         'open3d',
         'numpy',
+        'scipy',
         'matplotlib',
         'tqdm'
     ],